@@ -0,0 +1,275 @@
+# agent_transport.py
+"""
+How the controller reaches the agents. Both transports offer the same calls, addressed
+by agent name:
+
+    analyze_files(agent, paths, payload) -> {path: result}   per-file agents
+    system_scan(agent, investigation_id) -> result or None   registry / browser / memory
+    check_hashes(investigation_id, items), drain(investigation_id, timeout)   threat intel
+    flush(agent_names) -> bool, cache_stats() -> dict or None, close()
+
+HttpTransport talks to the agent services started by run_all.py over one pooled
+keep-alive session. ProcessTransport
+imports the agents' analysis functions and runs them in a local process pool: no
+services, ports, JSON or retry sleeps. Its workers flush their findings before a call
+returns, so there is nothing left for flush() to wait for; threat intel runs in the
+controller process itself, where its rate limiter and verdict cache are shared.
+"""
+import os
+import json
+import time
+import requests
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import hash_cache
+from db_utils import flush_findings
+from config import (AGENT_PROCESSES, AGENT_HTTP_CONCURRENCY, AGENT_HTTP_CONCURRENCY_OVERRIDES,
+                    AGENT_HTTP_CONNECT_TIMEOUT, AGENT_HTTP_TIMEOUT, AGENT_HTTP_TIMEOUT_OVERRIDES)
+
+# --- HTTP ENDPOINTS ---
+AGENT_BASE_URLS = {
+    "Hash Agent":         "http://127.0.0.1:5001",
+    "Keyword Agent":      "http://127.0.0.1:5002",
+    "Signature Agent":    "http://127.0.0.1:5003",
+    "Timeline Agent":     "http://127.0.0.1:5004",
+    "Threat Intel Agent": "http://127.0.0.1:5005",
+    "Registry Agent":     "http://127.0.0.1:5006",
+    "Browser Agent":      "http://127.0.0.1:5007",
+    "Memory Agent":       "http://127.0.0.1:5008",
+}
+# Batch variants of the per-file agents: a list of paths in, one NDJSON line per file out
+FILE_ENDPOINTS = {
+    "Hash Agent":      "/analyze_file_batch",
+    "Keyword Agent":   "/search_keywords_batch",
+    "Signature Agent": "/verify_signature_batch",
+    "Timeline Agent":  "/get_timestamps_batch",
+}
+SYSTEM_ENDPOINTS = {
+    "Registry Agent": "/scan_registry",
+    "Browser Agent":  "/scan_browser",
+    "Memory Agent":   "/scan_memory",
+}
+
+# --- IN-PROCESS ENTRY POINTS ---
+# Module of each agent (also the key of its AGENT_HTTP_*_OVERRIDES entries); per-file agents
+# expose process_request(file_path, data), system agents run_scan(investigation_id)
+AGENT_MODULES = {
+    "Hash Agent":         "hash_agent",
+    "Keyword Agent":      "keyword_agent",
+    "Signature Agent":    "file_signature_agent",
+    "Timeline Agent":     "timeline_agent",
+    "Threat Intel Agent": "threat_intel_agent",
+    "Registry Agent":     "registry_agent",
+    "Browser Agent":      "browser_agent",
+    "Memory Agent":       "scan_memory",
+}
+
+
+class HttpTransport:
+    """
+    The agent microservices over localhost HTTP: one keep-alive session for every
+    agent, at most AGENT_HTTP_CONCURRENCY requests in flight per agent (callers beyond
+    that wait for a slot) and a connect/read timeout per agent.
+    """
+    name = "http"
+
+    def __init__(self, concurrency=AGENT_HTTP_CONCURRENCY, timeout=AGENT_HTTP_TIMEOUT):
+        limits = {agent: AGENT_HTTP_CONCURRENCY_OVERRIDES.get(AGENT_MODULES[agent], concurrency)
+                  for agent in AGENT_BASE_URLS}
+        self.slots    = {agent: threading.BoundedSemaphore(max(1, n)) for agent, n in limits.items()}
+        self.timeouts = {agent: (AGENT_HTTP_CONNECT_TIMEOUT,
+                                 AGENT_HTTP_TIMEOUT_OVERRIDES.get(AGENT_MODULES[agent], timeout))
+                         for agent in AGENT_BASE_URLS}
+        self.session  = requests.Session()
+        # One connection pool per agent port, big enough that no slot ever opens a throwaway connection
+        adapter = requests.adapters.HTTPAdapter(pool_connections=len(AGENT_BASE_URLS),
+                                                pool_maxsize=max(limits.values()))
+        self.session.mount("http://", adapter)
+
+    def call_agent(self, agent_name, path, payload, retries=3, delay=2, timeout=None):
+        """Posts a JSON request to one agent and returns the decoded response, or None after `retries` failures."""
+        url = AGENT_BASE_URLS[agent_name] + path
+        for i in range(retries):
+            try:
+                with self.slots[agent_name]:
+                    response = self.session.post(url, json=payload, timeout=timeout or self.timeouts[agent_name])
+                    response.raise_for_status()
+                    return response.json()
+            except Exception as e:
+                if i == retries - 1:
+                    print(f"[!] Agent {agent_name} failed at {url}")
+                    break
+                time.sleep(delay)
+        return None
+
+    def call_agent_batch(self, agent_name, path, file_paths, payload, retries=3, delay=2):
+        """
+        Sends a batch of files to an agent's NDJSON endpoint and returns {file_path: result}.
+        If the stream drops, only the files without a result yet are resent. A resent
+        file may already have been analyzed; the agent's findings writer keeps one
+        attempt's rows (db_utils.analysis_attempt).
+        """
+        url = AGENT_BASE_URLS[agent_name] + path
+        results = {}
+        pending = list(file_paths)
+        for i in range(retries):
+            try:
+                with self.slots[agent_name], \
+                     self.session.post(url, json={**payload, "file_paths": pending}, stream=True,
+                                       timeout=self.timeouts[agent_name]) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if line:
+                            item = json.loads(line)
+                            results[item['file_path']] = item
+            except Exception as e:
+                if i == retries - 1:
+                    print(f"[!] Agent {agent_name} failed at {url}")
+            pending = [p for p in pending if p not in results]
+            if not pending or i == retries - 1:
+                break
+            time.sleep(delay)
+        return results
+
+    def analyze_files(self, agent_name, file_paths, payload):
+        return self.call_agent_batch(agent_name, FILE_ENDPOINTS[agent_name], file_paths, payload)
+
+    def system_scan(self, agent_name, investigation_id):
+        return self.call_agent(agent_name, SYSTEM_ENDPOINTS[agent_name], {"investigation_id": investigation_id})
+
+    def check_hashes(self, investigation_id, items):
+        return self.call_agent("Threat Intel Agent", "/check_hashes",
+                               {"investigation_id": investigation_id, "items": items})
+
+    def drain(self, investigation_id, timeout):
+        return self.call_agent("Threat Intel Agent", "/drain", {"investigation_id": investigation_id, "timeout": timeout},
+                               retries=1, timeout=(AGENT_HTTP_CONNECT_TIMEOUT, timeout + 30))
+
+    def flush(self, agent_names=None):
+        """Asks each agent service to write its buffered findings; False if any did not confirm."""
+        confirmed = True
+        for agent_name in AGENT_BASE_URLS:
+            if agent_names is not None and agent_name not in agent_names:
+                continue
+            if self.call_agent(agent_name, "/flush", {}, retries=2, delay=1) is None:
+                print(f"    [!] {agent_name} did not confirm its flush; its pending findings may be missing from the seal.")
+                confirmed = False
+        return confirmed
+
+    def cache_stats(self):
+        try:
+            return self.session.get(AGENT_BASE_URLS["Hash Agent"] + "/cache_stats",
+                                    timeout=self.timeouts["Hash Agent"]).json()
+        except Exception:
+            return None
+
+    def close(self):
+        self.session.close()
+
+
+# --- PROCESS POOL WORKERS ---
+def _agent_module(agent_name):
+    return __import__(AGENT_MODULES[agent_name])
+
+def _flush_or_fail(agent_name):
+    if flush_findings() is None:
+        raise RuntimeError(f"{agent_name} could not write its findings")
+
+def _run_file_agent(agent_name, file_paths, payload):
+    """Worker side of analyze_files: the same per-file results the batch endpoint streams."""
+    process_request = _agent_module(agent_name).process_request
+    results = {}
+    for file_path in file_paths:
+        try:
+            result, status = process_request(file_path, payload)
+        except Exception as e:
+            result, status = {"error": str(e)}, 500
+        results[file_path] = {**result, "file_path": file_path, "status": status}
+    # Durable before the controller can checkpoint these files
+    _flush_or_fail(agent_name)
+    stats = hash_cache.get_stats() if agent_name == "Hash Agent" else None
+    return results, (os.getpid(), stats)
+
+def _run_system_agent(agent_name, investigation_id):
+    result, status = _agent_module(agent_name).run_scan(investigation_id)
+    _flush_or_fail(agent_name)
+    return result if status == 200 else None
+
+
+class ProcessTransport:
+    """
+    The agents' analysis functions in a pool of `processes` worker processes. Workers are
+    spawned rather than forked, so they do not inherit the controller's threads,
+    database connections or cache handles.
+    """
+    name = "process"
+
+    def __init__(self, processes=AGENT_PROCESSES):
+        self.processes = max(1, processes)
+        self.pool      = self._new_pool()
+        self._lock     = threading.Lock()
+        # Hash cache counters are per process; the latest snapshot of each worker is kept
+        self._hash_stats = {}
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+
+    def _run(self, agent_name, fn, *args):
+        """fn(*args) in a worker; None if it failed. A worker that died takes the pool with it, so it is replaced."""
+        pool = self.pool
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool as e:
+            print(f"[!] Agent {agent_name} failed in the process pool: {e}; starting a new pool.")
+            with self._lock:
+                if self.pool is pool:
+                    self.pool = self._new_pool()
+        except Exception as e:
+            print(f"[!] Agent {agent_name} failed in the process pool: {e}")
+        return None
+
+    def analyze_files(self, agent_name, file_paths, payload):
+        res = self._run(agent_name, _run_file_agent, agent_name, list(file_paths), payload)
+        if res is None:
+            return {}
+        results, (pid, stats) = res
+        if stats is not None:
+            self._hash_stats[pid] = stats
+        return results
+
+    def system_scan(self, agent_name, investigation_id):
+        return self._run(agent_name, _run_system_agent, agent_name, investigation_id)
+
+    def check_hashes(self, investigation_id, items):
+        import threat_intel_agent
+        return threat_intel_agent.check_batch(investigation_id, items)
+
+    def drain(self, investigation_id, timeout):
+        import threat_intel_agent
+        abandoned, settled = threat_intel_agent.drain(investigation_id, timeout)
+        return {"status": "drained", "abandoned": abandoned, "settled": sorted(settled)}
+
+    def flush(self, agent_names=None):
+        # Workers flush before returning and threat intel writes through the controller's own buffer
+        return True
+
+    def cache_stats(self):
+        snapshots = list(self._hash_stats.values())
+        if not snapshots:
+            return None
+        stats = {key: sum(s[key] for s in snapshots) for key in ("hits", "misses", "bypassed")}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+def make_transport(name, processes=AGENT_PROCESSES):
+    """The transport called `name` ("http" or "process")."""
+    if name == "process":
+        return ProcessTransport(processes)
+    return HttpTransport()
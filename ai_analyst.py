@@ -1,67 +1,158 @@
+import time
+import ntpath
+import threading
 import ollama
 import psycopg2
-from config import DB_CONFIG
+from psycopg2.extras import execute_values
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import risk_scoring
+import insight_cache
+import event_bus
+from config import (DB_CONFIG, OLLAMA_HOST, AI_MODEL, AI_CONCURRENCY, AI_UPDATE_BATCH,
+                    AI_RISK_THRESHOLD, AI_TOP_K, AI_TIME_BUDGET)
+
+# Update AI_MODEL to 'phi4' or 'llama3.1:8b'
+SELECTED_MODEL = AI_MODEL
+
+SYSTEM_PROMPT = (
+    "You are a Senior Digital Forensics and Incident Response Analyst. Analyze the following telemetry. "
+    "Ground your reasoning in the provided scores. "
+    "1. Map to MITRE ATT&CK (e.g., T1547). "
+    "2. Explain why the behavior is suspicious. "
+    "3. Keep the summary exactly three sentences long."
+)
+
+# One client for all worker threads; OLLAMA_HOST can point at a local fake model server.
+_client = ollama.Client(host=OLLAMA_HOST)
+
+# Identical findings fingerprints analyzed concurrently wait for the first call instead of repeating it.
+# A fixed set of striped locks: many more stripes than workers, so unrelated keys rarely share one.
+_KEY_LOCK_STRIPES = 256
+_key_locks        = [threading.Lock() for _ in range(_KEY_LOCK_STRIPES)]
+
+def _key_lock(key):
+    return _key_locks[hash(key) % _KEY_LOCK_STRIPES]
+
+# Triage in one query: per-artifact risk with the report's weights, where the
+# per-file "File Hash" row scores nothing, so hash-only artifacts never reach the model.
+TRIAGE_SQL = f"""
+    SELECT file_path, risk, findings FROM (
+        SELECT file_path,
+               COALESCE(SUM({risk_scoring.score_sql()}) FILTER (WHERE finding_type <> 'File Hash'), 0) AS risk,
+               array_agg(description) AS findings
+        FROM findings
+        WHERE investigation_id = %s AND file_path IS NOT NULL
+        GROUP BY file_path
+    ) AS scored
+    WHERE risk >= %s
+    ORDER BY risk DESC, file_path
+    LIMIT %s
+"""
+
+UPDATE_INSIGHTS_SQL = """
+    UPDATE findings AS f SET ai_insight = v.insight
+    FROM (VALUES %s) AS v(investigation_id, file_path, insight)
+    WHERE f.investigation_id = v.investigation_id AND f.file_path = v.file_path
+"""
 
 def get_ai_insight(file_path, findings_list):
     if not findings_list:
         return "No suspicious findings recorded for this artifact."
 
-    # Update this to 'phi4' or 'llama3.1:8b'
-    SELECTED_MODEL = 'llama3.1:8b' 
-
-    system_prompt = (
-        "You are a Senior Digital Forensics and Incident Response Analyst. Analyze the following telemetry. "
-        "Ground your reasoning in the provided scores. "
-        "1. Map to MITRE ATT&CK (e.g., T1547). "
-        "2. Explain why the behavior is suspicious. "
-        "3. Keep the summary exactly three sentences long."
-    )
-    
-    user_query = f"Artifact: {file_path}\nFindings: {', '.join(findings_list)}"
-    
-    try:
-        response = ollama.chat(model=SELECTED_MODEL, messages=[
-            {'role': 'system', 'content': system_prompt},
-            {'role': 'user', 'content': user_query},
-        ])
-        return response['message']['content'].strip()
-    except Exception as e:
-        return f"Intelligence Layer Error: {str(e)}"
+    # Same model, prompt and (path/hash-normalized) findings -> reuse the earlier analysis
+    key      = insight_cache.cache_key(SELECTED_MODEL, SYSTEM_PROMPT, findings_list)
+    basename = ntpath.basename(file_path)
+    with _key_lock(key):
+        cached = insight_cache.get(key, basename)
+        if cached:
+            return cached
 
-def run_analysis_on_scan(investigation_id):
+        user_query = f"Artifact: {file_path}\nFindings: {', '.join(findings_list)}"
+
+        try:
+            response = _client.chat(model=SELECTED_MODEL, messages=[
+                {'role': 'system', 'content': SYSTEM_PROMPT},
+                {'role': 'user', 'content': user_query},
+            ])
+            insight = response['message']['content'].strip()
+        except Exception as e:
+            return f"Intelligence Layer Error: {str(e)}"
+
+        insight_cache.put(key, insight, file_path, basename)
+        return insight
+
+def triage_artifacts(cur, investigation_id, threshold=AI_RISK_THRESHOLD, top_k=AI_TOP_K):
+    """
+    Artifacts worth an LLM call: risk score >= threshold, highest first, at most
+    top_k (0 = no limit). Returns ([(file_path, risk_score, [descriptions])], total artifacts).
+    """
+    cur.execute(TRIAGE_SQL, (investigation_id, threshold, top_k or None))
+    selected = [(path, risk, findings) for path, risk, findings in cur.fetchall()]
+    cur.execute("SELECT COUNT(DISTINCT file_path) FROM findings WHERE investigation_id = %s", (investigation_id,))
+    return selected, cur.fetchone()[0]
+
+def _analyze_within(file_path, findings_list, deadline):
+    """get_ai_insight, or None if the time budget ran out before this artifact's turn."""
+    if deadline and time.monotonic() > deadline:
+        return None
+    return get_ai_insight(file_path, findings_list)
+
+def _write_insights(conn, cur, rows):
+    execute_values(cur, UPDATE_INSIGHTS_SQL, rows, page_size=len(rows))
+    # Existing rows changed without new findings: bump the revision the report's ETag is built from
+    cur.execute("UPDATE investigations SET revision = revision + 1 WHERE investigation_id = %s", (rows[0][0],))
+    conn.commit()
+
+def run_analysis_on_scan(investigation_id, concurrency=AI_CONCURRENCY, threshold=AI_RISK_THRESHOLD,
+                         top_k=AI_TOP_K, time_budget=AI_TIME_BUDGET):
+    """
+    Sends the triaged artifacts' findings to the model with up to `concurrency` requests
+    in flight, highest-risk artifacts first. Artifacts not started within `time_budget`
+    seconds (0 = unlimited) are skipped. Insights are written AI_UPDATE_BATCH at a time.
+    """
     try:
         conn = psycopg2.connect(**DB_CONFIG)
         cur = conn.cursor()
-        cur.execute("SELECT DISTINCT file_path FROM findings WHERE investigation_id = %s", (investigation_id,))
-        files = cur.fetchall()
+        artifacts, total = triage_artifacts(cur, investigation_id, threshold, top_k)
 
-        if not files:
-            print("[!] AI Analyst: No artifacts found to analyze.")
+        if not artifacts:
+            print(f"[!] AI Analyst: No artifacts at or above risk {threshold} to analyze ({total} triaged).")
             return
 
-        print(f"[*] AI Analyst: Starting MITRE ATT&CK Synthesis for {len(files)} artifacts...")
-
-        for index, (file_path,) in enumerate(files):
-            # Fetch findings for this specific file
-            cur.execute(
-                "SELECT description FROM findings WHERE investigation_id = %s AND file_path = %s", 
-                (investigation_id, file_path)
-            )
-            findings_list = [f[0] for f in cur.fetchall()]
-            
-            # Print status so you know the AI is working
-            print(f"    [>] Analyzing ({index + 1}/{len(files)}): {file_path.split('\\')[-1]}")
-            
-            insight = get_ai_insight(file_path, findings_list)
-            
-            cur.execute(
-                "UPDATE findings SET ai_insight = %s WHERE investigation_id = %s AND file_path = %s",
-                (insight, investigation_id, file_path)
-            )
-            conn.commit() # Committing per file is safer for a triage tool
-        
+        print(f"[*] AI Triage: {len(artifacts)} of {total} artifacts at or above risk {threshold}"
+              + (f" (top {top_k})" if top_k else ""))
+        print(f"[*] AI Analyst: Starting MITRE ATT&CK Synthesis for {len(artifacts)} artifacts "
+              f"({concurrency} concurrent requests)...")
+
+        deadline = time.monotonic() + time_budget if time_budget else None
+        pending, written, skipped = [], 0, 0
+        # The executor's queue is FIFO, so submission order is the priority order
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            jobs = {pool.submit(_analyze_within, path, findings, deadline): path for path, _, findings in artifacts}
+            for job in as_completed(jobs):
+                file_path = jobs[job]
+                insight = job.result()
+                if insight is None:
+                    skipped += 1
+                    continue
+                # Print status so you know the AI is working
+                print(f"    [>] Analyzed ({len(pending) + written + 1}/{len(artifacts)}): {ntpath.basename(file_path)}")
+                event_bus.publish("ai_progress", {"investigation_id": investigation_id, "analyzed": len(pending) + written + 1,
+                                                  "total": len(artifacts), "file_path": file_path})
+                pending.append((investigation_id, file_path, insight))
+                if len(pending) >= AI_UPDATE_BATCH:
+                    _write_insights(conn, cur, pending)
+                    written += len(pending)
+                    pending = []
+        if pending:
+            _write_insights(conn, cur, pending)
+
+        if skipped:
+            print(f"[!] AI Analyst: Time budget of {time_budget}s reached; {skipped} lower-risk artifacts were not analyzed.")
+        stats = insight_cache.get_stats()
+        print(f"[*] Insight Cache: {stats['hits']} hits, {stats['misses']} misses (hit rate {stats['hit_rate']:.1%})")
         print(f"[+] AI Analyst: Synthesis complete for {investigation_id}.")
         cur.close()
         conn.close()
     except Exception as e:
-        print(f"[!] Intelligence Layer Error: {str(e)}")
\ No newline at end of file
+        print(f"[!] Intelligence Layer Error: {str(e)}")
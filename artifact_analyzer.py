@@ -0,0 +1,117 @@
+# artifact_analyzer.py
+import io
+import os
+import mmap
+import hashlib
+import contextlib
+
+import hash_cache
+import content_dedup
+import hash_agent
+import keyword_agent
+import file_signature_agent
+import timeline_agent
+from config import ARTIFACT_MMAP_THRESHOLD, FORENSIC_MODE, CONTENT_DEDUP
+
+# How much of the file the signature checks look at (same limits the agent uses on its own);
+# the keyword scan streams the whole file.
+HEADER_BYTES  = 8
+ENTROPY_BYTES = 1024 * 1024
+
+
+@contextlib.contextmanager
+def open_artifact(file_path):
+    """
+    Yields a read-only buffer over the whole file.
+    Small files are read into memory in one call; files at or above
+    ARTIFACT_MMAP_THRESHOLD are memory-mapped so the page cache is the only copy.
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < ARTIFACT_MMAP_THRESHOLD:
+            yield f.read()
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm
+
+
+def _as_result(response):
+    """Turns an agent's (body, status) pair into the same shape as one batch NDJSON line."""
+    body, status = response
+    return {**body, "status": status}
+
+
+def _scan_stream(file_path, investigation_id, keywords, stream):
+    """Signature/entropy and keyword analysis over one already-open stream, rewound between passes."""
+    entropy_data = stream.read(ENTROPY_BYTES)
+    stream.seek(0)
+    sig_res = file_signature_agent.process_file(
+        file_path, investigation_id,
+        header_bytes=entropy_data[:HEADER_BYTES], entropy_data=entropy_data, stream=stream
+    )
+    stream.seek(0)
+    key_res = keyword_agent.process_file(file_path, investigation_id, keywords or [], stream=stream)
+    return _as_result(sig_res), _as_result(key_res)
+
+
+def _known_verdict(file_hash, key):
+    """The stored verdict for this content, if dedup is on and it was analyzed before."""
+    if not (key and file_hash):
+        return None
+    return content_dedup.lookup([file_hash], key).get(file_hash)
+
+
+def analyze_artifact(file_path, investigation_id, keywords=None, forensic_mode=FORENSIC_MODE, st=None,
+                     dedup=CONTENT_DEDUP):
+    """
+    In-process replacement for the hash, keyword, signature and timeline agents.
+    The file is read once and that buffer feeds hashing, magic detection,
+    entropy (whole-file windows for binaries) and the streaming pattern scan;
+    findings are recorded exactly as the agents would. On a hash cache hit the
+    file is streamed without hashing, and with `dedup` content analyzed before
+    is not scanned at all (see content_dedup). `st` is the enumerator's stat result, if any;
+    it feeds the manifest and the timeline, while the hash cache is keyed on a stat with
+    the file's identity (hash_cache.identity_stat).
+    Returns {"hash", "keyword", "signature", "timeline"} results.
+    """
+    key = content_dedup.analysis_key(keywords) if dedup else None
+    try:
+        cache_st = hash_cache.identity_stat(file_path, st)
+        if st is None:
+            st = cache_st
+        file_hash = hash_cache.lookup(cache_st, forensic_mode=forensic_mode)
+        verdict   = _known_verdict(file_hash, key)
+        if verdict is None and file_hash:
+            with open(file_path, 'rb') as f:
+                sig_res, key_res = _scan_stream(file_path, investigation_id, keywords, f)
+        elif not file_hash:
+            with open_artifact(file_path) as buf:
+                file_hash = hashlib.sha256(buf).hexdigest()
+                verdict   = _known_verdict(file_hash, key)
+                if verdict is None:
+                    stream = buf if isinstance(buf, mmap.mmap) else io.BytesIO(buf)
+                    sig_res, key_res = _scan_stream(file_path, investigation_id, keywords, stream)
+            if hash_cache.is_unchanged(file_path, cache_st):
+                hash_cache.store(cache_st, file_hash)
+    except OSError as e:
+        print(f"[ArtifactAnalyzer] Could not read {file_path}: {e}")
+        status = 404 if isinstance(e, FileNotFoundError) else 500
+        error  = {"error": f"Could not read file: {e}", "status": status}
+        return {"hash": error, "keyword": error, "signature": error, "timeline": error}
+
+    if verdict is not None:
+        # Same bytes as a file analyzed before: only the path-dependent checks run
+        sig_res = content_dedup.replay_signature(verdict, file_path, investigation_id)
+        key_res = content_dedup.replay_keyword(verdict, file_path, investigation_id)
+        content_dedup.count_reused(investigation_id)
+    elif key:
+        fresh = content_dedup.verdict_of(key_res, sig_res)
+        if fresh:
+            content_dedup.store(file_hash, key, fresh, investigation_id)
+
+    return {
+        "hash":      _as_result(hash_agent.process_file(file_path, investigation_id, file_hash=file_hash, st=st)),
+        "keyword":   key_res,
+        "signature": sig_res,
+        "timeline":  _as_result(timeline_agent.process_file(file_path, investigation_id, st=st)),
+    }
@@ -0,0 +1,49 @@
+# batch_utils.py
+import json
+from flask import Response, request, jsonify, stream_with_context
+from db_utils import analysis_attempt
+
+
+def iter_batch_paths(data):
+    """
+    Yields the file paths named by a batch request: either an inline
+    'file_paths' list or a 'manifest' file (one path per line) readable by the agent.
+    """
+    if data.get('file_paths') is not None:
+        for path in data['file_paths']:
+            yield path
+        return
+    with open(data['manifest'], 'r', encoding='utf-8') as f:
+        for line in f:
+            path = line.rstrip('\r\n')
+            if path:
+                yield path
+
+
+def stream_batch(process_file):
+    """
+    Shared body of the per-agent batch endpoints.
+    Calls process_file(file_path, data) -> (result_dict, http_status) for each
+    path and streams one NDJSON line per file as soon as it is ready.
+    Each file is one analysis_attempt(), so a file the controller re-sends
+    because its line was lost does not record its findings twice.
+    """
+    data = request.get_json()
+    if not data or 'investigation_id' not in data:
+        return jsonify({"error": "Missing 'investigation_id'"}), 400
+    if data.get('file_paths') is None and not data.get('manifest'):
+        return jsonify({"error": "Provide 'file_paths' or 'manifest'"}), 400
+
+    def generate():
+        try:
+            for file_path in iter_batch_paths(data):
+                try:
+                    with analysis_attempt():
+                        result, status = process_file(file_path, data)
+                except Exception as e:
+                    result, status = {"error": str(e)}, 500
+                yield json.dumps({**result, "file_path": file_path, "status": status}) + "\n"
+        except OSError as e:
+            yield json.dumps({"file_path": None, "status": 400, "error": f"Manifest unreadable: {e}"}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -0,0 +1,457 @@
+# benchmarks.py
+"""
+Micro-benchmarks for the forensic hot paths.
+
+    python benchmarks.py keywords [--size-mb 2] [--rounds 5]
+    python benchmarks.py keywords-diff [--cases 2000]   (exits 1 if any hit differs from the legacy scan)
+    python benchmarks.py hashstore [--sizes 1 10 50] [--lookups 200000]
+    python benchmarks.py report [--sizes 10000 1000000 10000000] [--partitions 0]
+    python benchmarks.py agents [--requests 2000] [--concurrency 16]   (agents started by run_all.py)
+"""
+import io
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import report_queries
+
+CUSTOM_KEYWORDS = ["internal_project", "confidential"]
+
+INDICATORS = [
+    "123-45-6789", "jane.doe@example.com", "4111111111111111", "password=hunter2",
+    "eval(base64_decode(", "cmd.exe /c whoami", "schtasks /create", "mimikatz",
+    "internal_project", "/bin/bash -i",
+]
+
+
+def _synthetic_text(size, seed=7):
+    """Log-like filler text with a sprinkling of indicators, about `size` characters long."""
+    rng   = random.Random(seed)
+    words = ["info", "request", "served", "GET", "/index.html", "200", "user", "session",
+             "timeout", "cache", "worker", "started", "stopped", "0x7ffe", "ok", "retry"]
+    parts, length = [], 0
+    while length < size:
+        token = rng.choice(INDICATORS) if rng.random() < 0.001 else rng.choice(words)
+        parts.append(token)
+        length += len(token) + 1
+    return " ".join(parts)[:size]
+
+
+def _best_of(rounds, fn, *args):
+    best, result = float("inf"), None
+    for _ in range(rounds):
+        start  = time.perf_counter()
+        result = fn(*args)
+        best   = min(best, time.perf_counter() - start)
+    return best, result
+
+
+# --- KEYWORD ENGINE ---
+def _legacy_keyword_scan(content, custom_keywords, library):
+    """The original per-pattern loop: one full re.finditer pass per pattern."""
+    found_hits = []
+    all_patterns = [(category, p) for category, patterns in library.items() for p in patterns]
+    all_patterns += [("User Defined", re.escape(k)) for k in custom_keywords]
+    for category, pattern in all_patterns:
+        cat_hits = 0
+        for match in re.finditer(pattern, content):
+            start = max(0, match.start() - 20)
+            end   = min(len(content), match.end() + 20)
+            context = content[start:end].replace('\n', ' ').strip()
+            found_hits.append({"category": category, "match": match.group(), "context": f"...{context}..."})
+            cat_hits += 1
+            if cat_hits >= 5:
+                break
+    return found_hits
+
+
+def bench_keywords(args):
+    import keyword_agent
+
+    size    = int(args.size_mb * 1024 * 1024)
+    content = _synthetic_text(size)
+    data    = content.encode("utf-8")
+    mb      = len(data) / (1024 * 1024)
+    print(f"[*] Keyword engine: {mb:.1f} MB synthetic log, best of {args.rounds} rounds")
+
+    legacy_t, legacy_hits = _best_of(args.rounds, _legacy_keyword_scan, content, CUSTOM_KEYWORDS,
+                                     keyword_agent.FORENSIC_LIBRARY)
+    new_t, new_hits = _best_of(args.rounds, keyword_agent.scan_bytes, data, CUSTOM_KEYWORDS)
+
+    print(f"    legacy per-pattern      {mb / legacy_t:8.1f} MB/s  ({len(legacy_hits)} hits)")
+    print(f"    compiled multi-pattern  {mb / new_t:8.1f} MB/s  ({len(new_hits)} hits)")
+    print(f"    speed-up                {legacy_t / new_t:8.2f}x")
+
+
+# Inputs where one pattern's match covers another pattern's hit, or two patterns share a literal
+OVERLAP_CASES = [
+    "4111111111111111.jane.doe@example.com",
+    "123-45-6789.ops@example.org",
+    "5500000000000004@mail.example.com",
+    "passwordsecretconfidential",
+    "shell_exec(system(passthru(",
+    "ncat -e /bin/bash; nc -e /bin/sh",
+    "net localgroup administrators && net user",
+    "internal_project.confidential@example.com",
+]
+
+# The library plus patterns that share literals with it, so attribution to every owner is checked too
+SHARED_LITERAL_LIBRARY = {
+    "Shared_Literals": [
+        r"(?i)(secret|eval\(|beacon)",
+        r"(?i)(payload|cmd\.exe|secret)",
+        r"\b[a-z]+@example\.com\b",
+    ],
+}
+
+# Non-ASCII text, where bytes patterns intentionally differ from the legacy str scan: \b, \d and
+# '(?i)' are ASCII-only, so 'é' is not a word character, Arabic-Indic digits are not digits and
+# 'ſ' does not fold to 's'. (text, matches of the byte scan, matches of the legacy scan)
+UNICODE_CASES = [
+    ("é4111111111111111",        ["4111111111111111"], []),
+    ("Visa:4111111111111111é",   ["4111111111111111"], []),
+    ("PAſſWORD",                 [],                   ["PAſſWORD"]),
+    ("١٢٣-٤٥-٦٧٨٩ 123-45-6789",  ["123-45-6789"],      ["123-45-6789", "١٢٣-٤٥-٦٧٨٩"]),
+    ("café: password",           ["password"],         ["password"]),
+]
+
+FUZZ_PIECES = INDICATORS + [
+    "4111111111111111", "5105105105105100", "123-45-6789", "jane.doe", "@", ".", "-", "_", "example.com",
+    "SECRET", "Beacon", "exec(", "x", "42", "\n", " ", "%", "+", "eval", "(", "bash", "reg add",
+]
+
+
+def _fuzz_case(rng):
+    """A short ASCII string of indicators and fragments, mostly run together with no separators."""
+    return "".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(1, 40)))
+
+
+def _diff_hits(keyword_agent, text, chunk_size):
+    legacy = _legacy_keyword_scan(text, CUSTOM_KEYWORDS, keyword_agent.FORENSIC_LIBRARY)
+    # The default overlap: matches plus their context are far shorter, so window edges cannot cut them
+    new = keyword_agent.scan_stream(io.BytesIO(text.encode("utf-8")), CUSTOM_KEYWORDS,
+                                    chunk_size=chunk_size, overlap=4096, max_bytes=0)
+    as_key = lambda h: (h["category"], h["match"], h["context"])
+    return sorted(map(as_key, legacy)) != sorted(map(as_key, new))
+
+
+def bench_keywords_diff(args):
+    """Differential check of the compiled engine against the legacy per-pattern scan."""
+    import keyword_agent
+
+    rng = random.Random(args.seed)
+    failures = 0
+    library = keyword_agent.FORENSIC_LIBRARY
+    for label, extra in (("library", {}), ("library + shared literals", SHARED_LITERAL_LIBRARY)):
+        keyword_agent.FORENSIC_LIBRARY = {**library, **extra}
+        keyword_agent._pattern_entries.cache_clear()
+        keyword_agent._compile_engines.cache_clear()
+        cases = OVERLAP_CASES + [_fuzz_case(rng) for _ in range(args.cases)]
+        # Long inputs to exercise the per-pattern cap and, with small chunks, window boundaries
+        cases += [" ".join(_fuzz_case(rng) for _ in range(200)) for _ in range(args.cases // 20)]
+        mismatched = [c for c in cases if _diff_hits(keyword_agent, c, rng.choice([4096, 8192, 1 << 20]))]
+        print(f"    {label:<26}  {len(cases):6} inputs  {len(mismatched):4} mismatched")
+        for case in mismatched[:5]:
+            print(f"      [!] {case!r}")
+        failures += len(mismatched)
+    keyword_agent.FORENSIC_LIBRARY = library
+    keyword_agent._pattern_entries.cache_clear()
+    keyword_agent._compile_engines.cache_clear()
+
+    unexpected = 0
+    for text, scanned, legacy in UNICODE_CASES:
+        got = (sorted(h["match"] for h in keyword_agent.scan_bytes(text.encode("utf-8"))),
+               sorted(h["match"] for h in _legacy_keyword_scan(text, [], library)))
+        if got != (sorted(scanned), sorted(legacy)):
+            print(f"      [!] {text!r}: byte scan {got[0]}, legacy {got[1]}")
+            unexpected += 1
+    print(f"    {'non-ASCII text':<26}  {len(UNICODE_CASES):6} inputs  {unexpected:4} unexpected")
+    return 1 if failures or unexpected else 0
+
+
+# --- KNOWN-BAD HASH STORE ---
+def _synthetic_digests(count, seed=11):
+    """
+    `count` ascending pseudo-random 32-byte digests, generated already sorted:
+    evenly spaced 64-bit prefixes followed by random bytes.
+    """
+    rng  = random.Random(seed)
+    step = (1 << 64) // count
+    for block_start in range(0, count, 65536):
+        for i in range(block_start, min(count, block_start + 65536)):
+            yield (i * step).to_bytes(8, "big") + rng.getrandbits(192).to_bytes(24, "big")
+
+
+def bench_hashstore(args):
+    import hash_store
+
+    rng = random.Random(3)
+    print(f"[*] Known-bad hash store: {args.lookups} lookups per size (half listed, half not)")
+    print(f"    {'entries':>10}  {'build':>8}  {'open':>9}  {'store file':>10}  {'set RAM':>12}  {'lookups/s':>12}")
+    with tempfile.TemporaryDirectory(dir=args.tmp_dir) as tmp:
+        for millions in args.sizes:
+            count = int(millions * 1_000_000)
+            path  = os.path.join(tmp, f"bench_{count}.hashes")
+
+            start = time.perf_counter()
+            hash_store.write_store(path, _synthetic_digests(count))
+            build_t = time.perf_counter() - start
+
+            start = time.perf_counter()
+            mm, _ = hash_store._open_store(path)
+            open_t = time.perf_counter() - start
+
+            listed = [mm[hash_store.HEADER.size + i * 32:hash_store.HEADER.size + (i + 1) * 32].hex()
+                      for i in (rng.randrange(count) for _ in range(args.lookups // 2))]
+            keys = listed + [rng.getrandbits(256).to_bytes(32, "big").hex() for _ in range(args.lookups - len(listed))]
+            rng.shuffle(keys)
+            mm.close()
+
+            start = time.perf_counter()
+            hits  = sum(1 for k in keys if hash_store.contains(k, path=path))
+            rate  = len(keys) / (time.perf_counter() - start)
+            assert hits >= len(listed)
+
+            # Baseline: a Python set of hex strings, measured on up to 1M entries and scaled up
+            sample = min(count, 1_000_000)
+            tracemalloc.start()
+            baseline = {d.hex() for d in _synthetic_digests(sample)}
+            set_mb = tracemalloc.get_traced_memory()[0] / (1024 * 1024) * count / sample
+            tracemalloc.stop()
+            del baseline
+            set_label = f"{set_mb:,.0f} MB" + ("*" if sample < count else "")
+
+            # The store is mapped, not loaded: its file size is the ceiling on page-cache use, shared and evictable
+            file_mb = os.path.getsize(path) / (1024 * 1024)
+            print(f"    {count:>10,}  {build_t:7.1f}s  {open_t * 1000:7.2f}ms  {file_mb:7,.0f} MB  {set_label:>12}  {rate:12,.0f}")
+            os.unlink(path)
+    print("    * extrapolated from a 1M-entry set")
+
+
+# --- REPORT QUERIES (needs the PostgreSQL database from config.DB_CONFIG) ---
+BENCH_SCHEMA = "bench_report"
+
+SYNTHETIC_FINDINGS_SQL = """
+    INSERT INTO findings (agent_name, finding_type, description, investigation_id, file_path, timestamp)
+    SELECT (ARRAY['KeywordAgent', 'Signature Agent', 'TimelineAgent', 'ThreatIntelAgent'])[1 + mod(g, 4)],
+           (ARRAY['Keyword Hit', 'Signature Mismatch', 'Timestamp Anomaly', 'Known Malware'])[1 + mod(g, 4)],
+           'Synthetic finding ' || g || ': ' || md5(g::text),
+           'bench_inv_' || mod(g, %(investigations)s),
+           'C:\\Evidence\\file_' || mod(g / %(investigations)s, 5000) || '.bin',
+           now() - g * interval '1 second'
+    FROM generate_series(%(start)s, %(stop)s - 1) AS g
+"""
+
+# What /api/report/latest runs: (label, fn(cur, investigation_id) -> result rows)
+REPORT_QUERIES = [
+    ("latest investigation", lambda cur, inv_id: [report_queries.latest_investigation(cur)]),
+    ("artifact page",        lambda cur, inv_id: report_queries.artifact_page(cur, inv_id)[1]),
+    ("summary",              lambda cur, inv_id: [report_queries.artifact_summary(cur, inv_id)]),
+]
+
+
+def _time_report(cur, rounds):
+    """Best-of-rounds latency (ms) of each report query, plus the number of artifacts the page returns."""
+    timings, rows, inv_id = [], 0, None
+    for label, run in REPORT_QUERIES:
+        best = float("inf")
+        for _ in range(rounds):
+            start = time.perf_counter()
+            result = run(cur, inv_id)
+            best = min(best, time.perf_counter() - start)
+        if inv_id is None:
+            inv_id = result[0][0]
+        elif label == "artifact page":
+            rows = len(result)
+        timings.append(best * 1000)
+    return timings, rows
+
+
+def bench_report(args):
+    import psycopg2
+    import db_schema
+    from config import DB_CONFIG
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur  = conn.cursor()
+    # Everything lives in a scratch schema that is dropped at the end
+    cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE; CREATE SCHEMA {BENCH_SCHEMA}; SET search_path TO {BENCH_SCHEMA}")
+    conn.commit()
+    db_schema.FINDINGS_PARTITIONS = args.partitions
+    db_schema.migrate(conn)
+
+    cur.execute(
+        "INSERT INTO investigations (investigation_id, status, start_time) "
+        "SELECT 'bench_inv_' || i, 'COMPLETED', now() - i * interval '1 minute' FROM generate_series(0, %s - 1) AS i",
+        (args.investigations,)
+    )
+    conn.commit()
+
+    print(f"[*] /api/report/latest queries: {args.investigations} investigations, "
+          f"{'%d hash partitions' % args.partitions if args.partitions else 'unpartitioned'}, best of {args.rounds}")
+    print(f"    {'findings':>11}  {'page rows':>9}  {'latest inv (idx / seq)':>24}  {'artifact page (idx / seq)':>26}  {'summary (idx / seq)':>24}")
+    try:
+        loaded = 0
+        for size in sorted(args.sizes):
+            cur.execute(SYNTHETIC_FINDINGS_SQL, {"investigations": args.investigations, "start": loaded, "stop": size})
+            cur.execute("ANALYZE")
+            conn.commit()
+            loaded = size
+
+            indexed, rows = _time_report(cur, args.rounds)
+            cur.execute("SET enable_indexscan = off; SET enable_bitmapscan = off; SET enable_indexonlyscan = off")
+            seq, _ = _time_report(cur, args.rounds)
+            cur.execute("RESET enable_indexscan; RESET enable_bitmapscan; RESET enable_indexonlyscan")
+
+            cells = [f"{i:9.2f} / {q:9.2f} ms" for i, q in zip(indexed, seq)]
+            print(f"    {size:>11,}  {rows:>9,}  {cells[0]:>24}  {cells[1]:>26}  {cells[2]:>24}")
+    finally:
+        conn.rollback()
+        if not args.keep:
+            cur.execute(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE")
+            conn.commit()
+        conn.close()
+
+
+# --- AGENT SERVICES ---
+# Single-file endpoint of each per-file agent, as called by the load test
+LOAD_ENDPOINTS = {
+    "Hash Agent":      "/analyze_file",
+    "Keyword Agent":   "/search_keywords",
+    "Signature Agent": "/verify_signature",
+    "Timeline Agent":  "/get_timestamps",
+}
+# Everything the per-file agents write for an investigation
+LOAD_TABLES = ["findings", "hash_manifest", "merkle_nodes", "merkle_state", "file_checkpoints", "analysis_attempts",
+               "investigations"]
+
+
+def _load_round(url, payload, total, concurrency, keep_alive):
+    """Sends `total` requests from `concurrency` threads; returns (requests/s, failed requests)."""
+    import requests
+
+    if keep_alive:
+        session = requests.Session()
+        session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+        post = session.post
+    else:
+        # A new TCP connection per request, as the controller's agent calls used to make
+        post = requests.post
+
+    def one(_):
+        try:
+            return post(url, json=payload, timeout=30).status_code != 200
+        except Exception:
+            return True
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        failed = sum(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    if keep_alive:
+        session.close()
+    return total / elapsed, failed
+
+
+def _delete_load_rows(investigation_id):
+    """Removes what the load test wrote, once the agents have flushed their buffers. Returns the rows deleted."""
+    import psycopg2
+    import agent_transport
+    from config import DB_CONFIG
+
+    transport = agent_transport.HttpTransport()
+    try:
+        if not transport.flush(list(LOAD_ENDPOINTS)):
+            print(f"    [!] Not every agent flushed; rows written later stay under {investigation_id}.")
+    finally:
+        transport.close()
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        deleted = 0
+        with conn.cursor() as cur:
+            for table in LOAD_TABLES:
+                cur.execute(f"DELETE FROM {table} WHERE investigation_id = %s", (investigation_id,))
+                deleted += cur.rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return deleted
+
+
+def bench_agents(args):
+    import agent_transport
+
+    # Its own investigation, so the rows it writes can be told apart and deleted afterwards
+    investigation_id = args.investigation_id or f"bench_agents_{int(time.time())}"
+    with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as f:
+        f.write(_synthetic_text(args.file_kb * 1024))
+        sample = f.name
+    payload = {"investigation_id": investigation_id, "file_path": sample, "keywords": CUSTOM_KEYWORDS}
+
+    print(f"[*] Agent services: {args.requests} requests per agent from {args.concurrency} threads, "
+          f"{args.file_kb} KB sample file")
+    print(f"    Findings are recorded under {investigation_id} and "
+          f"{'kept (--keep)' if args.keep else 'deleted from the database afterwards'}.")
+    print("    Run once per server (python run_all.py --server flask / waitress) to compare them.")
+    print(f"    {'agent':<16}  {'new connection':>15}  {'keep-alive':>12}  {'speed-up':>8}  {'failed':>7}")
+    try:
+        for agent, path in LOAD_ENDPOINTS.items():
+            url = agent_transport.AGENT_BASE_URLS[agent] + path
+            cold, cold_failed = _load_round(url, payload, args.requests, args.concurrency, keep_alive=False)
+            warm, warm_failed = _load_round(url, payload, args.requests, args.concurrency, keep_alive=True)
+            print(f"    {agent:<16}  {cold:>11.0f} r/s  {warm:>8.0f} r/s  {warm / cold:>7.2f}x  "
+                  f"{cold_failed + warm_failed:>7}")
+    finally:
+        os.remove(sample)
+        if not args.keep:
+            print(f"    Deleted {_delete_load_rows(investigation_id):,} rows written under {investigation_id}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DFIR suite micro-benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("keywords", help="Legacy vs compiled keyword scan throughput")
+    p.add_argument("--size-mb", type=float, default=2)
+    p.add_argument("--rounds", type=int, default=5)
+    p.set_defaults(func=bench_keywords)
+
+    p = sub.add_parser("keywords-diff", help="Compare compiled keyword hits with the legacy per-pattern scan")
+    p.add_argument("--cases", type=int, default=2000, help="Random inputs per library")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_keywords_diff)
+
+    p = sub.add_parser("hashstore", help="Known-bad hash store open time, memory and lookup throughput")
+    p.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 50], help="Store sizes in millions of entries")
+    p.add_argument("--lookups", type=int, default=200_000)
+    p.add_argument("--tmp-dir", default=None, help="Where the temporary stores are written (50M entries = 1.6 GB)")
+    p.set_defaults(func=bench_hashstore)
+
+    p = sub.add_parser("report", help="Report query latency vs findings table size (uses the configured database)")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    p.add_argument("--investigations", type=int, default=100, help="Findings are spread evenly over this many investigations")
+    p.add_argument("--partitions", type=int, default=0, help="Hash-partition the findings table (0 = unpartitioned)")
+    p.add_argument("--rounds", type=int, default=5)
+    p.add_argument("--keep", action="store_true", help=f"Keep the {BENCH_SCHEMA} schema afterwards")
+    p.set_defaults(func=bench_report)
+
+    p = sub.add_parser("agents", help="Requests/s per agent service, new connection per call vs keep-alive session")
+    p.add_argument("--requests", type=int, default=2000, help="Requests per agent and client mode")
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--file-kb", type=int, default=64, help="Size of the sample file every request analyzes")
+    p.add_argument("--investigation-id", default=None, help="Default: bench_agents_<unix time>")
+    p.add_argument("--keep", action="store_true", help="Keep the findings, manifest and Merkle rows the load test wrote")
+    p.set_defaults(func=bench_agents)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,10 @@
-import os, re, math, sqlite3, shutil, pathlib
+import os, re, sqlite3, shutil, pathlib
 from flask import Flask, request, jsonify
-from db_utils import save_to_db
+from db_utils import save_to_db, register_flush_endpoint
+from entropy_utils import shannon_entropy
 
 app = Flask(__name__)
+register_flush_endpoint(app)
 
 SAFE_INFRASTRUCTURE = [
     r".*\.google\.com$", r".*\.microsoft\.com$", r".*\.amazonaws\.com$",
@@ -84,10 +86,7 @@ def extract_hostname(domain):
 
 
 def calculate_entropy(domain):
-    if not domain:
-        return 0
-    prob = [float(domain.count(c)) / len(domain) for c in set(domain)]
-    return -sum(p * math.log(p, 2) for p in prob if p > 0)
+    return shannon_entropy(domain)
 
 
 def calculate_url_risk(url, visit_count):
@@ -137,15 +136,13 @@ def calculate_url_risk(url, visit_count):
 
     return score, reasons
 
-@app.route('/scan_browser', methods=['POST'])
-def scan_browser():
-    data             = request.get_json()
-    investigation_id = data.get('investigation_id')
+def run_scan(investigation_id):
+    """Scores recent history of every browser profile found; returns the response body and status."""
     findings_count   = 0
     history_paths    = get_browser_history_paths()
 
     if not history_paths:
-        return jsonify({"message": "No browser history files found"}), 200
+        return {"message": "No browser history files found"}, 200
 
     for browser, profile, history_path in history_paths:
         temp_db = f"history_{investigation_id}_{browser}_{profile}.db"
@@ -175,7 +172,13 @@ def scan_browser():
             if os.path.exists(temp_db):
                 os.remove(temp_db)
 
-    return jsonify({"status": "complete", "matches_found": findings_count})
+    return {"status": "complete", "matches_found": findings_count}, 200
+
+@app.route('/scan_browser', methods=['POST'])
+def scan_browser():
+    data = request.get_json()
+    result, status = run_scan(data.get('investigation_id'))
+    return jsonify(result), status
 
 if __name__ == '__main__':
     app.run(port=5007, debug=False)
\ No newline at end of file
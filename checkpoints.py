@@ -0,0 +1,154 @@
+# checkpoints.py
+"""
+Checkpoint journal for resumable investigations: which agent has finished which file.
+
+Entries are only written after every agent has flushed its buffered findings, so
+anything the journal marks complete is already in the findings store. Work done
+after the last checkpoint is repeated on resume (at-least-once), never lost.
+That includes threat-intel escalations: a file's THREAT_INTEL_STEP is journaled only
+once its lookup has resolved with a usable verdict (or none was needed), so a lookup
+that failed, or was still queued when the run died, is escalated again on resume.
+"""
+import time
+import threading
+from psycopg2.extras import execute_values
+from db_utils import pooled_connection
+from config import CHECKPOINT_INTERVAL
+
+# The per-file agents whose completion is tracked
+FILE_AGENTS = ("Hash Agent", "Keyword Agent", "Signature Agent", "Timeline Agent")
+# The agents whose results decide whether a file is escalated to threat intel
+ESCALATION_INPUTS = ("Hash Agent", "Keyword Agent", "Signature Agent")
+THREAT_INTEL_STEP = "Threat Intel Agent"
+# A file is done when all of these are
+FILE_STEPS = FILE_AGENTS + (THREAT_INTEL_STEP,)
+# file_path recorded for the system-level steps (registry, browser, memory)
+SYSTEM_STEP = ""
+
+INSERT_CHECKPOINTS_SQL = """
+    INSERT INTO file_checkpoints (investigation_id, file_path, agent_name)
+    VALUES %s ON CONFLICT DO NOTHING
+"""
+
+COMPLETED_SQL = """
+    SELECT file_path, agent_name FROM file_checkpoints
+    WHERE investigation_id = %s AND file_path = ANY(%s)
+"""
+
+
+def completed(investigation_id, file_paths):
+    """{file_path: {agent names}} for the given paths that have checkpoints."""
+    done = {}
+    with pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(COMPLETED_SQL, (investigation_id, list(file_paths)))
+            for path, agent in cur.fetchall():
+                done.setdefault(path, set()).add(agent)
+        conn.rollback()
+    return done
+
+
+def manifest_hashes(investigation_id, file_paths):
+    """{file_path: sha256 hex} already recorded for these files, for resumed files whose hash step is done."""
+    with pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT file_path, encode(sha256, 'hex') FROM hash_manifest "
+                "WHERE investigation_id = %s AND file_path = ANY(%s)",
+                (investigation_id, list(file_paths))
+            )
+            hashes = dict(cur.fetchall())
+        conn.rollback()
+    return hashes
+
+
+def escalation_findings(investigation_id, file_paths):
+    """
+    The given paths with a keyword hit or signature mismatch already stored: the escalation
+    reasons of resumed files whose keyword/signature results are not part of this run.
+    """
+    with pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT DISTINCT file_path FROM findings WHERE investigation_id = %s AND file_path = ANY(%s) "
+                "AND finding_type IN ('Keyword Hit', 'Signature Mismatch')",
+                (investigation_id, list(file_paths))
+            )
+            flagged = {row[0] for row in cur.fetchall()}
+        conn.rollback()
+    return flagged
+
+
+class CheckpointJournal:
+    """
+    Collects (file_path, agent) completions from the batch workers and commits them
+    at most every `interval` seconds: flush(), then one insert plus the
+    investigation's files_done/checkpoint_at progress, in one transaction.
+    """
+
+    def __init__(self, investigation_id, flush, interval=CHECKPOINT_INTERVAL):
+        self.investigation_id = investigation_id
+        self.flush            = flush
+        self.interval         = interval
+        self.last_commit      = time.monotonic()
+        self._pending         = []
+        self._pending_files   = 0
+        self._lock            = threading.Lock()
+        self._commit_lock     = threading.Lock()
+
+    def record(self, entries, files_done=0):
+        """entries: (file_path, agent_name) pairs finished since the last call; files_done: files now complete."""
+        with self._lock:
+            self._pending.extend(entries)
+            self._pending_files += files_done
+
+    def maybe_commit(self):
+        """Commits if the interval has passed and no other thread is already committing."""
+        if time.monotonic() - self.last_commit < self.interval:
+            return
+        if self._commit_lock.acquire(blocking=False):
+            try:
+                self._commit()
+            finally:
+                self._commit_lock.release()
+
+    def commit(self):
+        with self._commit_lock:
+            return self._commit()
+
+    def _commit(self):
+        with self._lock:
+            entries, files = self._pending, self._pending_files
+            self._pending, self._pending_files = [], 0
+        self.last_commit = time.monotonic()
+        if not entries and not files:
+            return True
+
+        # Only what was finished before the flush started is journaled
+        if not self.flush():
+            print("[!] Checkpoint skipped: not every agent confirmed its flush; retrying at the next checkpoint.")
+            self._requeue(entries, files)
+            return False
+        try:
+            with pooled_connection() as conn:
+                with conn.cursor() as cur:
+                    execute_values(cur, INSERT_CHECKPOINTS_SQL,
+                                   [(self.investigation_id, path, agent) for path, agent in entries],
+                                   page_size=1000)
+                    cur.execute(
+                        "UPDATE investigations SET files_done = files_done + %s, checkpoint_at = now() "
+                        "WHERE investigation_id = %s",
+                        (files, self.investigation_id)
+                    )
+                conn.commit()
+        except Exception as e:
+            print(f"[DB Error] Checkpoint of {len(entries)} entries failed, re-queued: {e}")
+            self._requeue(entries, files)
+            return False
+        print(f"[*] Checkpoint: {files} more files complete ({len(entries)} agent steps journaled)")
+        return True
+
+    def _requeue(self, entries, files):
+        with self._lock:
+            self._pending[:0] = entries
+            self._pending_files += files
@@ -13,4 +13,138 @@ DB_CONFIG = {
 }
 
 VIRUSTOTAL_API_KEY = os.environ.get("VIRUSTOTAL_API_KEY", "")
-API_AUTH_TOKEN     = os.environ.get("vit_secure_token_2026", "")
\ No newline at end of file
+API_AUTH_TOKEN     = os.environ.get("vit_secure_token_2026", "")
+
+# --- FINDINGS WRITER (db_utils) ---
+DB_POOL_MIN                = int(os.environ.get("DB_POOL_MIN", "1"))
+DB_POOL_MAX                = int(os.environ.get("DB_POOL_MAX", "8"))
+FINDINGS_BATCH_SIZE        = int(os.environ.get("FINDINGS_BATCH_SIZE", "500"))
+FINDINGS_FLUSH_INTERVAL    = float(os.environ.get("FINDINGS_FLUSH_INTERVAL", "2.0"))
+# Writers block once this many rows are buffered behind a failing database
+FINDINGS_MAX_BUFFER        = int(os.environ.get("FINDINGS_MAX_BUFFER", "50000"))
+FINDINGS_RETRY_MAX_BACKOFF = float(os.environ.get("FINDINGS_RETRY_MAX_BACKOFF", "60"))
+
+# --- CONTROLLER SCHEDULER ---
+CONTROLLER_WORKERS = int(os.environ.get("CONTROLLER_WORKERS", "8"))
+CONTROLLER_BATCH_SIZE = int(os.environ.get("CONTROLLER_BATCH_SIZE", "64"))
+
+# "http" calls the per-file agent microservices; "artifact" reads each file once
+# in the controller process and runs the same analyses in-process (artifact_analyzer.py).
+ANALYSIS_MODE           = os.environ.get("ANALYSIS_MODE", "http")
+ARTIFACT_MMAP_THRESHOLD = int(os.environ.get("ARTIFACT_MMAP_THRESHOLD", str(8 * 1024 * 1024)))
+# How the controller reaches the agents (agent_transport.py): "http" calls the services
+# started by run_all.py; "process" runs the agents' functions in AGENT_PROCESSES local processes.
+AGENT_TRANSPORT         = os.environ.get("AGENT_TRANSPORT", "http")
+AGENT_PROCESSES         = int(os.environ.get("AGENT_PROCESSES", str(os.cpu_count() or 4)))
+
+# --- HASH CACHE (hash_cache.py) ---
+# FORENSIC_MODE forces every file to be re-hashed from disk (chain-of-custody runs).
+HASH_CACHE_PATH = os.environ.get("HASH_CACHE_PATH", "hash_cache.sqlite3")
+FORENSIC_MODE   = os.environ.get("FORENSIC_MODE", "0").lower() in ("1", "true", "yes")
+
+# --- KEYWORD SCANNER ---
+# Whole files are streamed in KEYWORD_CHUNK_SIZE windows; KEYWORD_MAX_SCAN_BYTES > 0 caps the scan.
+KEYWORD_CHUNK_SIZE     = int(os.environ.get("KEYWORD_CHUNK_SIZE", str(1024 * 1024)))
+KEYWORD_CHUNK_OVERLAP  = int(os.environ.get("KEYWORD_CHUNK_OVERLAP", "4096"))
+KEYWORD_MAX_SCAN_BYTES = int(os.environ.get("KEYWORD_MAX_SCAN_BYTES", "0"))
+
+# --- ENTROPY (entropy_utils.py) ---
+ENTROPY_WINDOW_SIZE = int(os.environ.get("ENTROPY_WINDOW_SIZE", str(64 * 1024)))
+ENTROPY_WINDOW_STEP = int(os.environ.get("ENTROPY_WINDOW_STEP", str(32 * 1024)))
+
+# --- THREAT INTEL (threat_intel_agent.py, verdict_cache.py) ---
+# VT_API_URL can point at a local stub server; the public API allows 4 lookups/minute.
+VT_API_URL          = os.environ.get("VT_API_URL", "https://www.virustotal.com/api/v3/files/")
+VT_RATE_PER_MINUTE  = float(os.environ.get("VT_RATE_PER_MINUTE", "4"))
+VT_WORKERS          = int(os.environ.get("VT_WORKERS", "2"))
+VT_SYNC_WAIT        = float(os.environ.get("VT_SYNC_WAIT", "20"))
+VT_DRAIN_TIMEOUT    = float(os.environ.get("VT_DRAIN_TIMEOUT", "900"))
+VERDICT_CACHE_PATH  = os.environ.get("VERDICT_CACHE_PATH", "verdict_cache.sqlite3")
+# Seconds a cached verdict stays valid, per status. Detections rarely disappear;
+# "clean" and "not_found" go stale as vendors catch up with new samples.
+VERDICT_TTL = {
+    "malicious": int(os.environ.get("VERDICT_TTL_MALICIOUS", str(30 * 86400))),
+    "clean":     int(os.environ.get("VERDICT_TTL_CLEAN", str(86400))),
+    "not_found": int(os.environ.get("VERDICT_TTL_NOT_FOUND", str(6 * 3600))),
+}
+
+# --- KNOWN-BAD HASH STORE (hash_store.py) ---
+# Built with `python hash_store.py build <feeds> -o <path>`; a rebuilt file is picked up
+# by running agents within KNOWN_BAD_RELOAD_INTERVAL seconds.
+KNOWN_BAD_STORE_PATH      = os.environ.get("KNOWN_BAD_STORE_PATH", "known_bad.hashes")
+KNOWN_BAD_RELOAD_INTERVAL = float(os.environ.get("KNOWN_BAD_RELOAD_INTERVAL", "5"))
+
+# --- INTEGRITY SEAL (merkle_utils.py) ---
+# Rows per round trip when seal computation/verification streams findings from a server-side cursor
+SEAL_FETCH_SIZE = int(os.environ.get("SEAL_FETCH_SIZE", "10000"))
+
+# --- AI ANALYST (ai_analyst.py) ---
+# AI_CONCURRENCY should match the model server's parallel slots (e.g. OLLAMA_NUM_PARALLEL).
+OLLAMA_HOST     = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+AI_MODEL        = os.environ.get("AI_MODEL", "llama3.1:8b")
+AI_CONCURRENCY  = int(os.environ.get("AI_CONCURRENCY", "4"))
+AI_UPDATE_BATCH = int(os.environ.get("AI_UPDATE_BATCH", "50"))
+# Triage: only artifacts scoring >= AI_RISK_THRESHOLD (report weights, "File Hash" rows excluded)
+# are analyzed, at most AI_TOP_K of them (0 = all) within AI_TIME_BUDGET seconds (0 = unlimited).
+AI_RISK_THRESHOLD = int(os.environ.get("AI_RISK_THRESHOLD", "5"))
+AI_TOP_K          = int(os.environ.get("AI_TOP_K", "0"))
+AI_TIME_BUDGET    = float(os.environ.get("AI_TIME_BUDGET", "0"))
+# Insights are reused across files and investigations with the same normalized findings
+INSIGHT_CACHE_PATH        = os.environ.get("INSIGHT_CACHE_PATH", "insight_cache.sqlite3")
+INSIGHT_CACHE_MAX_ENTRIES = int(os.environ.get("INSIGHT_CACHE_MAX_ENTRIES", "50000"))
+
+# --- SCHEMA (db_schema.py) ---
+# > 0 creates a new findings table hash-partitioned on investigation_id into this many partitions
+FINDINGS_PARTITIONS = int(os.environ.get("FINDINGS_PARTITIONS", "0"))
+
+# --- REPORT API (main_app.py, report_queries.py) ---
+REPORT_PAGE_SIZE     = int(os.environ.get("REPORT_PAGE_SIZE", "50"))
+REPORT_MAX_PAGE_SIZE = int(os.environ.get("REPORT_MAX_PAGE_SIZE", "500"))
+# Most findings one /api/findings/latest response carries; the raw log pages through the rest
+FINDINGS_PAGE_SIZE   = int(os.environ.get("FINDINGS_PAGE_SIZE", "1000"))
+
+# --- PROGRESS EVENTS (event_bus.py, /api/events) ---
+EVENT_HISTORY_SIZE      = int(os.environ.get("EVENT_HISTORY_SIZE", "500"))
+EVENT_QUEUE_SIZE        = int(os.environ.get("EVENT_QUEUE_SIZE", "1000"))
+EVENT_KEEPALIVE         = float(os.environ.get("EVENT_KEEPALIVE", "15"))
+# How often a running investigation's stored record count is checked for new findings
+FINDINGS_WATCH_INTERVAL = float(os.environ.get("FINDINGS_WATCH_INTERVAL", "2"))
+
+# --- FILE ENUMERATION (file_enumerator.py) ---
+ENUM_WORKERS    = int(os.environ.get("ENUM_WORKERS", "8"))
+# Discovered files waiting for the controller; the walk pauses when this many are buffered
+ENUM_QUEUE_SIZE = int(os.environ.get("ENUM_QUEUE_SIZE", "10000"))
+# Comma-separated globs, matched against the path relative to the evidence root or the file name
+ENUM_INCLUDE    = [g for g in os.environ.get("ENUM_INCLUDE", "").split(",") if g]
+ENUM_EXCLUDE    = [g for g in os.environ.get("ENUM_EXCLUDE", "").split(",") if g]
+ENUM_MIN_SIZE   = int(os.environ.get("ENUM_MIN_SIZE", "0"))
+ENUM_MAX_SIZE   = int(os.environ.get("ENUM_MAX_SIZE", "0"))    # bytes, 0 = no limit
+ENUM_MAX_DEPTH  = int(os.environ.get("ENUM_MAX_DEPTH", "-1"))  # -1 = unlimited
+
+# --- CHECKPOINTS (checkpoints.py) ---
+# Seconds between checkpoints; each one asks every agent to flush before journaling completed files
+CHECKPOINT_INTERVAL = float(os.environ.get("CHECKPOINT_INTERVAL", "60"))
+
+# --- CONTENT DEDUP (content_dedup.py) ---
+# Files whose SHA-256 was already analyzed reuse the keyword/signature verdict instead of being scanned
+CONTENT_DEDUP            = os.environ.get("CONTENT_DEDUP", "1").lower() in ("1", "true", "yes")
+# Verdicts kept in memory per process; older ones are looked up in content_verdicts again
+CONTENT_DEDUP_CACHE_SIZE = int(os.environ.get("CONTENT_DEDUP_CACHE_SIZE", "100000"))
+
+# --- AGENT HTTP CLIENT (agent_transport.py, http transport) ---
+# One keep-alive session; at most AGENT_HTTP_CONCURRENCY requests in flight per agent.
+# Per-agent overrides are comma-separated "<agent module>=<value>", e.g. "keyword_agent=16,scan_memory=1".
+AGENT_HTTP_CONCURRENCY           = int(os.environ.get("AGENT_HTTP_CONCURRENCY", "8"))
+AGENT_HTTP_CONCURRENCY_OVERRIDES = {k: int(v) for k, _, v in (
+    item.partition("=") for item in os.environ.get("AGENT_HTTP_CONCURRENCY_OVERRIDES", "").split(",") if "=" in item)}
+AGENT_HTTP_CONNECT_TIMEOUT       = float(os.environ.get("AGENT_HTTP_CONNECT_TIMEOUT", "3"))
+AGENT_HTTP_TIMEOUT               = float(os.environ.get("AGENT_HTTP_TIMEOUT", "25"))   # seconds between bytes of a response
+AGENT_HTTP_TIMEOUT_OVERRIDES     = {k: float(v) for k, _, v in (
+    item.partition("=") for item in os.environ.get("AGENT_HTTP_TIMEOUT_OVERRIDES", "").split(",") if "=" in item)}
+
+# --- AGENT SERVER (run_all.py) ---
+# "waitress" (any OS) or "gunicorn" (POSIX) serve each agent with AGENT_SERVER_THREADS request
+# threads in one process - agents keep findings buffers and lookup queues in memory, so they are
+# not split across worker processes. "flask" is the development server.
+AGENT_SERVER         = os.environ.get("AGENT_SERVER", "waitress")
+AGENT_SERVER_THREADS = int(os.environ.get("AGENT_SERVER_THREADS", "16"))
@@ -0,0 +1,224 @@
+# content_dedup.py
+"""
+Content-addressed reuse of the keyword and signature verdicts.
+
+Both analyses depend only on a file's bytes (and the keyword list), so once a
+SHA-256 has been analyzed every other file with that hash - in this or any later
+investigation - gets the stored findings re-recorded under its own path instead
+of being scanned again. Path-specific checks (extension mismatch, timeline) are
+always evaluated per file.
+
+Verdicts are cached in-process and written to content_verdicts by flush(),
+together with each investigation's reused/analyzed counters.
+"""
+import json
+import hashlib
+import functools
+import threading
+import collections
+from psycopg2.extras import execute_values
+import keyword_agent
+import file_signature_agent
+from db_utils import save_to_db, pooled_connection
+from file_signature_agent import extension_mismatch
+from config import CONTENT_DEDUP_CACHE_SIZE, ENTROPY_WINDOW_SIZE, ENTROPY_WINDOW_STEP
+
+# Bump when the matching or signature/entropy code changes in ways the analysis key cannot see
+# (pattern sources and thresholds are part of the key already), so older verdicts are not reused
+VERDICT_VERSION = 2
+
+LOOKUP_SQL = """
+    SELECT encode(sha256, 'hex'), keyword, signature FROM content_verdicts
+    WHERE analysis_key = %s AND sha256 = ANY(%s)
+"""
+
+INSERT_VERDICTS_SQL = """
+    INSERT INTO content_verdicts (sha256, analysis_key, keyword, signature, first_investigation_id)
+    VALUES %s ON CONFLICT DO NOTHING
+"""
+
+_lock    = threading.Lock()
+_cache   = collections.OrderedDict()   # (sha256 hex, analysis key) -> verdict
+_pending = []                          # verdict rows not yet written
+_counts  = {}                          # investigation_id -> [reused, analyzed] not yet written
+_stats   = {"reused": 0, "analyzed": 0}
+
+
+def analysis_key(keywords):
+    """
+    Identifies the analysis a verdict was produced with: the compiled keyword patterns
+    (library and custom keywords), the signature and entropy parameters, and VERDICT_VERSION.
+    Editing any of them starts a fresh set of verdicts instead of replaying stale ones.
+    """
+    return _analysis_key(keyword_agent._keyword_key(keywords))
+
+
+@functools.lru_cache(maxsize=64)
+def _analysis_key(keywords):
+    sig = file_signature_agent
+    material = json.dumps([
+        VERDICT_VERSION,
+        [(category, source.decode('latin-1'), kind) for category, source, kind in keyword_agent._pattern_entries(keywords)],
+        [keyword_agent.MAX_HITS_PER_PATTERN, keyword_agent.CONTEXT_BYTES],
+        [sorted(sig.MAGIC_NUMBERS.items()), sig.PACKED_SCAN_TYPES, sig.HIGH_ENTROPY_THRESHOLD,
+         ENTROPY_WINDOW_SIZE, ENTROPY_WINDOW_STEP],
+    ])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()[:16]
+
+
+def _remember(key, verdict):
+    _cache[key] = verdict
+    _cache.move_to_end(key)
+    while len(_cache) > CONTENT_DEDUP_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def lookup(hashes, key):
+    """{sha256 hex: verdict} for the hashes that were already analyzed with this analysis key."""
+    found, missing = {}, []
+    with _lock:
+        for h in set(hashes):
+            verdict = _cache.get((h, key))
+            if verdict is not None:
+                found[h] = verdict
+            else:
+                missing.append(h)
+    if not missing:
+        return found
+    try:
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(LOOKUP_SQL, (key, [bytes.fromhex(h) for h in missing]))
+                rows = cur.fetchall()
+            conn.rollback()
+    except Exception as e:
+        print(f"[Dedup] Verdict lookup failed, analyzing {len(missing)} hashes again: {e}")
+        return found
+    with _lock:
+        for h, keyword, signature in rows:
+            found[h] = {"keyword": keyword, "signature": signature}
+            _remember((h, key), found[h])
+    return found
+
+
+def verdict_of(key_res, sig_res):
+    """The reusable part of a keyword and a signature result, or None unless both succeeded."""
+    if not (key_res and sig_res and key_res.get('status') == 200 and sig_res.get('status') == 200):
+        return None
+    return {
+        "keyword": {
+            "matches_found": key_res.get('matches_found', 0),
+            "categories":    key_res.get('categories', []),
+            "findings":      key_res.get('findings', []),
+        },
+        "signature": {
+            "detected_type":    sig_res['detected_type'],
+            "entropy":          sig_res['entropy'],
+            "packed_regions":   sig_res.get('packed_regions', 0),
+            "content_findings": sig_res.get('content_findings', []),
+        },
+    }
+
+
+def store(file_hash, key, verdict, investigation_id):
+    """Caches the verdict of a freshly analyzed file and queues it for the database."""
+    with _lock:
+        if (file_hash, key) not in _cache:
+            _pending.append((bytes.fromhex(file_hash), key, json.dumps(verdict["keyword"]),
+                             json.dumps(verdict["signature"]), investigation_id))
+        _remember((file_hash, key), verdict)
+        _counts.setdefault(investigation_id, [0, 0])[1] += 1
+        _stats["analyzed"] += 1
+
+
+def count_reused(investigation_id):
+    """Counts one file whose verdict was replayed rather than computed."""
+    with _lock:
+        _counts.setdefault(investigation_id, [0, 0])[0] += 1
+        _stats["reused"] += 1
+
+
+def replay_keyword(verdict, file_path, investigation_id):
+    """Records the stored keyword findings for file_path; returns what the Keyword Agent would have."""
+    keyword = verdict["keyword"]
+    for description in keyword["findings"]:
+        save_to_db("KeywordAgent", "Keyword Hit", description, investigation_id, file_path)
+    return {"status": 200, "file": file_path, "reused": True, **keyword}
+
+
+def replay_signature(verdict, file_path, investigation_id):
+    """
+    Records the stored entropy findings for file_path and runs the extension check,
+    which depends on the path; returns what the Signature Agent would have.
+    """
+    signature = verdict["signature"]
+    for finding_type, description in signature["content_findings"]:
+        save_to_db("Signature Agent", finding_type, description, investigation_id, file_path)
+    mismatch_desc = extension_mismatch(file_path, signature["detected_type"])
+    if mismatch_desc:
+        save_to_db("Signature Agent", "Signature Mismatch", mismatch_desc, investigation_id, file_path)
+    return {"status": 200, "file": file_path, "reused": True, "mismatch_found": mismatch_desc is not None,
+            **signature}
+
+
+def flush():
+    """Writes queued verdicts and dedup counters. Returns False (and keeps them queued) on failure."""
+    with _lock:
+        rows, counts = list(_pending), dict(_counts)
+        _pending.clear()
+        _counts.clear()
+    if not rows and not counts:
+        return True
+    try:
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                if rows:
+                    execute_values(cur, INSERT_VERDICTS_SQL, rows, page_size=1000)
+                for investigation_id, (reused, analyzed) in counts.items():
+                    cur.execute(
+                        "UPDATE investigations SET content_reused = content_reused + %s, "
+                        "content_analyzed = content_analyzed + %s WHERE investigation_id = %s",
+                        (reused, analyzed, investigation_id)
+                    )
+            conn.commit()
+    except Exception as e:
+        print(f"[DB Error] Could not write {len(rows)} content verdicts, re-queued: {e}")
+        with _lock:
+            _pending[:0] = rows
+            for investigation_id, (reused, analyzed) in counts.items():
+                pending = _counts.setdefault(investigation_id, [0, 0])
+                pending[0] += reused
+                pending[1] += analyzed
+        return False
+    return True
+
+
+def dedup_ratio(reused, analyzed):
+    """Share of files whose content verdict was reused instead of computed."""
+    total = reused + analyzed
+    return round(reused / total, 4) if total else 0.0
+
+
+def investigation_stats(investigation_id):
+    """Stored reused/analyzed counters and dedup ratio of one investigation, or None if unavailable."""
+    try:
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT content_reused, content_analyzed FROM investigations WHERE investigation_id = %s",
+                            (investigation_id,))
+                row = cur.fetchone()
+            conn.rollback()
+    except Exception as e:
+        print(f"[Dedup] Could not read the counters of {investigation_id}: {e}")
+        return None
+    if row is None:
+        return None
+    return {"reused": row[0], "analyzed": row[1], "dedup_ratio": dedup_ratio(row[0], row[1])}
+
+
+def get_stats():
+    """Reused/analyzed counters for this process since start-up."""
+    with _lock:
+        stats = dict(_stats)
+    stats["dedup_ratio"] = dedup_ratio(stats["reused"], stats["analyzed"])
+    return stats
@@ -1,125 +1,504 @@
 import sys
 import os
-import requests
 import time
 import psycopg2
+import argparse
+import threading
 import merkle_utils
-from config import DB_CONFIG 
-
-# --- AGENT MICROSERVICE ENDPOINTS ---
-HASH_AGENT_URL = "http://127.0.0.1:5001/analyze_file"
-KEYWORD_AGENT_URL = "http://127.0.0.1:5002/search_keywords"
-FILE_SIGNATURE_AGENT_URL = "http://127.0.0.1:5003/verify_signature"
-TIMELINE_AGENT_URL = "http://127.0.0.1:5004/get_timestamps"
-THREAT_INTEL_AGENT_URL = "http://127.0.0.1:5005/check_hash"
-REGISTRY_AGENT_URL = "http://127.0.0.1:5006/scan_registry"
-BROWSER_AGENT_URL = "http://127.0.0.1:5007/scan_browser"
-MEMORY_AGENT_URL = "http://127.0.0.1:5008/scan_memory" 
-
-
-def call_agent(url, payload, agent_name, retries=3, delay=2):
-    """Helper function to communicate with the Flask microservice agents."""
-    for i in range(retries):
+import event_bus
+import hash_cache
+import file_enumerator
+import checkpoints
+import content_dedup
+import artifact_analyzer
+import agent_transport
+from concurrent.futures import ThreadPoolExecutor
+from db_utils import flush_findings, ensure_schema
+from config import (DB_CONFIG, CONTROLLER_WORKERS, CONTROLLER_BATCH_SIZE, ANALYSIS_MODE, FORENSIC_MODE,
+                    VT_DRAIN_TIMEOUT, ENUM_INCLUDE, ENUM_EXCLUDE, ENUM_MIN_SIZE, ENUM_MAX_SIZE, ENUM_MAX_DEPTH,
+                    CONTENT_DEDUP, AGENT_TRANSPORT, AGENT_PROCESSES)
+
+CUSTOM_KEYWORDS = ["internal_project", "confidential"]
+
+# Set by --events (main_app passes it): progress is also written as event_bus lines on stdout
+EMIT_EVENTS = False
+
+def emit_event(event_type, **data):
+    if EMIT_EVENTS:
+        event_bus.emit(event_type, **data)
+
+class ScanProgress:
+    """Files done, per-agent throughput and ETA for the file phase, reported as "progress" events."""
+
+    def __init__(self, investigation_id, total_files, enumerating=False):
+        self.investigation_id = investigation_id
+        self.total_files      = total_files
+        # While files are still being discovered total_files is a running count and there is no ETA
+        self.enumerating      = enumerating
+        self.files_done       = 0
+        self.started          = time.monotonic()
+        self.agents           = {}   # agent name -> [files, busy seconds]
+        self._lock            = threading.Lock()
+
+    def timed(self, agent_name, files, fn, *args):
+        """Runs fn(*args), charging its wall time and `files` files to agent_name."""
+        start = time.monotonic()
         try:
-            response = requests.post(url, json=payload, timeout=25)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            if i == retries - 1:
-                print(f"[!] Agent {agent_name} failed at {url}")
-            time.sleep(delay)
-    return None
-
-def run_investigation(directory_path, investigation_id):
+            return fn(*args)
+        finally:
+            with self._lock:
+                totals = self.agents.setdefault(agent_name, [0, 0.0])
+                totals[0] += files
+                totals[1] += time.monotonic() - start
+
+    def discovered(self, files, finished=False):
+        with self._lock:
+            self.total_files += files
+            self.enumerating = not finished
+
+    def batch_done(self, files):
+        with self._lock:
+            self.files_done += files
+            elapsed = time.monotonic() - self.started
+            rate    = self.files_done / elapsed if elapsed > 0 else 0.0
+            agents  = {
+                name: {"files": n, "files_per_sec": round(n / busy, 1) if busy > 0 else None}
+                for name, (n, busy) in self.agents.items()
+            }
+            done, total, enumerating = self.files_done, self.total_files, self.enumerating
+        emit_event("progress", investigation_id=self.investigation_id,
+                   files_done=done, files_total=total, enumerating=enumerating,
+                   files_per_sec=round(rate, 1),
+                   eta_seconds=round((total - done) / rate) if rate > 0 and not enumerating else None,
+                   agents=agents)
+
+def flush_agents(transport, agent_names=None):
+    """
+    Asks every agent (or just `agent_names`) to write its buffered findings so the seal
+    covers all of them. Returns True if every flush was confirmed.
+    """
+    confirmed = True
+    # Artifact mode, content dedup and in-process threat intel record findings from this process
+    if flush_findings() is None:
+        print("    [!] Controller could not flush its own findings; they may be missing from the seal.")
+        confirmed = False
+    if not transport.flush(agent_names):
+        confirmed = False
+    return confirmed
+
+def drain_threat_intel(transport, investigation_id):
+    """
+    Waits for the Threat Intel agent to resolve every lookup queued for this investigation.
+    Returns the file paths whose queued lookup resolved with a usable verdict; failed and
+    timed-out lookups are left out, so they are escalated again on resume.
+    """
+    res = transport.drain(investigation_id, VT_DRAIN_TIMEOUT)
+    if res is None:
+        print("    [!] Threat Intel Agent did not confirm its queue drained; late verdicts may be missing.")
+        return set()
+    if res.get('abandoned'):
+        print(f"    [!] {res['abandoned']} threat-intel lookups timed out and are not part of this investigation.")
+    return set(res.get('settled', []))
+
+def _batch_result(results, file_path):
+    """The per-file result on success, None on any agent-side error."""
+    res = results.get(file_path)
+    return res if res and res.get('status') == 200 else None
+
+def report_hash_cache_stats(transport, mode):
+    """Prints the hash cache hit/miss counters of whichever process(es) did the hashing."""
+    stats = hash_cache.get_stats() if mode == "artifact" else transport.cache_stats()
+    if stats is None:
+        return
+    print(f"[*] Hash Cache: {stats['hits']} hits, {stats['misses']} misses, "
+          f"{stats['bypassed']} forced re-hashes (hit rate {stats['hit_rate']:.1%})")
+
+def report_content_dedup(investigation_id):
+    """Prints how many files of the investigation reused a stored content verdict."""
+    stats = content_dedup.investigation_stats(investigation_id)
+    if stats is None:
+        return
+    print(f"[*] Content Dedup: {stats['reused']} files reused a verdict, {stats['analyzed']} analyzed "
+          f"(dedup ratio {stats['dedup_ratio']:.1%})")
+    emit_event("dedup", investigation_id=investigation_id, **stats)
+
+def _submit_agent(agent_pool, progress, transport, agent_name, file_paths, payload):
+    """Queues one agent's batch call; files it already finished (resumed runs) are left out."""
+    if not file_paths:
+        return None
+    return agent_pool.submit(progress.timed, agent_name, len(file_paths), transport.analyze_files,
+                             agent_name, file_paths, payload)
+
+def _content_plan(file_paths, hash_results, key, todo):
+    """
+    Splits the files still needing keyword/signature analysis by content: returns
+    ({path: hash}, {hash: verdict} already known, {hash: first path} to analyze, [duplicate paths]).
+    Only one file per unknown hash in the batch is sent to the agents; its twins wait for its verdict.
+    """
+    hashes = {}
+    for p in file_paths:
+        hash_res = _batch_result(hash_results, p)
+        if hash_res and hash_res.get('hash') and (p in todo["Keyword Agent"] or p in todo["Signature Agent"]):
+            hashes[p] = hash_res['hash']
+    known = content_dedup.lookup(hashes.values(), key)
+    first, duplicates = {}, []
+    for p, h in hashes.items():
+        if h in known or h in first:
+            duplicates.append(p)
+        else:
+            first[h] = p
+    return hashes, known, first, duplicates
+
+def _replay_verdicts(paths, hashes, known, investigation_id, todo, key_results, sig_results):
+    """Records the stored verdicts for duplicate files; returns the paths whose content has no verdict after all."""
+    missing = []
+    for p in paths:
+        verdict = known.get(hashes[p])
+        if verdict is None:
+            missing.append(p)
+            continue
+        if p in todo["Keyword Agent"]:
+            key_results[p] = content_dedup.replay_keyword(verdict, p, investigation_id)
+        if p in todo["Signature Agent"]:
+            sig_results[p] = content_dedup.replay_signature(verdict, p, investigation_id)
+        content_dedup.count_reused(investigation_id)
+    return missing
+
+def analyze_batch(file_paths, investigation_id, agent_pool, mode=ANALYSIS_MODE, forensic_mode=FORENSIC_MODE,
+                  progress=None, stats=None, done=None, dedup=CONTENT_DEDUP, transport=None):
+    """
+    Runs the four per-file agents over one batch of files - concurrently over HTTP,
+    or with a single read per file in artifact mode - then escalates individual
+    files to Threat Intel once their prerequisites (hash + keyword/signature) are in.
+    With `dedup`, files are hashed first and content analyzed before (in this batch,
+    investigation or an earlier one) gets its keyword/signature verdict replayed
+    instead of being scanned again; see content_dedup.
+    `stats` maps paths to the enumerator's stat results; artifact mode reuses them.
+    `done` maps paths to the agents that already finished them in an interrupted run.
+    `transport` reaches the agents (agent_transport; HTTP services by default).
+    Returns the (file_path, agent_name) steps completed by this call. A file's threat-intel
+    step is among them only if it needed no lookup or its verdict was already known;
+    lookups still queued are settled by the caller once they have been drained.
+    """
+    stats = stats or {}
+    done  = done or {}
+    transport = transport or agent_transport.HttpTransport()
+    print(f"\n[*] Analyzing {len(file_paths)} files, starting at: {os.path.basename(file_paths[0])}")
+    base_payload = {"investigation_id": investigation_id}
+    time_job = None
+    progress = progress or ScanProgress(investigation_id, len(file_paths))
+    n = len(file_paths)
+
+    # AGENTS 1-4: HASHING, KEYWORD SCAN (Forensic Library), FILE SIGNATURE, TIMELINE
+    if mode == "artifact":
+        # One read feeds all four analyses, so a partly finished file is simply analyzed again.
+        # Files only waiting for their threat-intel step are not read at all.
+        redo = [p for p in file_paths if not set(checkpoints.FILE_AGENTS) <= done.get(p, set())]
+        per_file = progress.timed("Artifact Analyzer", len(redo), lambda: {
+            p: artifact_analyzer.analyze_artifact(p, investigation_id, CUSTOM_KEYWORDS, forensic_mode=forensic_mode,
+                                                  st=stats.get(p), dedup=dedup)
+            for p in redo
+        })
+        hash_results = {p: r['hash']      for p, r in per_file.items()}
+        key_results  = {p: r['keyword']   for p, r in per_file.items()}
+        sig_results  = {p: r['signature'] for p, r in per_file.items()}
+        completed = [(p, agent) for p in redo for agent in checkpoints.FILE_AGENTS]
+        rehash = [p for p in file_paths if p not in per_file]
+        if rehash:
+            for p, file_hash in checkpoints.manifest_hashes(investigation_id, rehash).items():
+                hash_results[p] = {"status": 200, "hash": file_hash}
+    else:
+        todo = {agent: [p for p in file_paths if agent not in done.get(p, ())] for agent in checkpoints.FILE_AGENTS}
+        hash_job = _submit_agent(agent_pool, progress, transport, "Hash Agent", todo["Hash Agent"], {
+            **base_payload,
+            "forensic_mode": forensic_mode,
+        })
+        time_job = _submit_agent(agent_pool, progress, transport, "Timeline Agent", todo["Timeline Agent"],
+                                 base_payload)
+
+        def submit_content(paths):
+            """Queues the keyword and signature agents over `paths`, each only where it is still to do."""
+            key_job = _submit_agent(agent_pool, progress, transport, "Keyword Agent",
+                                    [p for p in paths if p in todo["Keyword Agent"]], {
+                **base_payload,
+                "keywords": CUSTOM_KEYWORDS,
+            })
+            sig_job = _submit_agent(agent_pool, progress, transport, "Signature Agent",
+                                    [p for p in paths if p in todo["Signature Agent"]], base_payload)
+            return key_job, sig_job
+
+        def content_results(jobs):
+            return tuple(job.result() if job else {} for job in jobs)
+
+        # With dedup the hashes come first: they decide which files need the content agents at all
+        content_jobs = None if dedup else submit_content(file_paths)
+        hash_results = hash_job.result() if hash_job else {}
+        # Resumed files hashed before the interruption: their hash is in the manifest
+        rehash = [p for p in file_paths if p not in todo["Hash Agent"]]
+        if rehash:
+            for p, file_hash in checkpoints.manifest_hashes(investigation_id, rehash).items():
+                hash_results[p] = {"status": 200, "hash": file_hash}
+
+        if dedup:
+            key = content_dedup.analysis_key(CUSTOM_KEYWORDS)
+            hashes, known, first, duplicates = _content_plan(file_paths, hash_results, key, todo)
+            duplicate_set = set(duplicates)
+            key_results, sig_results = content_results(submit_content([p for p in file_paths if p not in duplicate_set]))
+            for h, p in first.items():
+                verdict = content_dedup.verdict_of(_batch_result(key_results, p), _batch_result(sig_results, p))
+                if verdict:
+                    content_dedup.store(h, key, verdict, investigation_id)
+                    known[h] = verdict
+            missing = progress.timed("Content Dedup", len(duplicates), _replay_verdicts, duplicates, hashes, known,
+                                     investigation_id, todo, key_results, sig_results)
+            if missing:
+                # The file analyzed for this content failed or was only partly redone: scan its twins directly
+                retry_key, retry_sig = content_results(submit_content(missing))
+                key_results.update(retry_key)
+                sig_results.update(retry_sig)
+        else:
+            key_results, sig_results = content_results(content_jobs)
+
+        # Any answer, including a per-file error such as a vanished file, is final for that agent
+        completed = [(p, "Hash Agent") for p in hash_results if p in todo["Hash Agent"]] + \
+                    [(p, "Keyword Agent") for p in key_results] + \
+                    [(p, "Signature Agent") for p in sig_results]
+
+    # AGENT 5: THREAT INTEL (Escalation) - does not wait on the timeline agent.
+    # The whole batch is queued in one request; verdicts arrive asynchronously (see drain_threat_intel).
+    # Files whose keyword/signature results came from an interrupted run are escalated on their stored findings.
+    steps = {}
+    for p, agent in completed:
+        steps.setdefault(p, set()).add(agent)
+    resumed = [p for p in file_paths if done.get(p) and checkpoints.THREAT_INTEL_STEP not in done[p]]
+    flagged = checkpoints.escalation_findings(investigation_id, resumed) if resumed else set()
+    escalations, settled = [], []
+    for file_path in file_paths:
+        finished = steps.get(file_path, set()) | done.get(file_path, set())
+        if checkpoints.THREAT_INTEL_STEP in finished or not set(checkpoints.ESCALATION_INPUTS) <= finished:
+            continue   # settled before, or not decidable until its missing agents are rerun
+        hash_res = _batch_result(hash_results, file_path)
+        file_hash = hash_res.get('hash') if hash_res else None
+
+        key_res = _batch_result(key_results, file_path)
+        keyword_hit = key_res and key_res.get('matches_found', 0) > 0
+
+        sig_res = _batch_result(sig_results, file_path)
+        signature_mismatch = sig_res and sig_res.get('mismatch_found')
+
+        if (signature_mismatch or keyword_hit or file_path in flagged) and file_hash:
+            print(f"    [!] Escalating {os.path.basename(file_path)} to Threat Intel...")
+            escalations.append({"hash_to_check": file_hash, "file_path": file_path})
+        else:
+            settled.append(file_path)
+
+    if escalations:
+        res = progress.timed("Threat Intel Agent", len(escalations), transport.check_hashes, investigation_id,
+                             escalations)
+        # Verdicts answered from the cache are final; queued lookups settle when they are drained
+        settled += [r['file_path'] for r in (res or {}).get('results', []) if r.get('code') == 200]
+    completed += [(p, checkpoints.THREAT_INTEL_STEP) for p in settled]
+    if time_job is not None:
+        completed += [(p, "Timeline Agent") for p in time_job.result()]
+    content_dedup.flush()
+    progress.batch_done(n)
+    return completed
+
+def run_system_step(transport, investigation_id, agent_name, done=()):
+    """Runs one system-level agent unless a resumed run already finished it, then checkpoints it."""
+    if agent_name in done:
+        print(f"    [=] {agent_name} finished before the interruption; skipped.")
+        return
+    if transport.system_scan(agent_name, investigation_id) is None:
+        return
+    journal = checkpoints.CheckpointJournal(investigation_id, lambda: flush_agents(transport, [agent_name]))
+    journal.record([(checkpoints.SYSTEM_STEP, agent_name)])
+    journal.commit()
+
+def mark_interrupted(investigation_id):
+    """Leaves a crashed run visibly INTERRUPTED (rather than RUNNING) so it can be resumed."""
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE investigations SET status = %s WHERE investigation_id = %s AND status = %s",
+                ("INTERRUPTED", investigation_id, "RUNNING")
+            )
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"[!] Could not mark {investigation_id} as interrupted: {e}")
+
+def _batched(entries, batch_size):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def run_investigation(directory_path, investigation_id, workers=CONTROLLER_WORKERS,
+                      batch_size=CONTROLLER_BATCH_SIZE, mode=ANALYSIS_MODE, forensic_mode=FORENSIC_MODE,
+                      include=ENUM_INCLUDE, exclude=ENUM_EXCLUDE, min_size=ENUM_MIN_SIZE, max_size=ENUM_MAX_SIZE,
+                      max_depth=ENUM_MAX_DEPTH, resume=False, dedup=CONTENT_DEDUP, transport=AGENT_TRANSPORT,
+                      processes=AGENT_PROCESSES):
     """
     Orchestrates the 8-agent investigation and seals 
     all results with a Hardware-Bound Merkle Root.
+    With resume=True an interrupted investigation continues where its last
+    checkpoint left off: finished files and system steps are skipped.
+    transport="process" runs the agents in `processes` local worker processes
+    instead of calling the services started by run_all.py.
     """
     print(f"--- Starting Full Investigation [{investigation_id}] ---")
     
     # ADVANCED FEATURE: CAPTURE HARDWARE ID FOR INTEGRITY BINDING
     hw_id = merkle_utils.get_hardware_id()
     print(f"[*] Integrity Layer: Binding Seal to Hardware ID {hw_id}")
+    if forensic_mode:
+        print("[*] Forensic Mode: hash cache bypassed, every file is re-hashed from disk")
 
     # 1. Initialize the record in the investigations table
     conn = None
+    ensure_schema()
     try:
         conn = psycopg2.connect(**DB_CONFIG)
         cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO investigations (investigation_id, status) VALUES (%s, %s)",
-            (investigation_id, "RUNNING")
-        )
+        if resume:
+            cur.execute(
+                "SELECT status, evidence_root, files_done, checkpoint_at FROM investigations WHERE investigation_id = %s",
+                (investigation_id,)
+            )
+            row = cur.fetchone()
+            if row is None:
+                print(f"[!] Cannot resume {investigation_id}: no such investigation.")
+                return
+            status, evidence_root, files_done, checkpoint_at = row
+            if status == "COMPLETED":
+                print(f"[!] {investigation_id} is already sealed; nothing to resume.")
+                return
+            if evidence_root and os.path.abspath(evidence_root) != os.path.abspath(directory_path):
+                print(f"[!] Warning: {investigation_id} was started on {evidence_root}, resuming on {directory_path}")
+            cur.execute("UPDATE investigations SET status = %s WHERE investigation_id = %s", ("RUNNING", investigation_id))
+            print(f"[*] Resuming {investigation_id} ({status}): {files_done} files complete as of {checkpoint_at}")
+        else:
+            cur.execute(
+                "INSERT INTO investigations (investigation_id, status, evidence_root) VALUES (%s, %s, %s)",
+                (investigation_id, "RUNNING", os.path.abspath(directory_path))
+            )
         conn.commit()
     except Exception as e:
-        print(f"[!] Database Init Error: {e}")
+        print(f"[!] Database Init Error: {e} (use --resume to continue an existing investigation)")
+        emit_event("phase", investigation_id=investigation_id, phase="failed", error=str(e))
         return
 
     # 2. File-Based Forensics (Disk Analysis)
-    files_to_process = []
-    for root, _, files in os.walk(directory_path):
-        for filename in files:
-            files_to_process.append(os.path.join(root, filename))
+    # Files are analyzed as the enumerator finds them; at most `workers * 2` batches wait for a worker,
+    # so memory stays flat however large the tree is.
+    emit_event("phase", investigation_id=investigation_id, phase="files")
+    agents = agent_transport.make_transport(transport, processes)
+    print(f"[*] Streaming files from {directory_path} in batches of {batch_size} across {workers} workers "
+          f"({mode} mode, {agents.name} transport)...")
+    progress   = ScanProgress(investigation_id, 0, enumerating=True)
+    enum_stats = {}
+    entries    = file_enumerator.enumerate_files(directory_path, include, exclude, min_size, max_size, max_depth,
+                                                 stats=enum_stats)
+    in_flight  = threading.BoundedSemaphore(workers * 2)
+    # Completed files are journaled after the agents holding their findings have flushed
+    journal    = checkpoints.CheckpointJournal(
+        investigation_id, lambda: flush_agents(agents, [checkpoints.THREAT_INTEL_STEP] if mode == "artifact"
+                                                       else checkpoints.FILE_STEPS))
+    all_agents = set(checkpoints.FILE_STEPS)
+    # Files analyzed by every per-file agent whose threat-intel lookup is still queued
+    awaiting_intel = []
 
-    for file_path in files_to_process:
-        print(f"\n[*] Analyzing File: {os.path.basename(file_path)}")
-        
-        # AGENT 1: HASHING
-        hash_res = call_agent(HASH_AGENT_URL, {"file_path": file_path, "investigation_id": investigation_id}, "Hash Agent")
-        file_hash = hash_res.get('hash') if hash_res else None
-
-        # AGENT 2: KEYWORD SCAN (Using Forensic Library)
-        key_res = call_agent(KEYWORD_AGENT_URL, {
-            "file_path": file_path, 
-            "keywords": ["internal_project", "confidential"], 
-            "investigation_id": investigation_id
-        }, "Keyword Agent")
-        keyword_hit = key_res and key_res.get('matches_found', 0) > 0
-
-        # AGENT 3: FILE SIGNATURE
-        sig_res = call_agent(FILE_SIGNATURE_AGENT_URL, {"file_path": file_path, "investigation_id": investigation_id}, "Signature Agent")
-        signature_mismatch = sig_res and sig_res.get('mismatch_found')
+    def run_batch(paths, st_map, done):
+        completed = analyze_batch(paths, investigation_id, agent_pool, mode, forensic_mode, progress, st_map, done,
+                                  dedup, agents)
+        steps = {}
+        for path, agent in completed:
+            steps.setdefault(path, set()).add(agent)
+        finished = sum(1 for p in paths if all_agents <= steps.get(p, set()) | done.get(p, set()))
+        awaiting_intel.extend(p for p in paths if all_agents - (steps.get(p, set()) | done.get(p, set()))
+                              == {checkpoints.THREAT_INTEL_STEP})
+        journal.record(completed, finished)
+        journal.maybe_commit()
 
-        # AGENT 4: TIMELINE ANALYSIS
-        call_agent(TIMELINE_AGENT_URL, {"file_path": file_path, "investigation_id": investigation_id}, "Timeline Agent")
-
-        # AGENT 5: THREAT INTEL (Escalation)
-        if (signature_mismatch or keyword_hit) and file_hash:
-            print(f"    [!] Escalating {os.path.basename(file_path)} to Threat Intel...")
-            call_agent(THREAT_INTEL_AGENT_URL, {
-                "hash_to_check": file_hash, 
-                "investigation_id": investigation_id,
-                "file_path": file_path
-            }, "Threat Intel Agent")
+    jobs, batch_count = [], 0
+    with ThreadPoolExecutor(max_workers=workers) as file_pool, \
+         ThreadPoolExecutor(max_workers=workers * 4) as agent_pool:
+        for batch in _batched(entries, batch_size):
+            done = checkpoints.completed(investigation_id, [e.path for e in batch]) if resume else {}
+            batch = [e for e in batch if not all_agents <= done.get(e.path, set())]
+            if not batch:
+                continue
+            progress.discovered(len(batch))
+            in_flight.acquire()
+            job = file_pool.submit(run_batch, [e.path for e in batch], {e.path: e.st for e in batch}, done)
+            job.add_done_callback(lambda _: in_flight.release())
+            jobs.append(job)
+            batch_count += 1
+        progress.discovered(0, finished=True)
+        print(f"[*] Enumeration complete: {enum_stats['files']} files in {enum_stats['dirs']} directories "
+              f"({enum_stats['skipped']} filtered out, {enum_stats['errors']} unreadable), {batch_count} batches")
+        emit_event("discovered", investigation_id=investigation_id, files=enum_stats['files'], batches=batch_count)
+        for job in jobs:
+            job.result()
+    journal.commit()
+    if resume:
+        print(f"[*] Resume: {enum_stats['files'] - progress.total_files} files were already complete and were skipped")
+    report_hash_cache_stats(agents, mode)
+    if dedup:
+        report_content_dedup(investigation_id)
 
     # 3. System-Level Forensics (OS Artifacts)
     print("\n[*] Running System-Level Persistence & Behavioral Scans...")
+    emit_event("phase", investigation_id=investigation_id, phase="system")
+    
+    system_done = checkpoints.completed(investigation_id, [checkpoints.SYSTEM_STEP]).get(checkpoints.SYSTEM_STEP, set()) \
+        if resume else set()
     
     # AGENT 6: REGISTRY HIVE AGENT
     print("    [>] Checking Registry Hives for Hijacks...")
-    call_agent(REGISTRY_AGENT_URL, {"investigation_id": investigation_id}, "Registry Agent")
+    run_system_step(agents, investigation_id, "Registry Agent", system_done)
 
     # AGENT 7: BROWSER FORENSIC AGENT
     print("    [>] Analyzing Browser Behavioral History...")
-    call_agent(BROWSER_AGENT_URL, {"investigation_id": investigation_id}, "Browser Agent")
+    run_system_step(agents, investigation_id, "Browser Agent", system_done)
 
     # 4. Volatile Memory Forensics (Live RAM)
     # AGENT 8: MEMORY AGENT
     print("\n[*] Conducting Live Memory Triage (RAM)...")
-    call_agent(MEMORY_AGENT_URL, {"investigation_id": investigation_id}, "Memory Agent")
+    emit_event("phase", investigation_id=investigation_id, phase="memory")
+    run_system_step(agents, investigation_id, "Memory Agent", system_done)
 
     # 5. GENERATE MERKLE ROOT (The Forensic Integrity Seal)
-    print("\n[*] All agents finished. Fetching findings to generate Hardware-Bound Seal...")
+    print("\n[*] All agents finished. Waiting for queued threat-intel lookups...")
+    emit_event("phase", investigation_id=investigation_id, phase="threat_intel")
+    intel_settled = drain_threat_intel(agents, investigation_id)
+    print("[*] Flushing buffered findings...")
+    flush_agents(agents)
+    resolved = [p for p in awaiting_intel if p in intel_settled]
+    if resolved:
+        # Their verdicts are in the findings store now; failed or undrained lookups are escalated again on resume
+        intel_journal = checkpoints.CheckpointJournal(
+            investigation_id, lambda: flush_agents(agents, [checkpoints.THREAT_INTEL_STEP]))
+        intel_journal.record([(p, checkpoints.THREAT_INTEL_STEP) for p in resolved], len(resolved))
+        intel_journal.commit()
+    if len(resolved) < len(awaiting_intel):
+        print(f"    [!] {len(awaiting_intel) - len(resolved)} threat-intel lookups failed or did not finish; "
+              f"--resume escalates those files again.")
+    agents.close()
+
+    print("[*] Bagging Merkle accumulator peaks into the Hardware-Bound Seal...")
+    emit_event("phase", investigation_id=investigation_id, phase="sealing")
     
     try:
-        cur.execute("SELECT file_path, finding_type, description FROM findings WHERE investigation_id = %s", (investigation_id,))
-        rows = cur.fetchall()
-        
-        # Format the data for the Merkle utility
-        all_findings = [{"file_path": r[0], "finding_type": r[1], "description": r[2]} for r in rows]
-        
+        # The tree was built incrementally as findings were flushed; sealing is O(log n).
         # ADVANCED: Pass hw_id to bind the root hash to this machine
-        root_hash = merkle_utils.generate_investigation_integrity(all_findings, hw_id=hw_id)
+        root_hash = merkle_utils.compute_seal(cur, investigation_id, hw_id=hw_id)
         
         # Finalize Investigation Record
         cur.execute(
@@ -132,12 +511,56 @@ def run_investigation(directory_path, investigation_id):
         
         print(f"[+] Investigation Signed Successfully.")
         print(f"[+] Final Merkle Root: {root_hash}")
+        emit_event("phase", investigation_id=investigation_id, phase="sealed", merkle_root=root_hash)
         
     except Exception as e:
         print(f"[!] Integrity Sealing Error: {e}")
+        emit_event("phase", investigation_id=investigation_id, phase="failed", error=str(e))
 
 if __name__ == '__main__':
-    if len(sys.argv) < 3:
-        print("Usage: python controller.py <directory_path> <investigation_id>")
-    else:
-        run_investigation(sys.argv[1], sys.argv[2])
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run a full multi-agent investigation.")
+    parser.add_argument("directory_path")
+    parser.add_argument("investigation_id")
+    parser.add_argument("--workers", type=int, default=CONTROLLER_WORKERS,
+                        help="Number of file batches analyzed concurrently (default: CONTROLLER_WORKERS)")
+    parser.add_argument("--batch-size", type=int, default=CONTROLLER_BATCH_SIZE,
+                        help="Files sent to each agent per batch request (default: CONTROLLER_BATCH_SIZE)")
+    parser.add_argument("--mode", choices=["http", "artifact"], default=ANALYSIS_MODE,
+                        help="'http' calls the agent services; 'artifact' reads each file once in-process")
+    parser.add_argument("--transport", choices=["http", "process"], default=AGENT_TRANSPORT,
+                        help="'http' calls the agent services; 'process' runs the agents in a local process pool")
+    parser.add_argument("--processes", type=int, default=AGENT_PROCESSES,
+                        help="Worker processes for --transport process (default: AGENT_PROCESSES)")
+    parser.add_argument("--forensic", action="store_true", default=FORENSIC_MODE,
+                        help="Bypass the hash cache and re-hash every file (chain-of-custody runs)")
+    parser.add_argument("--include", action="append", default=None,
+                        help="Only analyze files matching this glob (repeatable; default: ENUM_INCLUDE)")
+    parser.add_argument("--exclude", action="append", default=None,
+                        help="Skip files and directories matching this glob (repeatable; default: ENUM_EXCLUDE)")
+    parser.add_argument("--min-size", type=int, default=ENUM_MIN_SIZE, help="Skip files smaller than this many bytes")
+    parser.add_argument("--max-size", type=int, default=ENUM_MAX_SIZE, help="Skip files larger than this many bytes (0 = no limit)")
+    parser.add_argument("--max-depth", type=int, default=ENUM_MAX_DEPTH,
+                        help="Directory levels below the evidence root to descend (-1 = unlimited)")
+    parser.add_argument("--no-dedup", dest="dedup", action="store_false", default=CONTENT_DEDUP,
+                        help="Scan every file's content even if the same SHA-256 was analyzed before")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted investigation with this ID from its last checkpoint")
+    parser.add_argument("--events", action="store_true",
+                        help="Also write progress events to stdout for main_app's event stream")
+    args = parser.parse_args()
+    EMIT_EVENTS = args.events
+    if EMIT_EVENTS:
+        event_bus.serialize_output()
+    try:
+        run_investigation(args.directory_path, args.investigation_id,
+                          workers=max(1, args.workers), batch_size=max(1, args.batch_size),
+                          mode=args.mode, forensic_mode=args.forensic,
+                          include=args.include if args.include is not None else ENUM_INCLUDE,
+                          exclude=args.exclude if args.exclude is not None else ENUM_EXCLUDE,
+                          min_size=args.min_size, max_size=args.max_size, max_depth=args.max_depth,
+                          resume=args.resume, dedup=args.dedup,
+                          transport=args.transport, processes=max(1, args.processes))
+    except BaseException:
+        # Crashes and Ctrl+C; a power loss leaves the row RUNNING, which --resume accepts as well
+        mark_interrupted(args.investigation_id)
+        raise
\ No newline at end of file
@@ -0,0 +1,253 @@
+# db_schema.py
+"""
+Versioned schema for the findings store.
+
+Each migration runs once, in order, in its own transaction; applied versions are
+recorded in schema_migrations. Every statement is idempotent so databases created
+by hand before this module existed are adopted by the same migrations, which also
+add the columns later queries rely on (such as findings.id) to such tables.
+
+    python db_schema.py migrate
+    python db_schema.py status
+"""
+import sys
+import argparse
+import psycopg2
+from config import DB_CONFIG, FINDINGS_PARTITIONS
+
+# Any constant works; it only has to be the same in every process running migrations
+MIGRATION_LOCK_ID = 0x64666972
+
+
+def _findings_table(partitions):
+    """
+    The findings table, optionally hash-partitioned on investigation_id so each
+    investigation's rows (and index pages) sit in one partition. Partitioning only
+    applies when the table is created; an existing table is left as it is.
+    """
+    partition_clause = "PARTITION BY HASH (investigation_id)" if partitions else ""
+    sql = f"""
+        CREATE TABLE IF NOT EXISTS findings (
+            id               BIGSERIAL,
+            agent_name       TEXT,
+            finding_type     TEXT,
+            description      TEXT,
+            investigation_id TEXT NOT NULL,
+            file_path        TEXT,
+            timestamp        TIMESTAMP NOT NULL DEFAULT now(),
+            ai_insight       TEXT,
+            PRIMARY KEY (investigation_id, id)
+        ) {partition_clause};
+    """
+    for i in range(partitions):
+        sql += f"""
+        CREATE TABLE IF NOT EXISTS findings_p{i} PARTITION OF findings
+            FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i});
+        """
+    return sql
+
+
+# Existing rows are numbered in storage order; later rows take the sequence as usual
+ADD_FINDINGS_ID_SQL = """
+    ALTER TABLE findings ADD COLUMN IF NOT EXISTS id BIGSERIAL;
+"""
+
+
+MIGRATIONS = [
+    # A hand-made findings table may predate the id column that cursors and paging order by
+    (1, "base tables", lambda: """
+        CREATE TABLE IF NOT EXISTS investigations (
+            investigation_id TEXT      PRIMARY KEY,
+            status           TEXT,
+            merkle_root      TEXT,
+            start_time       TIMESTAMP NOT NULL DEFAULT now()
+        );
+    """ + _findings_table(FINDINGS_PARTITIONS) + ADD_FINDINGS_ID_SQL),
+
+    # Incremental Merkle accumulator (see merkle_utils): every finding gets a leaf index,
+    # intermediate node hashes are kept for inclusion proofs, and merkle_state holds the peaks.
+    (2, "merkle accumulator", lambda: """
+        ALTER TABLE findings ADD COLUMN IF NOT EXISTS merkle_leaf BIGINT;
+        CREATE UNIQUE INDEX IF NOT EXISTS findings_merkle_leaf_idx ON findings (investigation_id, merkle_leaf);
+        CREATE TABLE IF NOT EXISTS merkle_state (
+            investigation_id TEXT   PRIMARY KEY,
+            leaf_count       BIGINT NOT NULL DEFAULT 0,
+            peaks            TEXT[] NOT NULL DEFAULT '{}'
+        );
+        CREATE TABLE IF NOT EXISTS merkle_nodes (
+            investigation_id TEXT     NOT NULL,
+            level            SMALLINT NOT NULL,
+            position         BIGINT   NOT NULL,
+            hash             CHAR(64) NOT NULL,
+            PRIMARY KEY (investigation_id, level, position)
+        );
+    """),
+
+    # Per-file SHA-256 values live in hash_manifest rather than as "File Hash" findings;
+    # they are still leaves of the seal, with the same leaf text as the old finding rows.
+    (3, "hash manifest", lambda: """
+        CREATE TABLE IF NOT EXISTS hash_manifest (
+            investigation_id TEXT      NOT NULL,
+            file_path        TEXT      NOT NULL,
+            size             BIGINT,
+            sha256           BYTEA     NOT NULL,
+            mtime            TIMESTAMP,
+            atime            TIMESTAMP,
+            ctime            TIMESTAMP,
+            recorded_at      TIMESTAMP NOT NULL,
+            merkle_leaf      BIGINT
+        );
+        CREATE INDEX IF NOT EXISTS hash_manifest_path_idx ON hash_manifest (investigation_id, file_path);
+        CREATE UNIQUE INDEX IF NOT EXISTS hash_manifest_merkle_leaf_idx ON hash_manifest (investigation_id, merkle_leaf);
+    """),
+
+    # Hot paths: latest investigation on every poll, per-artifact grouping in the report
+    # and the AI analyst, newest-first raw log.
+    (4, "query indexes", lambda: """
+        CREATE INDEX IF NOT EXISTS investigations_start_time_idx ON investigations (start_time DESC);
+        CREATE INDEX IF NOT EXISTS findings_inv_path_idx ON findings (investigation_id, file_path);
+        CREATE INDEX IF NOT EXISTS findings_inv_time_idx ON findings (investigation_id, timestamp DESC);
+    """),
+
+    # Existing "File Hash" findings move to the manifest. Their leaves are rebuilt with
+    # identical text and keep their merkle_leaf, so stored seals still verify. Size and
+    # timestamps were never recorded for them and stay empty.
+    (5, "move File Hash findings to hash_manifest", lambda: """
+        WITH moved AS (
+            DELETE FROM findings
+            WHERE finding_type = 'File Hash' AND left(description, 8) = 'SHA256: '
+            RETURNING investigation_id, file_path, description, timestamp, merkle_leaf
+        )
+        INSERT INTO hash_manifest (investigation_id, file_path, sha256, recorded_at, merkle_leaf)
+        SELECT investigation_id, COALESCE(file_path, 'None'), decode(substr(description, 9), 'hex'), timestamp, merkle_leaf
+        FROM moved;
+    """),
+
+    # Polling clients resume from the last merkle_leaf they saw: leaves are handed out under the
+    # merkle_state row lock and committed in order, unlike findings.id. Findings of investigations
+    # sealed before the accumulator get leaf numbers too (their seal ignores merkle_leaf), and
+    # revision is bumped by writes that change existing rows, such as AI insights. Tables adopted
+    # by migration 1 before it added findings.id get the column here.
+    (6, "delta polling cursors", lambda: ADD_FINDINGS_ID_SQL + """
+        ALTER TABLE investigations ADD COLUMN IF NOT EXISTS revision BIGINT NOT NULL DEFAULT 0;
+        UPDATE findings AS f SET merkle_leaf = n.leaf
+        FROM (
+            SELECT investigation_id, id, row_number() OVER (PARTITION BY investigation_id ORDER BY id) - 1 AS leaf
+            FROM findings
+            WHERE merkle_leaf IS NULL AND investigation_id NOT IN (SELECT investigation_id FROM merkle_state)
+        ) AS n
+        WHERE f.investigation_id = n.investigation_id AND f.id = n.id;
+    """),
+
+    # Resumable runs (see checkpoints.py): which agent finished which file, and the partial
+    # progress of a run that has not completed.
+    (7, "file checkpoints", lambda: """
+        CREATE TABLE IF NOT EXISTS file_checkpoints (
+            investigation_id TEXT      NOT NULL,
+            file_path        TEXT      NOT NULL,
+            agent_name       TEXT      NOT NULL,
+            completed_at     TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (investigation_id, file_path, agent_name)
+        );
+        ALTER TABLE investigations
+            ADD COLUMN IF NOT EXISTS evidence_root TEXT,
+            ADD COLUMN IF NOT EXISTS files_done    BIGINT NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS checkpoint_at TIMESTAMP;
+    """),
+
+    # Keyword/signature verdicts per file content (see content_dedup.py), shared across
+    # investigations, and how many files of each investigation reused one.
+    (8, "content verdicts", lambda: """
+        CREATE TABLE IF NOT EXISTS content_verdicts (
+            sha256                 BYTEA     NOT NULL,
+            analysis_key           TEXT      NOT NULL,
+            keyword                JSONB     NOT NULL,
+            signature              JSONB     NOT NULL,
+            first_investigation_id TEXT,
+            analyzed_at            TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (sha256, analysis_key)
+        );
+        ALTER TABLE investigations
+            ADD COLUMN IF NOT EXISTS content_reused   BIGINT NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS content_analyzed BIGINT NOT NULL DEFAULT 0;
+    """),
+
+    # Which analysis attempt of a file owns its rows, per writer (see db_utils.analysis_attempt):
+    # a batch file re-sent after a dropped stream is analyzed again, but only one attempt is kept.
+    (9, "analysis attempts", lambda: """
+        CREATE TABLE IF NOT EXISTS analysis_attempts (
+            investigation_id TEXT NOT NULL,
+            file_path        TEXT NOT NULL,
+            source           TEXT NOT NULL,
+            attempt          TEXT NOT NULL,
+            PRIMARY KEY (investigation_id, file_path, source)
+        );
+    """),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    INTEGER   PRIMARY KEY,
+            name       TEXT      NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def migrate(conn):
+    """
+    Applies every pending migration on `conn`. Concurrent callers (each agent
+    process migrates on first use) are serialized by an advisory lock.
+    Returns the list of versions applied by this call.
+    """
+    applied_now = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            done = applied_versions(cur)
+            conn.commit()
+            for version, name, sql in MIGRATIONS:
+                if version in done:
+                    continue
+                cur.execute(sql())
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                conn.commit()
+                applied_now.append(version)
+                print(f"[DB] Applied migration {version}: {name}")
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+    return applied_now
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DFIR findings store schema")
+    parser.add_argument("command", choices=["migrate", "status"])
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        if args.command == "migrate":
+            applied = migrate(conn)
+            print(f"[+] Schema at version {LATEST_VERSION} ({len(applied)} migrations applied)")
+        else:
+            with conn.cursor() as cur:
+                done = applied_versions(cur)
+            conn.commit()
+            for version, name, _ in MIGRATIONS:
+                print(f"    [{'x' if version in done else ' '}] {version:3d}  {name}")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
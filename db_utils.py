@@ -1,27 +1,328 @@
 # db_utils.py
+import os
+import time
+import uuid
+import atexit
+import datetime
+import threading
+import contextlib
+import contextvars
+
 import psycopg2
-from config import DB_CONFIG
+import db_schema
+import merkle_utils
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import execute_values
+from config import (
+    DB_CONFIG, DB_POOL_MIN, DB_POOL_MAX,
+    FINDINGS_BATCH_SIZE, FINDINGS_FLUSH_INTERVAL,
+    FINDINGS_MAX_BUFFER, FINDINGS_RETRY_MAX_BACKOFF,
+)
 
-def save_to_db(agent_name, finding_type, description, investigation_id, file_path):
+# --- PROCESS-WIDE CONNECTION POOL ---
+_pool      = None
+_pool_pid  = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Returns this process's connection pool, creating it on first use (and again after a fork)."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool     = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **DB_CONFIG)
+                _pool_pid = os.getpid()
+    return _pool
+
+@contextlib.contextmanager
+def pooled_connection():
+    """Borrows a connection from the pool; rolls back on error and always returns it."""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+# --- SCHEMA ---
+# Tables, indexes and data migrations are versioned in db_schema.py.
+
+_schema_pid = None
+
+def ensure_schema():
+    """Applies pending db_schema migrations once per process. Returns False if the database rejected them."""
+    global _schema_pid
+    if _schema_pid == os.getpid():
+        return True
+    try:
+        with pooled_connection() as conn:
+            db_schema.migrate(conn)
+    except Exception as e:
+        print(f"[DB Error] Schema setup failed: {e}")
+        return False
+    _schema_pid = os.getpid()
+    return True
+
+
+# --- BATCHED FINDINGS WRITER ---
+INSERT_FINDINGS_SQL = """
+    INSERT INTO findings
+        (agent_name, finding_type, description, investigation_id, file_path, timestamp, merkle_leaf)
+    VALUES %s;
+"""
+INSERT_NODES_SQL = "INSERT INTO merkle_nodes (investigation_id, level, position, hash) VALUES %s;"
+INSERT_MANIFEST_SQL = """
+    INSERT INTO hash_manifest
+        (investigation_id, file_path, size, sha256, mtime, atime, ctime, recorded_at, merkle_leaf)
+    VALUES %s;
+"""
+# Leaf text of a manifest entry: "<path>|File Hash|SHA256: <hex>", as when hashes were findings
+HASH_FINDING_TYPE = "File Hash"
+# Claims the (investigation, file, source) key for an attempt, or returns the attempt that already holds it
+CLAIM_ATTEMPTS_SQL = """
+    INSERT INTO analysis_attempts (investigation_id, file_path, source, attempt) VALUES %s
+    ON CONFLICT (investigation_id, file_path, source) DO UPDATE SET attempt = analysis_attempts.attempt
+    RETURNING investigation_id, file_path, source, attempt;
+"""
+
+_buffer          = []
+_manifest_buffer = []
+_buffer_lock  = threading.Lock()
+_buffer_room  = threading.Condition(_buffer_lock)
+_flush_lock   = threading.Lock()
+_flusher_pid  = None
+
+# After a failed flush, automatic flushes (size trigger and timer) wait until
+# _retry_at, doubling the delay per consecutive failure up to FINDINGS_RETRY_MAX_BACKOFF.
+_retry_at      = 0.0
+_retry_backoff = 0.0
+_stalled       = False
+_flushing_rows = 0    # rows taken out by a flush that may yet be re-queued
+
+_attempt = contextvars.ContextVar("analysis_attempt", default=None)
+
+@contextlib.contextmanager
+def analysis_attempt():
     """
-    Shared database helper used by all agents.
-    Replaces the copy-pasted version in every agent file.
+    Marks the rows buffered inside the block as one analysis attempt of a file.
+    When the same file is analyzed again for the same investigation (a batch
+    re-sent after its stream dropped), the flush keeps only the rows of the
+    attempt that reached the database first.
     """
-    conn = None
+    token = _attempt.set(uuid.uuid4().hex)
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-        sql = """
-            INSERT INTO findings
-                (agent_name, finding_type, description, investigation_id, file_path)
-            VALUES (%s, %s, %s, %s, %s);
-        """
-        cur.execute(sql, (agent_name, finding_type, description, investigation_id, file_path))
-        conn.commit()
-        cur.close()
-        print(f"[DB] Saved finding: [{agent_name}] {finding_type}")
-    except Exception as e:
-        print(f"[DB Error] {agent_name}: {e}")
+        yield
     finally:
-        if conn is not None:
-            conn.close()
\ No newline at end of file
+        _attempt.reset(token)
+
+def _backing_off():
+    return time.monotonic() < _retry_at
+
+def _flush_loop():
+    while True:
+        time.sleep(FINDINGS_FLUSH_INTERVAL)
+        if not _backing_off():
+            flush_findings()
+
+def _ensure_flusher():
+    """Starts the time-based flush thread once per process."""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _buffer_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    t = threading.Thread(target=_flush_loop, name="findings-flusher")
+    t.daemon = True
+    t.start()
+
+def _queue(buffer, row):
+    """
+    Buffers a row, flushing once FINDINGS_BATCH_SIZE rows are queued. While the
+    database is refusing flushes, writers block at FINDINGS_MAX_BUFFER rows until
+    the flush thread gets a batch through.
+    """
+    global _stalled
+    _ensure_flusher()
+    with _buffer_lock:
+        while len(_buffer) + len(_manifest_buffer) + _flushing_rows >= FINDINGS_MAX_BUFFER:
+            if not _stalled:
+                _stalled = True
+                print(f"[DB Error] Findings buffer full ({FINDINGS_MAX_BUFFER} rows) and the database is "
+                      f"refusing writes; blocking writers until a flush succeeds")
+            _buffer_room.wait(timeout=FINDINGS_FLUSH_INTERVAL)
+        buffer.append(row)
+        is_full = len(_buffer) + len(_manifest_buffer) >= FINDINGS_BATCH_SIZE
+    if is_full and not _backing_off():
+        flush_findings()
+
+def save_to_db(agent_name, finding_type, description, investigation_id, file_path):
+    """
+    Shared database helper used by all agents.
+    Findings are buffered in memory and written by flush_findings() as one
+    multi-row INSERT once FINDINGS_BATCH_SIZE rows are queued, every
+    FINDINGS_FLUSH_INTERVAL seconds, and at interpreter exit.
+    """
+    _queue(_buffer, (agent_name, finding_type, description, investigation_id, file_path, datetime.datetime.now(),
+                     _attempt.get()))
+
+def save_file_hash(investigation_id, file_path, sha256_hex, st=None):
+    """
+    Records a file's SHA-256 in the hash manifest (buffered like save_to_db).
+    Manifest entries are still seal leaves, with the text "<path>|File Hash|SHA256: <hex>".
+    `st` is the os.stat_result the hash was computed from; without it the
+    size and timestamps are left empty.
+    """
+    when = datetime.datetime.fromtimestamp
+    _queue(_manifest_buffer, (
+        investigation_id, file_path,
+        st.st_size if st else None,
+        bytes.fromhex(sha256_hex),
+        when(st.st_mtime) if st else None,
+        when(st.st_atime) if st else None,
+        when(st.st_ctime) if st else None,
+        datetime.datetime.now(),
+        _attempt.get(),
+    ))
+
+def _drop_repeated_attempts(cur, rows, manifest_rows):
+    """
+    Claims each (investigation, file, source) written by an analysis_attempt()
+    and drops the rows of any other attempt at the same key. The source is the
+    finding's agent, or the manifest. Strips the attempt column from every row.
+    """
+    tagged = [(row, False, (row[3], row[4], row[0]), row[6]) for row in rows]
+    tagged += [(row, True, (row[0], row[1], HASH_FINDING_TYPE), row[8]) for row in manifest_rows]
+    claims = {}
+    for _, _, key, attempt in tagged:
+        if attempt is not None and key[0] is not None:
+            claims.setdefault(key, attempt)
+    owner = {}
+    if claims:
+        # Sorted so concurrent flushes take the claim row locks in the same order
+        returned = execute_values(cur, CLAIM_ATTEMPTS_SQL, [key + (claims[key],) for key in sorted(claims, key=str)],
+                                  page_size=1000, fetch=True)
+        owner = {tuple(r[:3]): r[3] for r in returned}
+
+    kept_rows, kept_manifest, dropped = [], [], 0
+    for row, is_manifest, key, attempt in tagged:
+        if attempt is not None and owner.get(key, attempt) != attempt:
+            dropped += 1
+        elif is_manifest:
+            kept_manifest.append(row[:8])
+        else:
+            kept_rows.append(row[:6])
+    if dropped:
+        print(f"[DB] Dropped {dropped} rows from repeated analyses of files already recorded")
+    return kept_rows, kept_manifest
+
+def _append_leaves(cur, rows, manifest_rows=()):
+    """
+    Assigns merkle_leaf indices to buffered findings and manifest entries and
+    advances each investigation's accumulator in the current transaction. The
+    merkle_state row lock serializes concurrent writers of the same investigation
+    (agents flush independently).
+    Returns (finding rows, manifest rows, new node rows), each row extended with its merkle_leaf.
+    """
+    by_investigation = {}
+    for row in rows:
+        # row = (agent_name, finding_type, description, investigation_id, file_path, timestamp)
+        leaf = merkle_utils.leaf_hash(row[4], row[1], row[2])
+        by_investigation.setdefault(row[3], []).append((row, leaf, False))
+    for row in manifest_rows:
+        # row = (investigation_id, file_path, size, sha256, mtime, atime, ctime, recorded_at)
+        leaf = merkle_utils.leaf_hash(row[1], HASH_FINDING_TYPE, f"SHA256: {row[3].hex()}")
+        by_investigation.setdefault(row[0], []).append((row, leaf, True))
+
+    out_rows, out_manifest, node_rows = [], [], []
+    # Sorted so two writers always lock investigations in the same order
+    for investigation_id in sorted(by_investigation, key=str):
+        entries = by_investigation[investigation_id]
+        if investigation_id is None:
+            for row, _, is_manifest in entries:
+                (out_manifest if is_manifest else out_rows).append(row + (None,))
+            continue
+        cur.execute("INSERT INTO merkle_state (investigation_id) VALUES (%s) ON CONFLICT DO NOTHING", (investigation_id,))
+        cur.execute("SELECT leaf_count, peaks FROM merkle_state WHERE investigation_id = %s FOR UPDATE", (investigation_id,))
+        leaf_count, peaks = cur.fetchone()
+        for row, leaf, is_manifest in entries:
+            peaks, new_nodes = merkle_utils.mmr_append(peaks, leaf_count, leaf)
+            node_rows.extend((investigation_id, *node) for node in new_nodes)
+            (out_manifest if is_manifest else out_rows).append(row + (leaf_count,))
+            leaf_count += 1
+        cur.execute(
+            "UPDATE merkle_state SET leaf_count = %s, peaks = %s WHERE investigation_id = %s",
+            (leaf_count, peaks, investigation_id)
+        )
+    return out_rows, out_manifest, node_rows
+
+def flush_findings():
+    """
+    Writes every buffered finding and manifest entry in a single transaction,
+    together with their Merkle accumulator updates.
+    Returns the number of rows written, or None if the write failed
+    (the rows are put back at the head of the buffers for the next attempt,
+    and automatic flushes back off).
+    """
+    global _retry_at, _retry_backoff, _stalled, _flushing_rows
+    with _flush_lock:
+        with _buffer_lock:
+            rows, manifest_rows = _buffer[:], _manifest_buffer[:]
+            del _buffer[:]
+            del _manifest_buffer[:]
+            _flushing_rows = len(rows) + len(manifest_rows)
+        if not rows and not manifest_rows:
+            return 0
+
+        try:
+            ensure_schema()
+            with pooled_connection() as conn:
+                with conn.cursor() as cur:
+                    kept_rows, kept_manifest = _drop_repeated_attempts(cur, rows, manifest_rows)
+                    leaf_rows, manifest_leaf_rows, node_rows = _append_leaves(cur, kept_rows, kept_manifest)
+                    execute_values(cur, INSERT_FINDINGS_SQL, leaf_rows, page_size=1000)
+                    execute_values(cur, INSERT_MANIFEST_SQL, manifest_leaf_rows, page_size=1000)
+                    execute_values(cur, INSERT_NODES_SQL, node_rows, page_size=1000)
+                conn.commit()
+        except Exception as e:
+            _retry_backoff = min(max(_retry_backoff * 2, FINDINGS_FLUSH_INTERVAL), FINDINGS_RETRY_MAX_BACKOFF)
+            _retry_at      = time.monotonic() + _retry_backoff
+            print(f"[DB Error] Flush of {len(rows)} findings, {len(manifest_rows)} file hashes failed, "
+                  f"re-queued (next attempt in {_retry_backoff:.1f}s): {e}")
+            with _buffer_lock:
+                _buffer[:0] = rows
+                _manifest_buffer[:0] = manifest_rows
+                _flushing_rows = 0
+            return None
+        print(f"[DB] Flushed {len(kept_rows)} findings, {len(kept_manifest)} file hashes")
+        _retry_at = _retry_backoff = 0.0
+        with _buffer_lock:
+            _flushing_rows = 0
+            if _stalled:
+                _stalled = False
+                print("[DB] Findings buffer draining again; writers resumed")
+            _buffer_room.notify_all()
+        return len(rows) + len(manifest_rows)
+
+atexit.register(flush_findings)
+
+
+def register_flush_endpoint(app):
+    """
+    Adds POST /flush to an agent's Flask app so the controller can make
+    every buffered finding durable before it computes the integrity seal.
+    """
+    from flask import jsonify
+
+    @app.route('/flush', methods=['POST'])
+    def flush_endpoint():
+        written = flush_findings()
+        if written is None:
+            return jsonify({"error": "Findings flush failed"}), 503
+        return jsonify({"status": "flushed", "rows": written}), 200
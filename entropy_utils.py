@@ -0,0 +1,76 @@
+# entropy_utils.py
+import math
+import collections
+
+# NumPy is optional: it turns the byte histogram into one vectorized bincount.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def byte_histogram(data):
+    """Counts of each byte value 0-255 in a bytes-like object (bytes, bytearray, mmap, memoryview)."""
+    if np is not None:
+        return np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+    counts = [0] * 256
+    for value, n in collections.Counter(memoryview(data).cast('B')).items():
+        counts[value] = n
+    return counts
+
+
+def shannon_entropy(data):
+    """
+    Shannon entropy in bits per symbol: 0-8 for bytes, unbounded for str.
+    Bytes-like input goes through one histogram pass; str (domains, registry
+    values) is counted per character.
+    """
+    if not data:
+        return 0
+    if isinstance(data, str):
+        counts = collections.Counter(data).values()
+    else:
+        counts = byte_histogram(data)
+        if np is not None:
+            p = counts[counts > 0] / counts.sum()
+            return max(0.0, float(-(p * np.log2(p)).sum()))
+
+    total = sum(counts)
+    return max(0.0, -sum((n / total) * math.log2(n / total) for n in counts if n))
+
+
+def window_entropies(stream, window_size, step=None):
+    """
+    Yields (offset, entropy) for every full window_size slice of a binary stream,
+    advancing by `step` (default: non-overlapping). Only one window is held in memory;
+    with step > window_size the bytes between windows are read past, not analyzed.
+
+    >>> import io
+    >>> data = bytes(4) + bytes(range(4)) + bytes(4) + bytes(range(4))
+    >>> [(o, round(e, 2)) for o, e in window_entropies(io.BytesIO(data), 4, 2)]
+    [(0, 0.0), (2, 0.81), (4, 2.0), (6, 1.5), (8, 0.0), (10, 0.81), (12, 2.0)]
+    >>> [(o, round(e, 2)) for o, e in window_entropies(io.BytesIO(data), 4, 8)]
+    [(0, 0.0), (8, 0.0)]
+    >>> [(o, round(e, 2)) for o, e in window_entropies(io.BytesIO(data), 4, 12)]
+    [(0, 0.0), (12, 2.0)]
+    """
+    step   = step or window_size
+    buf    = b""
+    offset = 0
+    while True:
+        if len(buf) < window_size:
+            buf += stream.read(window_size - len(buf))
+        if len(buf) < window_size:
+            return
+        yield offset, shannon_entropy(buf)
+        offset += step
+        if step <= window_size:
+            buf = buf[step:]
+            continue
+        # Gap between windows (ENTROPY_WINDOW_STEP > ENTROPY_WINDOW_SIZE): skip it in bounded reads
+        buf, gap = b"", step - window_size
+        while gap:
+            skipped = len(stream.read(min(gap, window_size)))
+            if not skipped:
+                return
+            gap -= skipped
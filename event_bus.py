@@ -0,0 +1,123 @@
+# event_bus.py
+"""
+In-process publish/subscribe for investigation progress, consumed by the SSE endpoint
+in main_app. The controller runs as a child process, so it emits events as prefixed
+JSON lines on stdout (emit); run_full_analysis parses them (parse_line) and publishes
+them here. serialize_output keeps those lines whole next to the controller's own prints.
+"""
+import sys
+import json
+import time
+import queue
+import threading
+import collections
+from config import EVENT_HISTORY_SIZE, EVENT_QUEUE_SIZE
+
+EVENT_PREFIX = "@@event "
+
+_lock        = threading.Lock()
+_subscribers = set()
+# Recent events, replayed to clients that reconnect with Last-Event-ID
+_history     = collections.deque(maxlen=EVENT_HISTORY_SIZE)
+_next_id     = 1
+
+
+def publish(event_type, data):
+    """Delivers an event to every subscriber; a subscriber that has fallen behind loses its oldest events."""
+    global _next_id
+    with _lock:
+        event = {"id": _next_id, "type": event_type, "time": time.time(), "data": data}
+        _next_id += 1
+        _history.append(event)
+        subscribers = list(_subscribers)
+    for q in subscribers:
+        while True:
+            try:
+                q.put_nowait(event)
+                break
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+    return event
+
+
+def subscribe(last_event_id=None):
+    """
+    Returns a queue receiving every event published from now on, preceded by the
+    retained events newer than last_event_id (if given).
+    """
+    q = queue.Queue(maxsize=max(EVENT_QUEUE_SIZE, EVENT_HISTORY_SIZE))
+    with _lock:
+        if last_event_id is not None:
+            for event in _history:
+                if event["id"] > last_event_id:
+                    q.put_nowait(event)
+        _subscribers.add(q)
+    return q
+
+
+def unsubscribe(q):
+    with _lock:
+        _subscribers.discard(q)
+
+
+# --- CHILD PROCESS TRANSPORT ---
+# print() writes its text and its newline separately, so a line printed by one worker
+# thread could otherwise be split by another thread's event line, which parse_line
+# would then not recognize.
+_output_lock = threading.Lock()
+
+
+class LineLockedStream:
+    """
+    Wraps stdout/stderr so that every line reaches the stream in one write, under a lock
+    shared by all wrapped streams: each thread's text is held until it ends a line.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local  = threading.local()
+
+    def write(self, text):
+        pending = getattr(self._local, "pending", "") + text
+        lines, newline, rest = pending.rpartition("\n")
+        self._local.pending = rest
+        if newline:
+            with _output_lock:
+                self._stream.write(lines + newline)
+                self._stream.flush()
+        return len(text)
+
+    def flush(self):
+        pending, self._local.pending = getattr(self._local, "pending", ""), ""
+        with _output_lock:
+            self._stream.write(pending)
+            self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def serialize_output():
+    """Routes stdout and stderr through LineLockedStream; call once before emitting events."""
+    if not isinstance(sys.stdout, LineLockedStream):
+        sys.stdout = LineLockedStream(sys.stdout)
+        sys.stderr = LineLockedStream(sys.stderr)
+
+
+def emit(event_type, **data):
+    """Writes one event line to stdout for the parent process (see parse_line)."""
+    sys.stdout.write(EVENT_PREFIX + json.dumps({"type": event_type, "data": data}, default=str) + "\n")
+
+
+def parse_line(line):
+    """(event_type, data) for a line written by emit, or None for ordinary output."""
+    if not line.startswith(EVENT_PREFIX):
+        return None
+    try:
+        event = json.loads(line[len(EVENT_PREFIX):])
+        return event["type"], event["data"]
+    except (ValueError, KeyError):
+        return None
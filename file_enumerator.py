@@ -0,0 +1,159 @@
+# file_enumerator.py
+"""
+Streaming evidence enumeration built on os.scandir.
+
+Directories are listed by a pool of threads and files are yielded as soon as they
+are found, each with the stat result taken during the walk, so analysis starts
+within seconds even on shares with millions of files and nothing re-stats them.
+
+    python file_enumerator.py <dir> [--include *.exe] [--exclude */WinSxS/*] [--max-depth 3]
+"""
+import os
+import sys
+import queue
+import fnmatch
+import argparse
+import threading
+import collections
+from config import ENUM_WORKERS, ENUM_QUEUE_SIZE
+
+FileEntry = collections.namedtuple("FileEntry", ["path", "st"])
+
+_DONE = object()
+
+
+def _matches(rel_path, name, patterns):
+    """True if any glob matches the root-relative path (forward slashes) or the bare name."""
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def enumerate_files(root, include=None, exclude=None, min_size=0, max_size=0, max_depth=-1,
+                    workers=ENUM_WORKERS, stats=None):
+    """
+    Yields FileEntry(path, stat) for every regular file under root, in discovery order.
+
+    include    - globs a file must match (any of them); empty = every file
+    exclude    - globs for files and directories to skip; a matching directory is not entered
+    min_size / max_size - size bounds in bytes (max_size 0 = no limit)
+    max_depth  - 0 = only root's own files, -1 = unlimited
+    stats      - optional dict, updated with files/dirs/skipped/errors counters
+
+    Like os.walk, symlinks to files are yielded and symlinked directories are not followed.
+    Closing the generator early stops the walk.
+    """
+    include, exclude = list(include or []), list(exclude or [])
+    root = os.path.abspath(root)
+    prefix_len = len(root) if root.endswith(os.sep) else len(root) + 1
+    use_globs  = bool(include or exclude)
+    counters = stats if stats is not None else {}
+    for key in ("files", "dirs", "skipped", "errors"):
+        counters.setdefault(key, 0)
+
+    dirs    = queue.Queue()
+    out     = queue.Queue(maxsize=ENUM_QUEUE_SIZE)
+    stop    = threading.Event()
+    lock    = threading.Lock()
+    pending = [1]   # directories queued or being listed
+
+    def emit(item):
+        # Bounded: a slow consumer holds the walk back instead of buffering the whole tree
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def scan(path, depth):
+        files, subdirs, skipped, errors = [], [], 0, 0
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    rel = entry.path[prefix_len:].replace(os.sep, "/") if use_globs else None
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if exclude and _matches(rel, entry.name, exclude):
+                                skipped += 1
+                            elif max_depth < 0 or depth < max_depth:
+                                subdirs.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                        if (include and not _matches(rel, entry.name, include)) or \
+                           (exclude and _matches(rel, entry.name, exclude)):
+                            skipped += 1
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        errors += 1
+                        continue
+                    if st.st_size < min_size or (max_size and st.st_size > max_size):
+                        skipped += 1
+                        continue
+                    files.append(FileEntry(entry.path, st))
+        except OSError as e:
+            print(f"[Enumerator] Cannot list {path}: {e}")
+            errors += 1
+
+        with lock:
+            counters["dirs"]    += 1
+            counters["files"]   += len(files)
+            counters["skipped"] += skipped
+            counters["errors"]  += errors
+            pending[0] += len(subdirs)
+        for sub in subdirs:
+            dirs.put((sub, depth + 1))
+        for item in files:
+            emit(item)
+
+    def worker():
+        while not stop.is_set():
+            try:
+                path, depth = dirs.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                scan(path, depth)
+            finally:
+                with lock:
+                    pending[0] -= 1
+                    finished = pending[0] == 0
+            if finished:
+                emit(_DONE)
+                return
+
+    dirs.put((root, 0))
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+    for t in threads:
+        t.start()
+    try:
+        while True:
+            item = out.get()
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the files an investigation would analyze")
+    parser.add_argument("directory")
+    parser.add_argument("--include", action="append", default=[])
+    parser.add_argument("--exclude", action="append", default=[])
+    parser.add_argument("--min-size", type=int, default=0)
+    parser.add_argument("--max-size", type=int, default=0)
+    parser.add_argument("--max-depth", type=int, default=-1)
+    parser.add_argument("--workers", type=int, default=ENUM_WORKERS)
+    args = parser.parse_args()
+
+    stats = {}
+    for entry in enumerate_files(args.directory, args.include, args.exclude, args.min_size,
+                                 args.max_size, args.max_depth, args.workers, stats):
+        print(f"{entry.st.st_size:>12}  {entry.path}")
+    print(f"[*] {stats['files']} files in {stats['dirs']} directories "
+          f"({stats['skipped']} skipped, {stats['errors']} errors)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,13 @@
 import os
 import psycopg2
-import math
 from flask import Flask, request, jsonify
-from config import DB_CONFIG
-from db_utils import save_to_db
+from config import DB_CONFIG, ENTROPY_WINDOW_SIZE, ENTROPY_WINDOW_STEP
+from entropy_utils import shannon_entropy, window_entropies
+from db_utils import save_to_db, register_flush_endpoint
+from batch_utils import stream_batch
 
 app = Flask(__name__)
+register_flush_endpoint(app)
 
 
 MAGIC_NUMBERS = {
@@ -27,10 +29,15 @@ MAGIC_NUMBERS = {
 
 EXECUTABLE_EXTENSIONS = ['.exe', '.dll', '.com', '.msi', '.scr', '.cpl']
 
-def verify_signature(file_path):
+# Binaries get a whole-file sliding-window entropy scan; archives and media are high-entropy by design
+PACKED_SCAN_TYPES = ["EXE/DLL", "ELF"]
+HIGH_ENTROPY_THRESHOLD = 7.5
+
+def verify_signature(file_path, header_bytes=None):
     try:
-        with open(file_path, 'rb') as f:
-            header_bytes = f.read(8) 
+        if header_bytes is None:
+            with open(file_path, 'rb') as f:
+                header_bytes = f.read(8) 
         hex_signature = header_bytes.hex()
 
         for signature, file_type in MAGIC_NUMBERS.items():
@@ -47,79 +54,117 @@ def verify_signature(file_path):
         print(f"Error reading file signature: {e}")
         return "Error"
 
-def calculate_entropy(file_path):
+def calculate_entropy(file_path, data=None):
     """Calculates Shannon Entropy to identify encrypted/packed files."""
     try:
-        with open(file_path, 'rb') as f:
-            # Read 1MB for speed to maintain sub-120s triage time
-            data = f.read(1024 * 1024) 
-        if not data: return 0
-        
-        entropy = 0
-        for x in range(256):
-            p_x = float(data.count(x))/len(data)
-            if p_x > 0:
-                # Shannon Entropy Formula: -sum(p_i * log2(p_i))
-                entropy += - p_x * math.log(p_x, 2)
-        return entropy
+        if data is None:
+            with open(file_path, 'rb') as f:
+                # Read 1MB for speed to maintain sub-120s triage time
+                data = f.read(1024 * 1024) 
+        # Shannon Entropy Formula: -sum(p_i * log2(p_i)), from a single byte histogram
+        return shannon_entropy(data)
     except Exception as e:
         print(f"Entropy Calculation Error: {e}")
         return 0
+
+def find_packed_regions(file_path, stream=None):
+    """
+    Slides an ENTROPY_WINDOW_SIZE window over the whole file and merges
+    overlapping high-entropy windows into (start, end, peak_entropy) regions.
+    """
+    try:
+        if stream is None:
+            with open(file_path, 'rb') as f:
+                return find_packed_regions(file_path, stream=f)
+
+        regions = []
+        for offset, entropy in window_entropies(stream, ENTROPY_WINDOW_SIZE, ENTROPY_WINDOW_STEP):
+            if entropy <= HIGH_ENTROPY_THRESHOLD:
+                continue
+            end = offset + ENTROPY_WINDOW_SIZE
+            if regions and offset <= regions[-1][1]:
+                start, _, peak = regions[-1]
+                regions[-1] = (start, end, max(peak, entropy))
+            else:
+                regions.append((offset, end, entropy))
+        return regions
+    except Exception as e:
+        print(f"Sliding Entropy Error: {e}")
+        return []
     
-@app.route('/verify_signature', methods=['POST'])
-def verify_signature_endpoint():
-    data = request.get_json()
-    if not data or 'file_path' not in data or 'investigation_id' not in data:
-        return jsonify({"error":"Missing 'file_path' or 'investigation_id'"}), 400
-        
-    file_path = data['file_path']
-    investigation_id = data['investigation_id']
+# Mapping detected_type to allowed extensions
+TYPE_TO_EXTENSIONS = {
+    "JPEG":        ['.jpg', '.jpeg'],
+    "PNG":         ['.png'],
+    "PDF":         ['.pdf'],
+    "ZIP/Office":  ['.zip', '.docx', '.xlsx', '.pptx', '.jar'],
+    "EXE/DLL":     ['.exe', '.dll', '.scr', '.com', '.sys', '.efi'],
+    "RAR":         ['.rar'],
+    "7-ZIP":       ['.7z'],
+    "ELF":         ['', '.bin', '.elf', '.so'], # Linux binaries often have no extension
+    "OLE2/Office": ['.doc', '.xls', '.ppt', '.msi'],
+    "LNK Shortcut":['.lnk'],
+    "CAB Archive": ['.cab'],
+    "Java CLASS":  ['.class'],
+    "GZIP":        ['.gz', '.tgz'],
+    "TXT":         ['.txt', '.log', '.ini', '.conf', '.py', '.js', '.php']
+}
+
+def extension_mismatch(file_path, detected_type):
+    """
+    The Signature Mismatch description for a file whose header type does not fit its
+    extension, or None. Depends only on the path and the detected type, so it can be
+    re-run for a duplicate file without reading it (see content_dedup).
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+
+    # Check if we have a mapping for this detected type
+    if detected_type in TYPE_TO_EXTENSIONS:
+        if file_extension not in TYPE_TO_EXTENSIONS[detected_type]:
+            return f"Signature Mismatch! File header is '{detected_type}' but extension is '{file_extension}'."
+
+    # Special case: Executable extension with no/unknown signature (Classic Malware Tactic)
+    elif file_extension in EXECUTABLE_EXTENSIONS and detected_type in ["Unknown", "TXT"]:
+        return f"Security Alert! File has executable extension '{file_extension}' but detected as '{detected_type}'."
+    return None
+
+def process_file(file_path, investigation_id, header_bytes=None, entropy_data=None, stream=None):
+    """
+    Runs entropy + signature/extension checks for one file and builds the API response.
+    header_bytes/entropy_data/stream let artifact_analyzer pass data it has already read.
+    """
     file_extension = os.path.splitext(file_path)[1].lower()
     
-    detected_type = verify_signature(file_path)
+    detected_type = verify_signature(file_path, header_bytes=header_bytes)
     
-    if detected_type is None: return jsonify({"error": "File not found"}), 404
-    if detected_type == "Error": return jsonify({"error": "Error reading file"}), 500
+    if detected_type is None: return {"error": "File not found"}, 404
+    if detected_type == "Error": return {"error": "Error reading file"}, 500
 
     # --- 1. Obfuscation Detection (Entropy) ---
-    entropy_val = calculate_entropy(file_path)
-    if entropy_val > 7.5: 
+    entropy_val = calculate_entropy(file_path, data=entropy_data)
+    packed_regions = []
+    # Findings that depend only on the bytes, returned so duplicates of this file can reuse them
+    content_findings = []
+    if entropy_val > HIGH_ENTROPY_THRESHOLD: 
         obs_desc = f"High Entropy Detected ({entropy_val:.2f}). File is likely encrypted or packed."
         save_to_db("Signature Agent", "Obfuscation Alert", obs_desc, investigation_id, file_path)
+        content_findings.append(("Obfuscation Alert", obs_desc))
 
-    # --- 2. Advanced Signature Mismatch Logic ---
-    # Mapping detected_type to allowed extensions
-    TYPE_TO_EXTENSIONS = {
-        "JPEG":        ['.jpg', '.jpeg'],
-        "PNG":         ['.png'],
-        "PDF":         ['.pdf'],
-        "ZIP/Office":  ['.zip', '.docx', '.xlsx', '.pptx', '.jar'],
-        "EXE/DLL":     ['.exe', '.dll', '.scr', '.com', '.sys', '.efi'],
-        "RAR":         ['.rar'],
-        "7-ZIP":       ['.7z'],
-        "ELF":         ['', '.bin', '.elf', '.so'], # Linux binaries often have no extension
-        "OLE2/Office": ['.doc', '.xls', '.ppt', '.msi'],
-        "LNK Shortcut":['.lnk'],
-        "CAB Archive": ['.cab'],
-        "Java CLASS":  ['.class'],
-        "GZIP":        ['.gz', '.tgz'],
-        "TXT":         ['.txt', '.log', '.ini', '.conf', '.py', '.js', '.php']
-    }
-
-    is_mismatch = False
-    mismatch_desc = ""
-
-    # Check if we have a mapping for this detected type
-    if detected_type in TYPE_TO_EXTENSIONS:
-        allowed_extensions = TYPE_TO_EXTENSIONS[detected_type]
-        if file_extension not in allowed_extensions:
-            is_mismatch = True
-            mismatch_desc = f"Signature Mismatch! File header is '{detected_type}' but extension is '{file_extension}'."
+    # Packed sections hidden inside an otherwise normal-looking binary
+    elif detected_type in PACKED_SCAN_TYPES:
+        packed_regions = find_packed_regions(file_path, stream=stream)
+        if packed_regions:
+            start, end, peak = packed_regions[0]
+            packed_desc = (
+                f"Packed Section Detected: {len(packed_regions)} high-entropy region(s), first at "
+                f"0x{start:x}-0x{end:x} (peak {peak:.2f}) in a file with overall entropy {entropy_val:.2f}."
+            )
+            save_to_db("Signature Agent", "Packed Section", packed_desc, investigation_id, file_path)
+            content_findings.append(("Packed Section", packed_desc))
 
-    # Special case: Executable extension with no/unknown signature (Classic Malware Tactic)
-    elif file_extension in EXECUTABLE_EXTENSIONS and detected_type in ["Unknown", "TXT"]:
-        is_mismatch = True
-        mismatch_desc = f"Security Alert! File has executable extension '{file_extension}' but detected as '{detected_type}'."
+    # --- 2. Advanced Signature Mismatch Logic ---
+    mismatch_desc = extension_mismatch(file_path, detected_type)
+    is_mismatch = mismatch_desc is not None
 
     # --- 3. Save Findings ---
     if is_mismatch:
@@ -131,12 +176,33 @@ def verify_signature_endpoint():
             file_path=file_path
         )
 
-    return jsonify({
+    return {
         "file": file_path,
         "extension": file_extension,
         "detected_type": detected_type,
         "entropy": round(entropy_val, 2),
-        "mismatch_found": is_mismatch
-    }), 200
+        "packed_regions": len(packed_regions),
+        "mismatch_found": is_mismatch,
+        "content_findings": content_findings
+    }, 200
+
+def process_request(file_path, data):
+    """Per-file entry point shared by the batch endpoint and agent_transport."""
+    return process_file(file_path, data['investigation_id'])
+
+@app.route('/verify_signature', methods=['POST'])
+def verify_signature_endpoint():
+    data = request.get_json()
+    if not data or 'file_path' not in data or 'investigation_id' not in data:
+        return jsonify({"error":"Missing 'file_path' or 'investigation_id'"}), 400
+        
+    result, status = process_file(data['file_path'], data['investigation_id'])
+    return jsonify(result), status
+
+@app.route('/verify_signature_batch', methods=['POST'])
+def verify_signature_batch_endpoint():
+    """Batch variant of /verify_signature: 'file_paths' list or 'manifest' in, NDJSON out."""
+    return stream_batch(process_request)
+
 if __name__ == '__main__':
     app.run(port=5003, debug=False)
\ No newline at end of file
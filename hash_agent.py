@@ -1,13 +1,19 @@
 import os
 import hashlib
+import hash_cache
+import hash_store
 from flask import Flask, request, jsonify
-from config import DB_CONFIG
-from db_utils import save_to_db
+from config import DB_CONFIG, FORENSIC_MODE
+from db_utils import save_to_db, save_file_hash, register_flush_endpoint
+from batch_utils import stream_batch
 
 app = Flask(__name__)
+register_flush_endpoint(app)
 
 # --- FORENSIC BLOCKLIST ---
 # These are SHA-256 signatures of high-impact threats for your demo.
+# They are a named overlay on top of the bulk feed store (hash_store.py), which holds the
+# NSRL/threat-feed scale lists and only says "listed or not".
 KNOWN_BAD_HASHES = {
     # EICAR Test File (Use this for your live "Malware Hit" demo)
     "275a021bbfb6489e54d471899f7db9d1663fc695ec2fe2a2c4538aabf651fd0f": "EICAR Anti-Virus Test File (Standardized Detection Match)",
@@ -22,30 +28,47 @@ KNOWN_BAD_HASHES = {
     "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855": "Zero-Byte Artifact (Possible Evasion/Wiping Indicator)"
 }
 
-def calculate_hash(file_path):
-    """Computes the SHA-256 hash of a file using block-reads to save RAM."""
+def calculate_hash(file_path, forensic_mode=FORENSIC_MODE):
+    """
+    Computes the SHA-256 hash of a file using block-reads to save RAM.
+    Unchanged files are answered from the hash cache unless forensic_mode is set.
+    """
     sha256_hash = hashlib.sha256()
     try:
         if not os.path.exists(file_path):
             return None
+        st = os.stat(file_path)
+        cached = hash_cache.lookup(st, forensic_mode=forensic_mode)
+        if cached:
+            return cached
         with open(file_path, "rb") as f:
             # Read in 4KB chunks to avoid crashing your 8GB RAM ASUS Vivobook
             for byte_block in iter(lambda: f.read(4096), b""):
                 sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+        digest = sha256_hash.hexdigest()
+        if hash_cache.is_unchanged(file_path, st):
+            hash_cache.store(st, digest)
+        return digest
     except Exception as e:
         print(f"[HashAgent] Error hashing {file_path}: {e}")
         return None
 
-def analyze_file_hash(file_path, investigation_id):
-    """Checks the file hash against the local blocklist and saves results."""
-    file_hash = calculate_hash(file_path)
+def analyze_file_hash(file_path, investigation_id, file_hash=None, forensic_mode=FORENSIC_MODE, st=None):
+    """
+    Checks the file hash against the local blocklist and saves results.
+    A caller that already hashed the file (artifact_analyzer) passes file_hash to skip the re-read,
+    and the stat result it hashed from for the manifest's size and timestamps.
+    """
+    if file_hash is None:
+        file_hash = calculate_hash(file_path, forensic_mode=forensic_mode)
     if not file_hash:
         return None
 
     # 1. Check for Critical Malware Hit (Highest Priority)
-    if file_hash in KNOWN_BAD_HASHES:
-        malware_name = KNOWN_BAD_HASHES[file_hash]
+    malware_name = KNOWN_BAD_HASHES.get(file_hash)
+    if malware_name is None and hash_store.contains(file_hash):
+        malware_name = "Threat Feed Match (Known-Bad Hash Store)"
+    if malware_name:
         description = f"CRITICAL: {malware_name} | SHA256: {file_hash}"
         save_to_db(
             agent_name="HashAgent", 
@@ -55,38 +78,55 @@ def analyze_file_hash(file_path, investigation_id):
             file_path=file_path
         )
     
-    # 2. Standard Logging (Every file gets hashed for the Merkle Seal)
-    standard_desc = f"SHA256: {file_hash}"
-    save_to_db(
-        agent_name="HashAgent", 
-        finding_type="File Hash", 
-        description=standard_desc, 
-        investigation_id=investigation_id, 
-        file_path=file_path
-    )
+    # 2. Standard Logging (Every file gets hashed for the Merkle Seal) - into the hash manifest,
+    # not the findings table
+    if st is None:
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            st = None
+    save_file_hash(investigation_id, file_path, file_hash, st)
     
     return file_hash
 
-@app.route('/analyze_file', methods=['POST'])
-def analyze_file():
-    data = request.get_json()
-    if not data or 'file_path' not in data or 'investigation_id' not in data:
-        return jsonify({"error": "Missing 'file_path' or 'investigation_id'"}), 400
-        
-    file_path = data['file_path']
-    investigation_id = data['investigation_id']
-    
-    # Executes the full hashing + blocklist check logic
-    file_hash = analyze_file_hash(file_path, investigation_id)
+def process_file(file_path, investigation_id, file_hash=None, forensic_mode=FORENSIC_MODE, st=None):
+    """Runs the full hashing + blocklist check for one file and builds the API response."""
+    file_hash = analyze_file_hash(file_path, investigation_id, file_hash=file_hash, forensic_mode=forensic_mode, st=st)
     
     if file_hash:
-        return jsonify({
+        return {
             "message": "Hash Analysis complete",
             "file": file_path, 
             "hash": file_hash
-        }), 200
+        }, 200
     else:
-        return jsonify({"error": "File processing failed. Ensure the path is accessible."}), 500
+        return {"error": "File processing failed. Ensure the path is accessible."}, 500
+
+def process_request(file_path, data):
+    """process_file with a request body's options (forensic_mode); also the in-process entry point (agent_transport)."""
+    return process_file(file_path, data['investigation_id'], forensic_mode=data.get('forensic_mode', FORENSIC_MODE))
+
+@app.route('/analyze_file', methods=['POST'])
+def analyze_file():
+    data = request.get_json()
+    if not data or 'file_path' not in data or 'investigation_id' not in data:
+        return jsonify({"error": "Missing 'file_path' or 'investigation_id'"}), 400
+        
+    result, status = process_file(
+        data['file_path'], data['investigation_id'],
+        forensic_mode=data.get('forensic_mode', FORENSIC_MODE)
+    )
+    return jsonify(result), status
+
+@app.route('/analyze_file_batch', methods=['POST'])
+def analyze_file_batch():
+    """Batch variant of /analyze_file: 'file_paths' list or 'manifest' in, NDJSON out."""
+    return stream_batch(process_request)
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Hash cache hit/miss counters for this agent process."""
+    return jsonify(hash_cache.get_stats()), 200
 
 if __name__ == '__main__':
     # Running on Port 5001 as defined in your controller.py
@@ -0,0 +1,90 @@
+# hash_cache.py
+import os
+import sqlite3
+import threading
+from config import HASH_CACHE_PATH
+
+# SQLite connections are per-thread; the agents and the controller all run threaded.
+_local      = threading.local()
+_stats_lock = threading.Lock()
+_stats      = {"hits": 0, "misses": 0, "bypassed": 0}
+
+def _get_conn():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(HASH_CACHE_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                dev      INTEGER NOT NULL,
+                ino      INTEGER NOT NULL,
+                size     INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                ctime_ns INTEGER NOT NULL,
+                sha256   TEXT    NOT NULL,
+                PRIMARY KEY (dev, ino, size, mtime_ns, ctime_ns)
+            )
+        """)
+        _local.conn = conn
+    return conn
+
+def _count(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+def stat_key(st):
+    """
+    Identity of one version of a file. ctime is included alongside mtime because
+    timestomping tools rewrite mtime but cannot set the inode-change time.
+    """
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+def identity_stat(file_path, st=None):
+    """
+    A stat result usable as a cache key: `st` itself when it carries the file's identity,
+    otherwise a fresh os.stat. On Windows os.scandir's DirEntry.stat() leaves st_ino and
+    st_dev at 0, so different files with equal sizes and times would share a key.
+    """
+    if st is not None and st.st_ino:
+        return st
+    return os.stat(file_path)
+
+def lookup(st, forensic_mode=False):
+    """Returns the cached SHA-256 for this stat result, or None. Forensic mode always misses."""
+    if forensic_mode:
+        _count("bypassed")
+        return None
+    try:
+        row = _get_conn().execute(
+            "SELECT sha256 FROM file_hashes WHERE dev=? AND ino=? AND size=? AND mtime_ns=? AND ctime_ns=?",
+            stat_key(st)
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"[HashCache] Lookup failed: {e}")
+        row = None
+    _count("hits" if row else "misses")
+    return row[0] if row else None
+
+def store(st, sha256):
+    """Remembers the hash for this stat result (also in forensic mode, so the cache stays fresh)."""
+    try:
+        conn = _get_conn()
+        conn.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?, ?, ?)", (*stat_key(st), sha256))
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"[HashCache] Store failed: {e}")
+
+def is_unchanged(file_path, st):
+    """True if the file still has the identity it had before it was hashed."""
+    try:
+        return stat_key(os.stat(file_path)) == stat_key(st)
+    except OSError:
+        return False
+
+def get_stats():
+    """Hit/miss counters for this process since start-up."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
@@ -0,0 +1,212 @@
+# hash_store.py
+"""
+Immutable known-bad SHA-256 store.
+
+File layout: 8-byte magic, little-endian uint64 entry count, then the raw 32-byte
+digests in ascending order. Lookups binary-search a read-only mmap, so opening a
+store is O(1), memory is shared with the page cache, and a 50M-entry feed costs
+1.6 GB of disk instead of several GB of Python strings.
+
+    python hash_store.py build feed1.txt [feed2.csv ...] -o known_bad.hashes
+    python hash_store.py check <sha256> [--store known_bad.hashes]
+
+Rebuilds replace the file atomically; running agents pick up the new file on
+their next lookup after it changes (hot reload).
+"""
+import os
+import sys
+import mmap
+import time
+import heapq
+import struct
+import argparse
+import tempfile
+import threading
+from config import KNOWN_BAD_STORE_PATH, KNOWN_BAD_RELOAD_INTERVAL
+
+MAGIC       = b"DFIRHS01"
+HEADER      = struct.Struct("<8sQ")
+DIGEST_SIZE = 32
+# Digests held in memory per sorted run while building (32 MB of digests per run)
+BUILD_RUN_SIZE = 1_000_000
+
+# --- READER ---
+_lock  = threading.Lock()
+_state = {"path": None, "mtime_ns": None, "checked": 0.0, "mm": None, "count": 0}
+
+
+def _open_store(path):
+    """Maps a store file read-only and validates its header. Returns (mmap, count)."""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError(f"{path} is not a hash store (file too small)")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, count = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or size != HEADER.size + count * DIGEST_SIZE:
+        mm.close()
+        raise ValueError(f"{path} is not a hash store (bad header)")
+    return mm, count
+
+
+def _current(path=None):
+    """
+    The (mmap, count) for the active store, reopened when the file's mtime changes.
+    The file is stat'ed at most every KNOWN_BAD_RELOAD_INTERVAL seconds. A replaced
+    mmap is not closed explicitly: lookups still holding it finish on the old
+    snapshot and it is released with its last reference.
+    """
+    path = path or KNOWN_BAD_STORE_PATH
+    now  = time.monotonic()
+    with _lock:
+        if _state["path"] == path and now - _state["checked"] < KNOWN_BAD_RELOAD_INTERVAL:
+            return _state["mm"], _state["count"]
+        _state["checked"] = now
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if _state["path"] != path or _state["mtime_ns"] != mtime_ns:
+            mm, count = None, 0
+            if mtime_ns is not None:
+                try:
+                    mm, count = _open_store(path)
+                    print(f"[HashStore] Loaded {count} known-bad hashes from {path}")
+                except (OSError, ValueError) as e:
+                    print(f"[HashStore] Could not load {path}: {e}")
+            _state.update(path=path, mtime_ns=mtime_ns, mm=mm, count=count)
+        return _state["mm"], _state["count"]
+
+
+def contains(sha256_hex, path=None):
+    """True if the hex SHA-256 digest is in the store. A missing store contains nothing."""
+    mm, count = _current(path)
+    if not count:
+        return False
+    try:
+        key = bytes.fromhex(sha256_hex)
+    except ValueError:
+        return False
+    lo, hi = 0, count
+    while lo < hi:
+        mid    = (lo + hi) // 2
+        offset = HEADER.size + mid * DIGEST_SIZE
+        probe  = mm[offset:offset + DIGEST_SIZE]
+        if probe < key:
+            lo = mid + 1
+        elif probe > key:
+            hi = mid
+        else:
+            return True
+    return False
+
+
+def entry_count(path=None):
+    return _current(path)[1]
+
+
+# --- BUILDER ---
+def iter_feed(feed_path):
+    """
+    Yields 32-byte digests from a text feed: one SHA-256 per line, or CSV/TSV with
+    the SHA-256 in the first column. Comments, headers and malformed lines are skipped.
+    """
+    with open(feed_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            field = line.strip().replace('\t', ',').split(',', 1)[0].split(' ', 1)[0].strip('"\'')
+            if len(field) != 2 * DIGEST_SIZE:
+                continue
+            try:
+                yield bytes.fromhex(field)
+            except ValueError:
+                continue
+
+
+def _write_run(digests, tmp_dir):
+    digests.sort()
+    run = tempfile.TemporaryFile(dir=tmp_dir)
+    run.write(b"".join(digests))
+    run.seek(0)
+    return run
+
+
+def _iter_run(run):
+    for block in iter(lambda: run.read(DIGEST_SIZE * 4096), b""):
+        for i in range(0, len(block), DIGEST_SIZE):
+            yield block[i:i + DIGEST_SIZE]
+
+
+def write_store(out_path, sorted_digests):
+    """
+    Writes ascending, de-duplicated digests to out_path via a temp file and an atomic
+    rename, so readers only ever see a complete store. Returns the entry count.
+    """
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, prefix=".hashstore-")
+    count, last = 0, None
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(HEADER.pack(MAGIC, 0))
+            for digest in sorted_digests:
+                if digest != last:
+                    out.write(digest)
+                    count += 1
+                    last = digest
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, count))
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return count
+
+
+def build_store(feed_paths, out_path, run_size=BUILD_RUN_SIZE):
+    """
+    Builds a store from one or more text feeds with a bounded-memory external sort:
+    sorted runs of run_size digests are spilled to temp files and k-way merged.
+    Returns the number of distinct digests written.
+    """
+    tmp_dir = os.path.dirname(os.path.abspath(out_path))
+    runs, pending = [], []
+    try:
+        for feed_path in feed_paths:
+            for digest in iter_feed(feed_path):
+                pending.append(digest)
+                if len(pending) >= run_size:
+                    runs.append(_write_run(pending, tmp_dir))
+                    pending = []
+        if pending or not runs:
+            runs.append(_write_run(pending, tmp_dir))
+        return write_store(out_path, heapq.merge(*(_iter_run(run) for run in runs)))
+    finally:
+        for run in runs:
+            run.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the known-bad SHA-256 store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="Build a store from text/CSV hash feeds")
+    p.add_argument("feeds", nargs="+")
+    p.add_argument("-o", "--output", default=KNOWN_BAD_STORE_PATH)
+
+    p = sub.add_parser("check", help="Look up one SHA-256")
+    p.add_argument("sha256")
+    p.add_argument("--store", default=KNOWN_BAD_STORE_PATH)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        start = time.perf_counter()
+        count = build_store(args.feeds, args.output)
+        print(f"[+] Wrote {count} hashes to {args.output} in {time.perf_counter() - start:.1f}s")
+    else:
+        found = contains(args.sha256.strip().lower(), path=args.store)
+        print(f"[{'!' if found else '+'}] {args.sha256}: {'KNOWN BAD' if found else 'not listed'} "
+              f"({entry_count(args.store)} entries)")
+        return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# insight_cache.py
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from config import INSIGHT_CACHE_PATH, INSIGHT_CACHE_MAX_ENTRIES
+
+# SQLite connections are per-thread; the analyst calls the model from a thread pool.
+_local      = threading.local()
+_stats_lock = threading.Lock()
+_stats      = {"hits": 0, "misses": 0, "evicted": 0}
+_puts       = 0
+
+# Evict at most once per this many stores rather than counting rows on every write
+EVICT_EVERY = 100
+
+# --- FINDINGS NORMALIZATION ---
+# Per-file details that do not change what the analyst would say about a pattern.
+_NORMALIZERS = [
+    (re.compile(r"\b[0-9a-fA-F]{32,128}\b"), "<HASH>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<OFFSET>"),
+    (re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?"), "<TIME>"),
+    (re.compile(r"\b[A-Za-z]:\\[^\s,|'\"()]*"), "<PATH>"),
+    (re.compile(r"(?<![\w.:/])/[^\s,|'\"()]+"), "<PATH>"),
+    (re.compile(r"\\\\[^\s,|'\"()]+"), "<PATH>"),
+]
+_DECIMAL  = re.compile(r"\b\d+\.\d{2,}\b")
+_SPACES   = re.compile(r"\s+")
+PLACEHOLDER = "<ARTIFACT>"
+
+def normalize_finding(description):
+    text = description or ""
+    for pattern, token in _NORMALIZERS:
+        text = pattern.sub(token, text)
+    # Entropy-style scores are kept to one decimal so 7.62 and 7.64 share an entry
+    text = _DECIMAL.sub(lambda m: f"{float(m.group()):.1f}", text)
+    return _SPACES.sub(" ", text).strip()
+
+def cache_key(model, system_prompt, findings_list):
+    """Model + system prompt + the order-independent normalized findings."""
+    fingerprint = "\n".join(sorted(normalize_finding(f) for f in findings_list))
+    return hashlib.sha256(f"{model}\0{system_prompt}\0{fingerprint}".encode('utf-8')).hexdigest()
+
+def _anonymize(insight, file_path, basename):
+    """Swaps the artifact's own path/name for a placeholder so the text can be reused for another file."""
+    for name in (file_path, basename):
+        if name and len(name) >= 3:
+            insight = insight.replace(name, PLACEHOLDER)
+    return insight
+
+def _personalize(insight, basename):
+    return insight.replace(PLACEHOLDER, basename)
+
+
+# --- STORE ---
+def _get_conn():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(INSIGHT_CACHE_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS insights (
+                key       TEXT    PRIMARY KEY,
+                insight   TEXT    NOT NULL,
+                created   REAL    NOT NULL,
+                last_used REAL    NOT NULL,
+                hits      INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS insights_last_used ON insights (last_used)")
+        _local.conn = conn
+    return conn
+
+def _count(counter, n=1):
+    with _stats_lock:
+        _stats[counter] += n
+
+def get(key, basename=""):
+    """Returns the cached insight rewritten for this artifact, or None. Refreshes its LRU position."""
+    try:
+        conn = _get_conn()
+        row = conn.execute("SELECT insight FROM insights WHERE key = ?", (key,)).fetchone()
+        if row:
+            conn.execute("UPDATE insights SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"[InsightCache] Lookup failed: {e}")
+        row = None
+    _count("hits" if row else "misses")
+    return _personalize(row[0], basename) if row else None
+
+def put(key, insight, file_path="", basename=""):
+    """Stores an insight with the artifact's own name replaced by a placeholder."""
+    global _puts
+    now = time.time()
+    try:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO insights (key, insight, created, last_used) VALUES (?, ?, ?, ?)",
+            (key, _anonymize(insight, file_path, basename), now, now)
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"[InsightCache] Store failed: {e}")
+        return
+    with _stats_lock:
+        _puts += 1
+        due = _puts % EVICT_EVERY == 1
+    if due:
+        evict()
+
+def evict(max_entries=INSIGHT_CACHE_MAX_ENTRIES):
+    """Drops the least recently used entries beyond max_entries."""
+    try:
+        conn = _get_conn()
+        (total,) = conn.execute("SELECT COUNT(*) FROM insights").fetchone()
+        if total > max_entries:
+            conn.execute(
+                "DELETE FROM insights WHERE key IN (SELECT key FROM insights ORDER BY last_used LIMIT ?)",
+                (total - max_entries,)
+            )
+            conn.commit()
+            _count("evicted", total - max_entries)
+    except sqlite3.Error as e:
+        print(f"[InsightCache] Eviction failed: {e}")
+
+def get_stats():
+    """Hit/miss counters for this process since start-up."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
@@ -1,11 +1,16 @@
 import os
 import psycopg2
+import io
 import re
+import functools
+import collections
 from flask import Flask, request, jsonify
-from config import DB_CONFIG
-from db_utils import save_to_db
+from config import DB_CONFIG, KEYWORD_CHUNK_SIZE, KEYWORD_CHUNK_OVERLAP, KEYWORD_MAX_SCAN_BYTES
+from db_utils import save_to_db, register_flush_endpoint
+from batch_utils import stream_batch
 
 app = Flask(__name__)
+register_flush_endpoint(app)
 
 FORENSIC_LIBRARY = {
     "PII_Confidential": [
@@ -27,62 +32,198 @@ FORENSIC_LIBRARY = {
     ]
 }
 
-def search_forensic_patterns(file_path, custom_keywords=None):
-    found_hits = []
-    all_patterns = []
+MAX_HITS_PER_PATTERN = 5
+CONTEXT_BYTES        = 20
+# Bytes kept in front of each window's new data, so \b and the 20-byte context still see what preceded it
+WINDOW_LOOKBEHIND    = 64
+
+_CASELESS_GROUP = re.compile(r"^\(\?i\)\((.*)\)$")
+_PLAIN_LITERAL  = re.compile(r"^(?:[^\\.^$*+?{}\[\]|()]|\\[^A-Za-z0-9])+$")
+
+# Compiled pattern set for one keyword list and one set of not-yet-capped patterns.
+# Everything is bytes: files are scanned as read, without decoding them to str.
+# There are three passes: '(?i)(a|b)' literals over ASCII-lowered bytes, user keywords
+# case-sensitively over the original bytes, and everything else. In each pass `finder`
+# (one alternation of the pass's patterns) only locates the next offset where any of
+# them matches; `singles` (each pattern compiled on its own) decide what every pattern
+# matches there, so one pattern's match never hides another pattern's hit.
+_Pass = collections.namedtuple("_Pass", "finder singles")
+_PASS_KINDS = ("caseless", "exact", "regex")
+
+def _caseless_literals(pattern):
+    """Returns the lowercase literals of a '(?i)(a|b|c)' pattern, or None for anything regex-like."""
+    m = _CASELESS_GROUP.match(pattern)
+    if not m:
+        return None
+    alternatives = m.group(1).split("|")
+    if not all(_PLAIN_LITERAL.match(a) for a in alternatives):
+        return None
+    return tuple(re.sub(r"\\(.)", r"\1", a).lower().encode('utf-8') for a in alternatives)
+
+@functools.lru_cache(maxsize=64)
+def _pattern_entries(custom_keywords):
+    """
+    (category, bytes regex, kind) for the forensic library followed by the user keywords.
+    kind is "caseless" (the regex is the lowered literals, in their original order), "exact" or "regex".
+    """
+    entries = []
     for category, patterns in FORENSIC_LIBRARY.items():
         for p in patterns:
-            all_patterns.append((category, p))
-    if custom_keywords:
-        for k in custom_keywords:
-            all_patterns.append(("User Defined", re.escape(k)))
+            literals = _caseless_literals(p)
+            if literals:
+                entries.append((category, b"|".join(re.escape(l) for l in literals), "caseless"))
+            else:
+                entries.append((category, p.encode('utf-8'), "regex"))
+    for k in custom_keywords:
+        entries.append(("User Defined", re.escape(k.encode('utf-8')), "exact"))
+    return tuple(entries)
+
+@functools.lru_cache(maxsize=256)
+def _compile_engines(custom_keywords, active):
+    """
+    Builds the three passes for the active patterns. The finders use no capture
+    groups: CPython's re keeps its fast literal-prefix scan only without them,
+    which is what makes one alternation of N keywords cheaper than N separate scans.
+    """
+    entries = _pattern_entries(custom_keywords)
+    passes = []
+    for kind in _PASS_KINDS:
+        ids = [i for i in active if entries[i][2] == kind]
+        if not ids:
+            passes.append(_Pass(None, ()))
+            continue
+        finder = re.compile(b"|".join(b"(?:" + entries[i][1] + b")" for i in ids))
+        passes.append(_Pass(finder, tuple((i, re.compile(entries[i][1])) for i in ids)))
+    return tuple(passes)
+
+def _keyword_key(custom_keywords):
+    """Normalizes a keyword list into a hashable cache key (empty keywords would match everywhere)."""
+    return tuple(sorted(set(k for k in (custom_keywords or []) if k)))
+
+def _as_text(data):
+    return data.decode('utf-8', errors='ignore')
+
+def scan_stream(stream, custom_keywords=None, chunk_size=KEYWORD_CHUNK_SIZE,
+                overlap=KEYWORD_CHUNK_OVERLAP, max_bytes=KEYWORD_MAX_SCAN_BYTES):
+    """
+    Scans a binary stream of any size against the library + custom keywords.
+
+    The stream is read in chunk_size pieces. Each window is the new chunk plus
+    the unscanned tail of the previous one, and matches starting in the last
+    `overlap` bytes are left for the next window, so hits that straddle a
+    chunk boundary (up to `overlap` bytes long) are still found. Memory stays
+    around chunk_size + overlap whatever the file size. max_bytes > 0 stops early.
+
+    Every pattern reports what its own re.finditer would: each keeps the offset
+    its previous match ended at, and is tried wherever a pass's finder stops at
+    or after that offset. A pattern that reaches MAX_HITS_PER_PATTERN is dropped
+    from the finders, and scanning stops once every pattern is capped.
+
+    Patterns are bytes regexes, so \\b, \\w and \\d are ASCII-only and '(?i)'
+    literals fold ASCII case only: a non-ASCII letter such as 'é' is not a word
+    character, unlike in the old decode-then-scan path.
+    """
+    overlap  = max(overlap, 2 * WINDOW_LOOKBEHIND)
+    keywords = _keyword_key(custom_keywords)
+    entries  = _pattern_entries(keywords)
+    counts   = [0] * len(entries)
+    active   = tuple(range(len(entries)))
+    resume   = [0] * len(entries)   # absolute offset each pattern's next match may start at
+    found_hits = []
+
+    remaining = max_bytes if max_bytes > 0 else None
+    def read_chunk():
+        nonlocal remaining
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        data = stream.read(size) if size else b""
+        if remaining is not None:
+            remaining -= len(data)
+        return data
+
+    carry, base = b"", 0      # carry[0] sits at absolute offset `base`
+    chunk = read_chunk()
+    while True:
+        next_chunk = read_chunk() if chunk else b""
+        window  = carry + chunk
+        final   = not next_chunk
+        limit   = len(window) if final else len(window) - overlap
+        lowered = window.lower()   # ASCII-only, so offsets stay aligned with `window`
+
+        for p, text in enumerate((lowered, window, window)):
+            engine = _compile_engines(keywords, active)[p]
+            while engine.singles:
+                found = engine.finder.search(text, min(resume[i] for i, _ in engine.singles) - base)
+                if found is None or found.start() >= limit:
+                    break             # the rest belongs to the next window
+                at, capped = found.start(), False
+                for idx, rx in engine.singles:
+                    if resume[idx] - base > at:
+                        continue      # inside this pattern's previous match
+                    match = rx.match(text, at)
+                    if match is None:
+                        resume[idx] = base + at + 1
+                        continue
+                    start = max(0, match.start() - CONTEXT_BYTES)
+                    end   = min(len(window), match.end() + CONTEXT_BYTES)
+                    context = _as_text(window[start:end]).replace('\n', ' ').strip()
+                    found_hits.append({
+                        "category": entries[idx][0],
+                        "match":    _as_text(window[match.start():match.end()]),
+                        "context":  f"...{context}..."
+                    })
+                    resume[idx] = base + max(match.end(), at + 1)
+                    counts[idx] += 1
+                    if counts[idx] >= MAX_HITS_PER_PATTERN:   # cap per-pattern, not per-file
+                        capped = True
+                if capped:
+                    active = tuple(i for i in active if counts[i] < MAX_HITS_PER_PATTERN)
+                    engine = _compile_engines(keywords, active)[p]
+        resume = [max(r, base + limit) for r in resume]
+
+        if final or not active:
+            break
+        keep_from = max(limit - WINDOW_LOOKBEHIND, 0)
+        carry, base = window[keep_from:], base + keep_from
+        chunk = next_chunk
+
+    return found_hits
+
+def scan_bytes(data, custom_keywords=None):
+    """Convenience wrapper for an in-memory buffer."""
+    return scan_stream(io.BytesIO(data), custom_keywords)
+
+# Compile the library matchers once at startup rather than on the first request
+_compile_engines((), tuple(range(len(_pattern_entries(())))))
 
+def search_forensic_patterns(file_path, custom_keywords=None, stream=None):
+    """
+    Scans the whole file against the forensic library.
+    artifact_analyzer passes `stream` (an open file or mmap) so the file is not opened twice.
+    """
     try:
+        if stream is not None:
+            return scan_stream(stream, custom_keywords)
         with open(file_path, 'rb') as f:
-            raw_data = f.read(2 * 1024 * 1024)
-            content = raw_data.decode('utf-8', errors='ignore')
-
-        for category, pattern in all_patterns:
-            cat_hits = 0
-            for match in re.finditer(pattern, content):
-                start = max(0, match.start() - 20)
-                end   = min(len(content), match.end() + 20)
-                context = content[start:end].replace('\n', ' ').strip()
-                found_hits.append({
-                    "category": category,
-                    "match":    match.group(),
-                    "context":  f"...{context}..."
-                })
-                cat_hits += 1
-                if cat_hits >= 5:   # cap per-pattern, not per-file
-                    break
-
+            return scan_stream(f, custom_keywords)
     except Exception as e:
         print(f"Error scanning {file_path}: {e}")
-
-    return found_hits
+        return []
 
 
-@app.route('/search_keywords', methods=['POST'])
-def search_keywords_endpoint():
-    data = request.get_json()
-    if not data or 'file_path' not in data or 'investigation_id' not in data:
-        return jsonify({"error": "Missing 'file_path' or 'investigation_id'"}), 400
-    
-    file_path = data['file_path']
-    investigation_id = data['investigation_id']
-    custom_keywords = data.get('keywords', [])
-    
-    hits = search_forensic_patterns(file_path, custom_keywords)
+def process_file(file_path, investigation_id, custom_keywords, stream=None):
+    """Scans one file, records a finding per matched category and builds the API response."""
+    hits = search_forensic_patterns(file_path, custom_keywords, stream=stream)
     
     if hits:
         # Deduplicate matches and group by category for the report
         categories_found = set(h['category'] for h in hits)
+        descriptions = []
         for cat in categories_found:
             cat_matches = list(set(h['match'] for h in hits if h['category'] == cat))
             
             description = f"[{cat}] Forensic Match: {', '.join(cat_matches[:5])}"
             if len(cat_matches) > 5: description += " ..."
+            descriptions.append(description)
 
             save_to_db(
                 agent_name="KeywordAgent", 
@@ -92,14 +233,36 @@ def search_keywords_endpoint():
                 file_path=file_path
             )
         
-        return jsonify({
+        return {
             "message": "Forensic Keyword Search complete", 
             "file": file_path, 
             "matches_found": len(hits),
-            "categories": list(categories_found)
-        }), 200
+            "categories": list(categories_found),
+            "findings": descriptions
+        }, 200
     else:
-        return jsonify({"message": "No forensic patterns detected", "file": file_path, "matches_found": 0}), 200
+        return {"message": "No forensic patterns detected", "file": file_path, "matches_found": 0,
+                "categories": [], "findings": []}, 200
+
+
+def process_request(file_path, data):
+    """Per-file entry point for batch bodies and agent_transport: scans with the body's keyword list."""
+    return process_file(file_path, data['investigation_id'], data.get('keywords', []))
+
+
+@app.route('/search_keywords', methods=['POST'])
+def search_keywords_endpoint():
+    data = request.get_json()
+    if not data or 'file_path' not in data or 'investigation_id' not in data:
+        return jsonify({"error": "Missing 'file_path' or 'investigation_id'"}), 400
+    
+    result, status = process_file(data['file_path'], data['investigation_id'], data.get('keywords', []))
+    return jsonify(result), status
+
+@app.route('/search_keywords_batch', methods=['POST'])
+def search_keywords_batch_endpoint():
+    """Batch variant of /search_keywords: 'file_paths' list or 'manifest' in, NDJSON out."""
+    return stream_batch(process_request)
 
 if __name__ == '__main__':
     app.run(port=5002, debug=False)
\ No newline at end of file
@@ -7,11 +7,13 @@ import subprocess
 import threading
 import datetime
 import io
+import queue
 import html
 import functools
+import hashlib
 import pathlib
 
-from flask import Flask, jsonify, render_template, request, g, send_file
+from flask import Flask, Response, jsonify, render_template, request, g, send_file
 import psycopg2
 from psycopg2.extras import DictCursor
 import psutil
@@ -29,7 +31,11 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 # Custom modules
 import merkle_utils
 import ai_analyst
-from config import DB_CONFIG, API_AUTH_TOKEN
+import report_queries
+import event_bus
+from db_utils import ensure_schema
+from config import (DB_CONFIG, API_AUTH_TOKEN, REPORT_PAGE_SIZE, REPORT_MAX_PAGE_SIZE,
+                    FINDINGS_PAGE_SIZE, EVENT_KEEPALIVE, FINDINGS_WATCH_INTERVAL)
 
 app = Flask(__name__)
 QUARANTINE_DIR = "D:\\DigitalForensics\\Quarantine"
@@ -65,30 +71,95 @@ def close_db(e=None):
         db.close()
 
 
+# --- CONDITIONAL POLLING ---
+def _state_etag(state, *extra):
+    """ETag for a response derived from the latest investigation's state row (report_queries.latest_investigation)."""
+    parts = [state['investigation_id'], state['leaf_count'], state['revision'], state['merkle_root'], state['status'],
+             state['content_reused'], state['content_analyzed'], *extra]
+    return hashlib.sha1("|".join(map(str, parts)).encode('utf-8')).hexdigest()
+
+def _not_modified(etag):
+    """304 for a poll whose If-None-Match already names this content, else None."""
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = 'no-cache'
+        return resp
+    return None
+
+def _tagged(payload, etag):
+    resp = jsonify(payload)
+    resp.set_etag(etag)
+    # Cacheable, but always revalidated: pollers get a 304 instead of the same body again
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
 # --- BACKGROUND ORCHESTRATION ---
-def run_full_analysis(directory_path, investigation_id):
-    """Orchestrates the 8-agent scan and AI analysis."""
+def watch_findings(investigation_id, stop):
+    """
+    Publishes a "findings" event whenever the investigation's stored record count
+    (findings plus file hashes) grows; clients fetch the rows themselves with ?since=.
+    """
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+    except Exception as e:
+        print(f"[!] Findings watcher could not connect: {e}")
+        return
+    seen = 0
+    try:
+        while not stop.wait(FINDINGS_WATCH_INTERVAL):
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT leaf_count FROM merkle_state WHERE investigation_id = %s", (investigation_id,))
+                    row = cur.fetchone()
+            except psycopg2.Error:
+                # The controller may not have migrated the schema yet
+                row = None
+            conn.rollback()
+            if row and row[0] > seen:
+                event_bus.publish("findings", {"investigation_id": investigation_id, "records": row[0], "new": row[0] - seen})
+                seen = row[0]
+    finally:
+        conn.close()
+
+def run_full_analysis(directory_path, investigation_id, resume=False):
+    """Orchestrates the 8-agent scan and AI analysis; resume continues an interrupted investigation."""
+    stop_watch = threading.Event()
     try:
         python_executable = sys.executable
         controller_script = os.path.join(os.path.dirname(__file__), 'controller.py')
 
         print(f"[*] Launching 8-Agent Controller: {investigation_id}")
+        event_bus.publish("phase", {"investigation_id": investigation_id, "phase": "starting"})
+        threading.Thread(target=watch_findings, args=(investigation_id, stop_watch), daemon=True).start()
         process = subprocess.Popen(
-            [python_executable, controller_script, directory_path, investigation_id],
+            [python_executable, controller_script, directory_path, investigation_id, "--events"]
+            + (["--resume"] if resume else []),
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True
         )
-        # Stream controller output to our console instead of swallowing it
+        # Stream controller output to our console instead of swallowing it; event lines go to the bus
         for line in process.stdout:
-            print(f"  [controller] {line}", end="")
+            event = event_bus.parse_line(line)
+            if event:
+                event_bus.publish(*event)
+            else:
+                print(f"  [controller] {line}", end="")
         process.wait()
+        stop_watch.set()
 
         print(f"[+] Scan Phase Complete. Initializing Local AI Synthesis...")
+        event_bus.publish("phase", {"investigation_id": investigation_id, "phase": "ai"})
         ai_analyst.run_analysis_on_scan(investigation_id)
+        event_bus.publish("phase", {"investigation_id": investigation_id, "phase": "completed"})
 
     except Exception as e:
         print(f"[!] Controller Execution Error: {e}")
+        event_bus.publish("phase", {"investigation_id": investigation_id, "phase": "failed", "error": str(e)})
+    finally:
+        stop_watch.set()
 
 
 # --- ROUTES ---
@@ -105,6 +176,31 @@ def logs_page():
     return render_template('raw_log.html')
 
 
+@app.route('/api/events')
+def stream_events():
+    """
+    Server-Sent Events: phase changes, file progress with per-agent throughput and ETA,
+    new findings and AI progress. A reconnecting client (Last-Event-ID) gets what it missed.
+    """
+    q = event_bus.subscribe(request.headers.get('Last-Event-ID', type=int))
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = q.get(timeout=EVENT_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+        finally:
+            event_bus.unsubscribe(q)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/api/start_analysis', methods=['POST'])
 def start_analysis():
     data = request.get_json()
@@ -112,64 +208,80 @@ def start_analysis():
     if not directory_path or not os.path.isdir(directory_path):
         return jsonify({"error": "Invalid directory path provided."}), 400
 
-    investigation_id = f"investigation_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    thread = threading.Thread(target=run_full_analysis, args=(directory_path, investigation_id))
+    # An interrupted investigation is continued under its own ID from its last checkpoint
+    resume_id = (data.get('resume_investigation_id') or '').strip()
+    investigation_id = resume_id or f"investigation_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    thread = threading.Thread(target=run_full_analysis, args=(directory_path, investigation_id, bool(resume_id)))
     thread.daemon = True
     thread.start()
 
     return jsonify({"message": "Analysis engine started.", "investigation_id": investigation_id}), 200
 
 
+def _report_filters(args):
+    """Report filters from the query string; absent or empty parameters do not filter."""
+    known_bad = args.get('known_bad')
+    return {
+        'agent':     args.get('agent') or None,
+        'type':      args.get('type') or None,
+        'q':         args.get('q') or None,
+        'min_score': args.get('min_score', type=int),
+        'known_bad': None if known_bad in (None, '') else known_bad.lower() in ('1', 'true', 'yes'),
+    }
+
+
 @app.route('/api/report/latest')
 def get_latest_report():
+    """
+    One page of per-artifact results, aggregated in SQL. Query parameters: page, limit,
+    sort (score | findings | path), order (desc | asc) and the filters in _report_filters.
+    """
     try:
+        ensure_schema()
         conn = get_db_connection()
         cur  = conn.cursor(cursor_factory=DictCursor)
 
-        cur.execute("SELECT investigation_id, merkle_root FROM investigations ORDER BY start_time DESC LIMIT 1;")
-        res = cur.fetchone()
+        res = report_queries.latest_investigation(cur)
         if not res:
             return jsonify({"artifacts": []})
 
+        etag = _state_etag(res)
+        unchanged = _not_modified(etag)
+        if unchanged:
+            return unchanged
+
         inv_id      = res['investigation_id']
         merkle_root = res['merkle_root'] or "CALCULATING..."
 
-        cur.execute("SELECT * FROM findings WHERE investigation_id = %s", (inv_id,))
-        rows = cur.fetchall()
+        page  = max(1, request.args.get('page', 1, type=int))
+        limit = min(max(1, request.args.get('limit', REPORT_PAGE_SIZE, type=int)), REPORT_MAX_PAGE_SIZE)
+        total, artifacts = report_queries.artifact_page(
+            cur, inv_id, page=page, limit=limit,
+            sort=request.args.get('sort', 'score'),
+            descending=request.args.get('order', 'desc').lower() != 'asc',
+            filters=_report_filters(request.args)
+        )
 
-        artifacts = {}
-        for r in rows:
-            path = r.get('file_path') or "System/Registry Artifacts"
-
-            if path not in artifacts:
-                artifacts[path] = {
-                    'file_path': path,
-                    'score':     0,
-                    'findings':  [],
-                    'known_bad': False,
-                    'ai_insight': r.get('ai_insight')
-                }
-
-            ftype = (r.get('finding_type') or "").lower()
-            agent = (r.get('agent_name')   or "").lower()
-
-            if 'malware' in ftype or 'malware' in agent or 'intel' in agent:
-                artifacts[path]['known_bad'] = True
-                artifacts[path]['score']    += 10
-            elif 'memory'   in ftype or 'memory'   in agent: artifacts[path]['score'] += 8
-            elif 'registry' in ftype or 'registry' in agent: artifacts[path]['score'] += 9
-            elif 'mismatch' in ftype or 'sign'     in agent: artifacts[path]['score'] += 7
-            elif 'browser'  in ftype or 'browser'  in agent: artifacts[path]['score'] += 5
-            elif 'keyword'  in ftype or 'hash'     in agent: artifacts[path]['score'] += 5
-            elif 'timeline' in ftype or 'time'     in agent: artifacts[path]['score'] += 4
-
-            artifacts[path]['findings'].append(f"[{r.get('agent_name')}] {r.get('description')}")
-
-        return jsonify({
+        # File hashes live in the manifest; attach them only for the artifacts being shown
+        by_path = {a['file_path']: a for a in artifacts}
+        cur.execute(
+            "SELECT file_path, encode(sha256, 'hex') AS sha256 FROM hash_manifest "
+            "WHERE investigation_id = %s AND file_path = ANY(%s)",
+            (inv_id, list(by_path))
+        )
+        for m in cur.fetchall():
+            by_path[m['file_path']]['sha256'] = m['sha256']
+
+        return _tagged({
             "investigation_id": inv_id,
             "merkle_root":      merkle_root,
-            "artifacts":        list(artifacts.values())
-        })
+            "summary":          report_queries.artifact_summary(cur, inv_id),
+            "dedup":            report_queries.dedup_summary(res),
+            "page":             page,
+            "limit":            limit,
+            "total":            total,
+            "artifacts":        artifacts
+        }, etag)
 
     except Exception as e:
         print(f"[!] API Error in get_latest_report: {e}")
@@ -178,19 +290,32 @@ def get_latest_report():
 
 @app.route('/api/findings/latest')
 def get_raw_findings():
+    """
+    Findings of the latest investigation in write order, `limit` at a time. Pass the
+    returned cursor back as ?since= to receive only findings written after it.
+    """
     try:
+        ensure_schema()
         conn = get_db_connection()
         cur  = conn.cursor(cursor_factory=DictCursor)
-        cur.execute("SELECT investigation_id FROM investigations ORDER BY start_time DESC LIMIT 1;")
-        res = cur.fetchone()
+        res = report_queries.latest_investigation(cur)
         if not res:
-            return jsonify([])
-
-        cur.execute(
-            "SELECT * FROM findings WHERE investigation_id = %s ORDER BY timestamp DESC",
-            (res['investigation_id'],)
-        )
-        return jsonify([dict(r) for r in cur.fetchall()])
+            return jsonify({"investigation_id": None, "cursor": -1, "findings": []})
+
+        since = request.args.get('since', -1, type=int)
+        limit = min(max(1, request.args.get('limit', FINDINGS_PAGE_SIZE, type=int)), FINDINGS_PAGE_SIZE)
+        etag = _state_etag(res, since, limit)
+        unchanged = _not_modified(etag)
+        if unchanged:
+            return unchanged
+
+        rows, cursor = report_queries.findings_since(cur, res['investigation_id'], since, limit)
+        return _tagged({
+            "investigation_id": res['investigation_id'],
+            "cursor":           cursor,
+            "more":             len(rows) == limit,
+            "findings":         [dict(r) for r in rows]
+        }, etag)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -304,6 +429,7 @@ def verify_integrity():
     inv_id = data.get('investigation_id', '').strip()
 
     try:
+        ensure_schema()
         conn = get_db_connection()
         cur  = conn.cursor(cursor_factory=DictCursor)
         cur.execute("SELECT merkle_root FROM investigations WHERE investigation_id = %s", (inv_id,))
@@ -313,16 +439,23 @@ def verify_integrity():
             return jsonify({"status": "error", "message": "ID not found"}), 200
 
         stored_root = stored_res['merkle_root']
+        hw_id = merkle_utils.get_hardware_id()
 
-        cur.execute(
-            "SELECT file_path, finding_type, description FROM findings WHERE investigation_id = %s",
-            (inv_id,)
-        )
-        rows = cur.fetchall()
-        current_findings = [{"file_path": r[0], "finding_type": r[1], "description": r[2]} for r in rows]
+        # Single disputed finding: O(log n) inclusion proof instead of rehashing every row
+        if data.get('leaf_index') is not None:
+            proof = merkle_utils.prove_finding(cur, inv_id, int(data['leaf_index']))
+            if proof is None:
+                return jsonify({"status": "error", "message": "Finding not found in the Merkle accumulator"}), 200
+            verified = merkle_utils.verify_finding(proof, stored_root, hw_id=hw_id)
+            return jsonify({
+                "status":  "verified" if verified else "tampered",
+                "message": "Finding is included in the sealed root." if verified
+                           else "TAMPER DETECTED: Finding does not match the sealed root!",
+                "proof":   proof,
+                "stored":  stored_root
+            })
 
-        hw_id = merkle_utils.get_hardware_id()
-        calculated_root = merkle_utils.generate_investigation_integrity(current_findings, hw_id=hw_id)
+        calculated_root = merkle_utils.recompute_seal(cur, inv_id, hw_id=hw_id)
 
         if stored_root == calculated_root:
             return jsonify({
@@ -1,5 +1,6 @@
 import hashlib
 import uuid
+from config import SEAL_FETCH_SIZE
 
 def get_hash(data):
     return hashlib.sha256(data.encode('utf-8')).hexdigest()
@@ -23,6 +24,34 @@ def build_merkle_root(hash_list):
         new_hash_list.append(get_hash(left + right))
     return build_merkle_root(new_hash_list)
 
+def build_merkle_root_packed(digests):
+    """
+    build_merkle_root over raw 32-byte digests packed into one bytearray (ascending
+    hex order == ascending byte order). Each level is written over the front of the
+    buffer, so nothing beyond the 32 bytes per leaf is allocated. Consumes `digests`.
+    """
+    count = len(digests) // 32
+    if count == 0:
+        return "0" * 64
+    while count > 1:
+        for i in range(0, count, 2):
+            left  = digests[i * 32:(i + 1) * 32]
+            right = digests[(i + 1) * 32:(i + 2) * 32] if i + 1 < count else left
+            digests[(i // 2) * 32:(i // 2 + 1) * 32] = hashlib.sha256((left.hex() + right.hex()).encode('utf-8')).digest()
+        count = (count + 1) // 2
+    return digests[:32].hex()
+
+def insert_sorted_digest(digests, digest):
+    """Inserts one 32-byte digest into a packed ascending bytearray, keeping it sorted."""
+    lo, hi = 0, len(digests) // 32
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if digests[mid * 32:(mid + 1) * 32] < digest:
+            lo = mid + 1
+        else:
+            hi = mid
+    digests[lo * 32:lo * 32] = digest
+
 def generate_investigation_integrity(findings, hw_id=None):
     """
     Generates the integrity seal.
@@ -38,4 +67,197 @@ def generate_investigation_integrity(findings, hw_id=None):
         leaf_hashes.append(get_hash(f"HW_BINDING|{hw_id}"))
     
     leaf_hashes.sort()
-    return build_merkle_root(leaf_hashes)
\ No newline at end of file
+    return build_merkle_root(leaf_hashes)
+
+def leaf_hash(file_path, finding_type, description):
+    """Leaf hash of one finding (same content string as the full-rebuild scheme)."""
+    return get_hash(f"{file_path}|{finding_type}|{description}")
+
+def hw_leaf(hw_id):
+    return get_hash(f"HW_BINDING|{hw_id}")
+
+
+# --- INCREMENTAL ACCUMULATOR (Merkle Mountain Range) ---
+# Leaves are appended in write order. The accumulator is a list of "peaks": the roots
+# of perfect subtrees whose sizes are the set bits of leaf_count, largest first.
+# Node (level, position) covers leaves [position << level, (position + 1) << level).
+
+def peak_levels(leaf_count):
+    """Heights of the peaks for a tree of leaf_count leaves, largest first."""
+    return [level for level in range(leaf_count.bit_length() - 1, -1, -1) if leaf_count >> level & 1]
+
+def mmr_append(peaks, leaf_count, leaf):
+    """
+    Appends one leaf hash. Returns (new_peaks, new_nodes) where new_nodes lists every
+    (level, position, hash) created - the leaf itself plus the merged parents.
+    """
+    peaks = list(peaks)
+    node, level, position = leaf, 0, leaf_count
+    new_nodes = [(0, position, leaf)]
+    while position & 1:
+        node = get_hash(peaks.pop() + node)
+        level, position = level + 1, position >> 1
+        new_nodes.append((level, position, node))
+    peaks.append(node)
+    return peaks, new_nodes
+
+def bag_peaks(peaks):
+    """Folds the peaks right-to-left into a single root."""
+    if not peaks:
+        return "0" * 64
+    root = peaks[-1]
+    for peak in reversed(peaks[:-1]):
+        root = get_hash(peak + root)
+    return root
+
+def seal_root(peaks, hw_id=None):
+    """The investigation seal from the accumulator peaks: O(log n) hashes."""
+    root = bag_peaks(peaks)
+    if hw_id:
+        root = get_hash(root + hw_leaf(hw_id))
+    return root
+
+def mmr_root(leaf_hashes, hw_id=None):
+    """Seal over leaf hashes in append order, keeping only the peaks in memory."""
+    peaks = []
+    for count, leaf in enumerate(leaf_hashes):
+        peaks, _ = mmr_append(peaks, count, leaf)
+    return seal_root(peaks, hw_id)
+
+def proof_positions(leaf_index, leaf_count):
+    """
+    Where the inclusion proof for one leaf comes from: (peak_index, [(level, position)])
+    with the sibling node at every level below the leaf's peak.
+    """
+    start = 0
+    for peak_index, height in enumerate(peak_levels(leaf_count)):
+        if leaf_index < start + (1 << height):
+            return peak_index, [(level, (leaf_index >> level) ^ 1) for level in range(height)]
+        start += 1 << height
+    raise IndexError(f"leaf {leaf_index} is outside a tree of {leaf_count} leaves")
+
+def verify_inclusion(leaf, leaf_index, siblings, peaks, peak_index):
+    """True if leaf + sibling path hashes up to peaks[peak_index]."""
+    node = leaf
+    for level, sibling in enumerate(siblings):
+        node = get_hash(sibling + node) if leaf_index >> level & 1 else get_hash(node + sibling)
+    return node == peaks[peak_index]
+
+
+# --- DATABASE-BACKED SEAL ---
+# Investigations written since the accumulator was introduced have a merkle_state row
+# (maintained by db_utils.flush_findings); older ones keep the sorted full-rebuild scheme.
+
+# Every sealed leaf of an investigation: findings plus hash-manifest entries, the latter
+# rendered with the text they had as "File Hash" findings. Takes investigation_id twice.
+SEALED_LEAVES_SQL = """
+    SELECT merkle_leaf, file_path, finding_type, description
+    FROM findings WHERE investigation_id = %s
+    UNION ALL
+    SELECT merkle_leaf, file_path, 'File Hash', 'SHA256: ' || encode(sha256, 'hex')
+    FROM hash_manifest WHERE investigation_id = %s
+"""
+
+# Leaf hashes of the full-rebuild scheme, computed and sorted by PostgreSQL. The string
+# matches leaf_hash(): Python renders a NULL column as "None".
+LEGACY_LEAVES_SQL = f"""
+    SELECT sha256(convert_to(
+               COALESCE(file_path, 'None') || '|' || COALESCE(finding_type, 'None') || '|' || COALESCE(description, 'None'),
+               'UTF8')) AS leaf
+    FROM ({SEALED_LEAVES_SQL}) AS leaves
+    ORDER BY leaf
+"""
+ORDERED_LEAVES_SQL = f"""
+    SELECT file_path, finding_type, description
+    FROM ({SEALED_LEAVES_SQL}) AS leaves
+    ORDER BY merkle_leaf
+"""
+LEAF_AT_SQL = f"""
+    SELECT file_path, finding_type, description
+    FROM ({SEALED_LEAVES_SQL}) AS leaves
+    WHERE merkle_leaf = %s
+"""
+
+def _stream(cur, sql, args, fetch_size=SEAL_FETCH_SIZE):
+    """
+    Yields rows through a named (server-side) cursor on cur's connection, fetch_size
+    rows per round trip, so the result set never sits in client memory.
+    """
+    with cur.connection.cursor(name=f"seal_{uuid.uuid4().hex}") as stream:
+        stream.itersize = fetch_size
+        stream.execute(sql, args)
+        yield from stream
+
+def legacy_seal(cur, investigation_id, hw_id=None):
+    """
+    Full-rebuild seal streamed from the database: the sorted leaf digests arrive
+    from a server-side cursor into one packed bytearray (32 bytes per leaf).
+    Same result as generate_investigation_integrity over the fetched rows.
+    """
+    digests = bytearray()
+    for (leaf,) in _stream(cur, LEGACY_LEAVES_SQL, (investigation_id, investigation_id)):
+        digests += leaf
+    if hw_id:
+        insert_sorted_digest(digests, bytes.fromhex(hw_leaf(hw_id)))
+    return build_merkle_root_packed(digests)
+
+def _state(cur, investigation_id):
+    cur.execute("SELECT leaf_count, peaks FROM merkle_state WHERE investigation_id = %s", (investigation_id,))
+    row = cur.fetchone()
+    return (row[0], list(row[1])) if row else None
+
+def compute_seal(cur, investigation_id, hw_id=None):
+    """Seal at the end of a run: bags the stored peaks, or rebuilds for legacy investigations."""
+    state = _state(cur, investigation_id)
+    if state:
+        return seal_root(state[1], hw_id)
+    return legacy_seal(cur, investigation_id, hw_id)
+
+def recompute_seal(cur, investigation_id, hw_id=None):
+    """
+    Full verification: rehashes every finding and manifest entry currently stored for the investigation,
+    streamed in merkle_leaf order with only the accumulator peaks held in memory.
+    """
+    if _state(cur, investigation_id) is None:
+        return compute_seal(cur, investigation_id, hw_id)
+    rows = _stream(cur, ORDERED_LEAVES_SQL, (investigation_id, investigation_id))
+    return mmr_root((leaf_hash(*r) for r in rows), hw_id)
+
+def prove_finding(cur, investigation_id, leaf_index):
+    """
+    Inclusion proof for the finding at merkle_leaf = leaf_index, built from the stored
+    nodes: O(log n) rows. Returns None if the investigation has no accumulator or no such leaf.
+    """
+    state = _state(cur, investigation_id)
+    if state is None or not 0 <= leaf_index < state[0]:
+        return None
+    leaf_count, peaks = state
+    cur.execute(LEAF_AT_SQL, (investigation_id, investigation_id, leaf_index))
+    finding = cur.fetchone()
+    if finding is None:
+        return None
+
+    peak_index, positions = proof_positions(leaf_index, leaf_count)
+    siblings = []
+    for level, position in positions:
+        cur.execute(
+            "SELECT hash FROM merkle_nodes WHERE investigation_id = %s AND level = %s AND position = %s",
+            (investigation_id, level, position)
+        )
+        row = cur.fetchone()
+        siblings.append(row[0] if row else None)
+    return {
+        "leaf_index": leaf_index,
+        "leaf_hash":  leaf_hash(*finding),
+        "finding":    {"file_path": finding[0], "finding_type": finding[1], "description": finding[2]},
+        "siblings":   siblings,
+        "peaks":      peaks,
+        "peak_index": peak_index,
+    }
+
+def verify_finding(proof, stored_root, hw_id=None):
+    """Checks one finding's proof against the sealed root."""
+    if proof is None or None in proof["siblings"]:
+        return False
+    return (verify_inclusion(proof["leaf_hash"], proof["leaf_index"], proof["siblings"], proof["peaks"], proof["peak_index"])
+            and seal_root(proof["peaks"], hw_id) == stored_root)
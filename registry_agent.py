@@ -3,18 +3,22 @@ if sys.platform != 'win32':
     raise RuntimeError("RegistryAgent is only supported on Windows.")
 import winreg
 import os
-import math
 from flask import Flask, request, jsonify
 from config import DB_CONFIG
+from entropy_utils import shannon_entropy
 
 # Ensure this matches your project structure
 try:
-    from db_utils import save_to_db
+    from db_utils import save_to_db, register_flush_endpoint
 except ImportError:
     def save_to_db(agent, ftype, desc, inv_id, path):
         print(f"[DB LOG] {agent} | {ftype} | {desc} | {path}")
 
+    def register_flush_endpoint(app):
+        pass
+
 app = Flask(__name__)
+register_flush_endpoint(app)
 
 # --- UPDATED HIVES ---
 PERSISTENCE_HIVES = [
@@ -32,9 +36,7 @@ LOLBINS = ["powershell.exe", "cmd.exe", "wscript.exe", "cscript.exe", "mshta.exe
 SYSTEM_PROCESS_NAMES = ["svchost.exe", "lsass.exe", "wininit.exe", "smss.exe", "csrss.exe", "services.exe"]
 
 def calculate_entropy(text):
-    if not text: return 0
-    prob = [float(text.count(c)) / len(text) for c in dict.fromkeys(list(text))]
-    return - sum([p * math.log2(p) for p in prob])
+    return shannon_entropy(text)
 
 def analyze_registry_value(name, value):
     """Focuses on risk scoring the string content."""
@@ -63,10 +65,8 @@ def analyze_registry_value(name, value):
 
     return score, reasons
 
-@app.route('/scan_registry', methods=['POST'])
-def scan_registry():
-    data = request.get_json()
-    investigation_id = data.get('investigation_id')
+def run_scan(investigation_id):
+    """Checks the persistence hives and records anomalies; returns the response body and status."""
     findings_count = 0
     
     for hkey, path, hive_desc in PERSISTENCE_HIVES:
@@ -100,7 +100,13 @@ def scan_registry():
 
         except Exception: continue
 
-    return jsonify({"status": "complete", "matches_found": findings_count})
+    return {"status": "complete", "matches_found": findings_count}, 200
+
+@app.route('/scan_registry', methods=['POST'])
+def scan_registry():
+    data = request.get_json()
+    result, status = run_scan(data.get('investigation_id'))
+    return jsonify(result), status
 
 if __name__ == '__main__':
     app.run(port=5006, debug=False)
\ No newline at end of file
@@ -0,0 +1,160 @@
+# report_queries.py
+"""
+Per-artifact report aggregation done in PostgreSQL: scoring (risk_scoring rules),
+grouping, filtering, sorting and paging all happen in one grouped query over the
+(investigation_id, file_path) index, and finding text is fetched only for the page shown.
+"""
+import risk_scoring
+
+SYSTEM_ARTIFACT = "System/Registry Artifacts"
+# Same cut-off as the report page's ANOMALY badge
+ANOMALY_SCORE = 5
+
+SORT_COLUMNS = {
+    "score":    "score",
+    "findings": "finding_count",
+    "path":     "file_path",
+}
+
+# leaf_count moves with every finding written, revision with every AI insight batch,
+# merkle_root/status when the run is sealed, the dedup counters with every batch:
+# together they identify the report's content.
+LATEST_INVESTIGATION_SQL = """
+    SELECT i.investigation_id, i.merkle_root, i.status, i.revision, COALESCE(s.leaf_count, 0) AS leaf_count,
+           i.content_reused, i.content_analyzed
+    FROM investigations AS i LEFT JOIN merkle_state AS s USING (investigation_id)
+    ORDER BY i.start_time DESC LIMIT 1
+"""
+
+SCORED_SQL = f"""
+    SELECT COALESCE(file_path, %(system)s) AS file_path,
+           SUM({risk_scoring.score_sql()})          AS score,
+           bool_or({risk_scoring.known_bad_sql()}) AS known_bad,
+           count(*)                                AS finding_count,
+           max(ai_insight)                         AS ai_insight
+    FROM findings
+    WHERE investigation_id = %(inv)s
+    GROUP BY 1
+"""
+
+SUMMARY_SQL = f"""
+    SELECT count(*)                                                                AS artifacts,
+           count(*) FILTER (WHERE known_bad)                                       AS known_bad,
+           count(*) FILTER (WHERE NOT known_bad AND score >= {ANOMALY_SCORE})      AS anomalies,
+           count(*) FILTER (WHERE NOT known_bad AND score > 0 AND score < {ANOMALY_SCORE}) AS suspicious,
+           count(*) FILTER (WHERE score = 0)                                       AS benign,
+           COALESCE(sum(finding_count), 0)                                         AS findings
+    FROM ({SCORED_SQL}) AS scored
+"""
+
+FINDINGS_SINCE_SQL = """
+    SELECT * FROM findings
+    WHERE investigation_id = %s AND merkle_leaf > %s
+    ORDER BY merkle_leaf
+    LIMIT %s
+"""
+
+PAGE_FINDINGS_SQL = """
+    SELECT file_path, agent_name, description FROM findings
+    WHERE investigation_id = %s AND (file_path = ANY(%s) OR (%s AND file_path IS NULL))
+    ORDER BY id
+"""
+
+
+def latest_investigation(cur):
+    """
+    (investigation_id, merkle_root, status, revision, leaf_count, content_reused, content_analyzed)
+    of the newest investigation, or None.
+    """
+    cur.execute(LATEST_INVESTIGATION_SQL)
+    return cur.fetchone()
+
+
+def findings_since(cur, investigation_id, cursor=-1, limit=1000):
+    """
+    Findings with merkle_leaf > cursor, oldest first, at most `limit`. Returns
+    (rows, next cursor); a reader that passes the returned cursor back sees every row once.
+    """
+    cur.execute(FINDINGS_SINCE_SQL, (investigation_id, cursor, limit))
+    rows = cur.fetchall()
+    if not rows:
+        return rows, cursor
+    leaf_column = [d[0] for d in cur.description].index('merkle_leaf')
+    return rows, rows[-1][leaf_column]
+
+
+def artifact_summary(cur, investigation_id):
+    """Counts over every artifact of the investigation, for the stat cards and risk chart."""
+    cur.execute(SUMMARY_SQL, {"inv": investigation_id, "system": SYSTEM_ARTIFACT})
+    columns = [d[0] for d in cur.description]
+    return {name: int(value) for name, value in zip(columns, cur.fetchone())}
+
+
+def dedup_summary(state):
+    """Content dedup counters of a latest_investigation row."""
+    reused, analyzed = int(state['content_reused']), int(state['content_analyzed'])
+    files = reused + analyzed
+    return {"reused": reused, "analyzed": analyzed, "ratio": round(reused / files, 4) if files else 0.0}
+
+
+def _page_sql(filters, sort, descending):
+    having, where = [], []
+    if filters.get("agent"):
+        having.append("bool_or(agent_name ILIKE %(agent)s)")
+    if filters.get("type"):
+        having.append("bool_or(finding_type ILIKE %(type)s)")
+    if filters.get("min_score") is not None:
+        where.append("score >= %(min_score)s")
+    if filters.get("known_bad") is not None:
+        where.append("known_bad = %(known_bad)s")
+    if filters.get("q"):
+        where.append("file_path ILIKE %(q)s")
+
+    column = SORT_COLUMNS.get(sort, "score")
+    order  = f"{column} {'DESC' if descending else 'ASC'}" + (", file_path" if column != "file_path" else "")
+    return f"""
+        SELECT file_path, score, known_bad, finding_count, ai_insight, count(*) OVER () AS matched
+        FROM ({SCORED_SQL} {'HAVING ' + ' AND '.join(having) if having else ''}) AS scored
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {order}
+        LIMIT %(limit)s OFFSET %(offset)s
+    """
+
+
+def artifact_page(cur, investigation_id, page=1, limit=50, sort="score", descending=True, filters=None):
+    """
+    One page of artifacts, best first by default. `filters` may hold agent / type
+    (substring of any finding's agent_name / finding_type), min_score, known_bad and
+    q (substring of the path). Returns (matching artifact count, [artifact dicts]).
+    """
+    filters = filters or {}
+    params = {
+        "inv":       investigation_id,
+        "system":    SYSTEM_ARTIFACT,
+        "agent":     f"%{filters.get('agent')}%",
+        "type":      f"%{filters.get('type')}%",
+        "min_score": filters.get("min_score"),
+        "known_bad": filters.get("known_bad"),
+        "q":         f"%{filters.get('q')}%",
+        "limit":     limit,
+        "offset":    (max(1, page) - 1) * limit,
+    }
+    cur.execute(_page_sql(filters, sort, descending), params)
+    rows = cur.fetchall()
+    if not rows:
+        return 0, []
+
+    artifacts = {}
+    for path, score, known_bad, finding_count, ai_insight, _ in rows:
+        artifacts[path] = {
+            'file_path':  path,
+            'score':      int(score),
+            'known_bad':  bool(known_bad),
+            'findings':   [],
+            'ai_insight': ai_insight,
+        }
+
+    cur.execute(PAGE_FINDINGS_SQL, (investigation_id, list(artifacts), SYSTEM_ARTIFACT in artifacts))
+    for path, agent_name, description in cur.fetchall():
+        artifacts[path or SYSTEM_ARTIFACT]['findings'].append(f"[{agent_name}] {description}")
+    return int(rows[0][-1]), list(artifacts.values())
@@ -0,0 +1,42 @@
+# risk_scoring.py
+"""
+Per-finding risk weights shared by the report view (main_app) and the AI analyst.
+The first matching rule wins; an artifact's score is the sum over its findings.
+"""
+
+# (finding_type substrings, agent_name substrings, points), checked in order.
+# The first rule also marks the artifact as known bad.
+RULES = [
+    (("malware",),  ("malware", "intel"), 10),
+    (("memory",),   ("memory",),           8),
+    (("registry",), ("registry",),         9),
+    (("mismatch",), ("sign",),             7),
+    (("browser",),  ("browser",),          5),
+    (("keyword",),  ("hash",),             5),
+    (("timeline",), ("time",),             4),
+]
+
+def score_finding(finding_type, agent_name):
+    """Returns (points, known_bad) for one finding row."""
+    ftype = (finding_type or "").lower()
+    agent = (agent_name   or "").lower()
+
+    for index, (type_terms, agent_terms, points) in enumerate(RULES):
+        if any(t in ftype for t in type_terms) or any(a in agent for a in agent_terms):
+            return points, index == 0
+    return 0, False
+
+def _rule_sql(type_terms, agent_terms, type_column, agent_column):
+    tests  = [f"lower(COALESCE({type_column}, '')) LIKE '%%{t}%%'" for t in type_terms]
+    tests += [f"lower(COALESCE({agent_column}, '')) LIKE '%%{a}%%'" for a in agent_terms]
+    return " OR ".join(tests)
+
+def score_sql(type_column="finding_type", agent_column="agent_name"):
+    """The same rules as a SQL CASE expression (percent signs escaped for psycopg2 parameters)."""
+    whens = [f"WHEN {_rule_sql(t, a, type_column, agent_column)} THEN {points}" for t, a, points in RULES]
+    return "CASE " + " ".join(whens) + " ELSE 0 END"
+
+def known_bad_sql(type_column="finding_type", agent_column="agent_name"):
+    """SQL boolean for the known-bad rule, matching score_finding's second value."""
+    type_terms, agent_terms, _ = RULES[0]
+    return f"({_rule_sql(type_terms, agent_terms, type_column, agent_column)})"
@@ -2,23 +2,67 @@ import sys
 import subprocess
 import time
 import os
+import argparse
+import importlib
 from threading import Thread
+from config import AGENT_SERVER, AGENT_SERVER_THREADS
 
 
-# Updated list to include all 8 specialized forensic agents
+# Updated list to include all 8 specialized forensic agents, with the port each one serves on
 agent_scripts = [
-    "hash_agent.py",
-    "keyword_agent.py",
-    "file_signature_agent.py",
-    "timeline_agent.py",
-    "threat_intel_agent.py",
-    "registry_agent.py",
-    "browser_agent.py",
-    "scan_memory.py"
+    ("hash_agent.py",           5001),
+    ("keyword_agent.py",        5002),
+    ("file_signature_agent.py", 5003),
+    ("timeline_agent.py",       5004),
+    ("threat_intel_agent.py",   5005),
+    ("registry_agent.py",       5006),
+    ("browser_agent.py",        5007),
+    ("scan_memory.py",          5008),
 ]
 
 processes = []
 
+def serve_agent(script, port, server=AGENT_SERVER, threads=AGENT_SERVER_THREADS):
+    """
+    Serves one agent's Flask app on 127.0.0.1:port with `threads` request threads.
+    Agents keep findings buffers and lookup queues in process memory, so every server
+    runs a single process; a missing server package falls back to Flask's threaded dev server.
+    """
+    name = os.path.splitext(os.path.basename(script))[0]
+    app  = importlib.import_module(name).app
+
+    if server == "waitress":
+        try:
+            from waitress import serve
+        except ImportError:
+            print("[!] waitress is not installed (pip install waitress); using the Flask dev server.")
+        else:
+            print(f"[*] {name} serving on port {port} (waitress, {threads} threads)")
+            serve(app, host="127.0.0.1", port=port, threads=threads, ident=name)
+            return
+
+    elif server == "gunicorn":
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            print("[!] gunicorn is not installed or not supported here (POSIX only); using the Flask dev server.")
+        else:
+            class AgentApplication(BaseApplication):
+                def load_config(self):
+                    for key, value in {"bind": f"127.0.0.1:{port}", "workers": 1, "worker_class": "gthread",
+                                       "threads": threads, "proc_name": name}.items():
+                        self.cfg.set(key, value)
+
+                def load(self):
+                    return app
+
+            print(f"[*] {name} serving on port {port} (gunicorn, {threads} threads)")
+            AgentApplication().run()
+            return
+
+    print(f"[*] {name} serving on port {port} (Flask dev server)")
+    app.run(host="127.0.0.1", port=port, debug=False, threaded=True)
+
 def print_output(pipe, script_name):
     """Reads output from an agent process and prints it with a prefix."""
     try:
@@ -26,25 +70,27 @@ def print_output(pipe, script_name):
             if line:
                 print(f"[{script_name}]: {line.strip()}", flush=True)
     except Exception:
-        pass 
+        pass
     finally:
         pipe.close()
 
-try:
+def launch_all(server, threads):
     python_executable = sys.executable
-    
+
     print(f"[*] Starting Intelligence DFIR Multi-Agent Suite...")
     print(f"[*] Python Executable: {python_executable}")
-    print(f"[*] Launching {len(agent_scripts)} specialized agents...\n")
+    print(f"[*] Launching {len(agent_scripts)} specialized agents ({server}, {threads} threads each)...\n")
 
-    for script in agent_scripts:
+    launched = []
+    for script, port in agent_scripts:
         # Check if the path exists to prevent immediate crashes
         if not os.path.exists(script):
             print(f"[!] Error: {script} not found. Skipping...")
             continue
 
         process = subprocess.Popen(
-            [python_executable, script],
+            [python_executable, os.path.abspath(__file__), "--agent", script,
+             "--server", server, "--threads", str(threads)],
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
@@ -52,42 +98,65 @@ try:
             universal_newlines=True
         )
         processes.append(process)
-        
+        launched.append(script)
+
         # Start a thread to monitor this specific agent's logs
         script_name = script.split('/')[-1]
         t = Thread(target=print_output, args=(process.stdout, script_name))
         t.daemon = True
         t.start()
-        
-        print(f"[+] Launched {script_name} (PID: {process.pid})")
+
+        print(f"[+] Launched {script_name} on port {port} (PID: {process.pid})")
         time.sleep(0.5) # Brief pause to allow port binding
 
     print("\n--- All agents are operational ---")
     print("--- Press CTRL+C to stop the entire forensic suite ---\n")
 
     # Keep the main thread alive to catch KeyboardInterrupt
+    reported = set()
     while True:
         time.sleep(1)
         # Optional: Check if any process died unexpectedly
         for i, p in enumerate(processes):
-            if p.poll() is not None:
-                print(f"[!] Warning: Agent {agent_scripts[i]} has stopped unexpectedly.")
+            if p.poll() is not None and i not in reported:
+                print(f"[!] Warning: Agent {launched[i]} has stopped unexpectedly.")
+                reported.add(i)
 
-except KeyboardInterrupt:
-    print("\n\n--- [!] Shutdown Signal Received: Stopping all agents ---")
-    for i, process in enumerate(processes):
-        try:
+def main():
+    parser = argparse.ArgumentParser(description="Start the forensic agent services")
+    parser.add_argument("--agent", help="Serve only this agent script in the current process (used by the launcher)")
+    parser.add_argument("--server", choices=["waitress", "gunicorn", "flask"], default=AGENT_SERVER,
+                        help="WSGI server for every agent (default: AGENT_SERVER)")
+    parser.add_argument("--threads", type=int, default=AGENT_SERVER_THREADS,
+                        help="Request threads per agent (default: AGENT_SERVER_THREADS)")
+    args = parser.parse_args()
+
+    if args.agent:
+        ports = dict(agent_scripts)
+        if args.agent not in ports:
+            parser.error(f"unknown agent {args.agent}; expected one of {', '.join(ports)}")
+        serve_agent(args.agent, ports[args.agent], args.server, max(1, args.threads))
+        return
+
+    try:
+        launch_all(args.server, max(1, args.threads))
+    except KeyboardInterrupt:
+        print("\n\n--- [!] Shutdown Signal Received: Stopping all agents ---")
+        for process in processes:
+            name = process.args[3].split('/')[-1]
+            try:
+                process.terminate()
+                process.wait(timeout=5)
+                print(f"[-] Stopped {name}")
+            except Exception:
+                process.kill()
+                print(f"[!] Force killed {name}")
+
+        print("--- Forensic Suite Offline. ---")
+    except Exception as e:
+        print(f"[!] A system error occurred: {e}")
+        for process in processes:
             process.terminate()
-            process.wait(timeout=5)
-            print(f"[-] Stopped {agent_scripts[i].split('/')[-1]}")
-        except Exception:
-            process.kill()
-            print(f"[!] Force killed {agent_scripts[i].split('/')[-1]}")
-            
-    print("--- Forensic Suite Offline. ---")
-except Exception as e:
-    print(f"[!] A system error occurred: {e}")
-    for process in processes:
-        process.terminate()
-finally:
-    sys.exit()
\ No newline at end of file
+
+if __name__ == '__main__':
+    sys.exit(main())
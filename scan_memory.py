@@ -4,9 +4,10 @@ import psycopg2
 import hashlib
 from flask import Flask, request, jsonify
 from config import DB_CONFIG
-from db_utils import save_to_db
+from db_utils import save_to_db, register_flush_endpoint
 
 app = Flask(__name__)
+register_flush_endpoint(app)
 
 
 def get_process_hash(pid):
@@ -108,11 +109,8 @@ def analyze_memory():
 
     return findings
 
-@app.route('/scan_memory', methods=['POST'])
-def scan_memory():
-    data = request.get_json()
-    investigation_id = data.get('investigation_id')
-    
+def run_scan(investigation_id):
+    """Triage of the running processes; records each hit and returns the response body and status."""
     print(f"[*] Memory Agent: Starting RAM Triage (Noise Filter Enabled)...")
     memory_hits = analyze_memory()
     
@@ -120,7 +118,13 @@ def scan_memory():
         desc = f"Risk {hit['score']}/10: {', '.join(hit['reasons'])}. PID: {hit['pid']} | Hash: {hit['hash']}"
         save_to_db("MemoryAgent", "Volatile Memory Anomaly", desc, investigation_id, f"RAM: {hit['name']}")
 
-    return jsonify({"status": "complete", "matches_found": len(memory_hits)})
+    return {"status": "complete", "matches_found": len(memory_hits)}, 200
+
+@app.route('/scan_memory', methods=['POST'])
+def scan_memory():
+    data = request.get_json()
+    result, status = run_scan(data.get('investigation_id'))
+    return jsonify(result), status
 
 if __name__ == '__main__':
     app.run(port=5008, debug=False)
\ No newline at end of file
@@ -1,38 +1,87 @@
 # threat_intel_agent.py
+import time
+import queue
+import threading
 import requests
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from flask import Flask, request, jsonify
-from config import DB_CONFIG, VIRUSTOTAL_API_KEY
-from db_utils import save_to_db
+import verdict_cache
+from config import (VIRUSTOTAL_API_KEY, VT_API_URL, VT_RATE_PER_MINUTE, VT_WORKERS,
+                    VT_SYNC_WAIT, VT_DRAIN_TIMEOUT)
+from db_utils import save_to_db, register_flush_endpoint
 
 app = Flask(__name__)
+register_flush_endpoint(app)
 
-VT_API_URL = "https://www.virustotal.com/api/v3/files/"
+# --- RATE LIMITER (token bucket) ---
+# Capacity is one minute of quota, so a cold start can burst that much and then settles
+# to VT_RATE_PER_MINUTE. A 429 from the API empties the bucket.
+_BUCKET_CAPACITY = max(1.0, VT_RATE_PER_MINUTE)
+_bucket_lock     = threading.Lock()
+_bucket          = {"tokens": _BUCKET_CAPACITY, "updated": time.monotonic()}
 
-@app.route('/check_hash', methods=['POST'])
-def check_hash_endpoint():
-    data = request.get_json()
-    if not data or 'hash_to_check' not in data or 'investigation_id' not in data or 'file_path' not in data:
-        return jsonify({"error": "Missing required data: hash, investigation_id, and file_path are required."}), 400
+def _take_token():
+    """Blocks until the bucket allows one more VirusTotal request."""
+    rate = VT_RATE_PER_MINUTE / 60.0
+    while True:
+        with _bucket_lock:
+            now = time.monotonic()
+            _bucket["tokens"]  = min(_BUCKET_CAPACITY, _bucket["tokens"] + (now - _bucket["updated"]) * rate)
+            _bucket["updated"] = now
+            if _bucket["tokens"] >= 1:
+                _bucket["tokens"] -= 1
+                return
+            wait = (1 - _bucket["tokens"]) / rate
+        time.sleep(wait)
 
-    hash_to_check   = data['hash_to_check']
-    investigation_id = data['investigation_id']
-    file_path       = data['file_path']
+def _empty_bucket():
+    with _bucket_lock:
+        _bucket["tokens"]  = 0.0
+        _bucket["updated"] = time.monotonic()
 
-    if not VIRUSTOTAL_API_KEY:
-        print("[!] ThreatIntelAgent: API key is not set.")
-        return jsonify({"error": "Server API key not configured"}), 500
+# --- LOOKUP QUEUE ---
+# One queued lookup per distinct hash. Later requests for a hash that is already in
+# flight subscribe to the same entry; every subscriber gets its finding when the verdict lands.
+_lookup_queue  = queue.Queue()
+_inflight_cond = threading.Condition()
+_inflight      = {}   # hash -> {"future": Future, "subscribers": [(investigation_id, file_path)]}
+_workers       = []
+# investigation_id -> file paths whose queued lookup resolved with a usable (non-error) verdict,
+# handed to the controller by drain() so only those are journaled as settled
+_settled       = {}
+_stats         = {"cache_hits": 0, "coalesced": 0, "api_calls": 0, "rate_limited": 0}
+_session       = requests.Session()
 
-    print(f"ThreatIntelAgent: Checking hash {hash_to_check} for file {file_path}")
+def _ensure_workers():
+    with _inflight_cond:
+        if _workers:
+            return
+        for _ in range(max(1, VT_WORKERS)):
+            worker = threading.Thread(target=_lookup_worker, daemon=True)
+            worker.start()
+            _workers.append(worker)
 
-    headers = {"x-apikey": VIRUSTOTAL_API_KEY}
-    url = f"{VT_API_URL}{hash_to_check}"
+def _query_virustotal(file_hash):
+    """
+    One rate-limited VirusTotal lookup. Returns a verdict dict, or None if the
+    API answered 429 and the hash has to go back on the queue.
+    """
+    if not VIRUSTOTAL_API_KEY:
+        print("[!] ThreatIntelAgent: API key is not set.")
+        return {"status": "error", "error": "Server API key not configured", "code": 500}
 
+    _take_token()
+    print(f"ThreatIntelAgent: Checking hash {file_hash}")
     try:
         # FIXED: verify=True (default). VirusTotal has a valid certificate.
-        response = requests.get(url, headers=headers, timeout=15)
+        response = _session.get(f"{VT_API_URL}{file_hash}", headers={"x-apikey": VIRUSTOTAL_API_KEY}, timeout=15)
+        with _inflight_cond:
+            _stats["api_calls"] += 1
 
+        if response.status_code == 429:
+            return None
         if response.status_code == 404:
-            return jsonify({"status": "clean", "hash": hash_to_check, "message": "Hash not found in VT"}), 200
+            return {"status": "not_found", "malicious": 0, "suspicious": 0}
 
         response.raise_for_status()
 
@@ -42,22 +91,230 @@ def check_hash_endpoint():
 
         malicious_count  = stats.get("malicious", 0)
         suspicious_count = stats.get("suspicious", 0)
-
-        if malicious_count > 0 or suspicious_count > 0:
-            print(f"    [!!!] MALWARE DETECTED: {file_path}")
-            description = (
-                f"Known Malware Found! File: {file_path}, Hash: {hash_to_check}. "
-                f"VirusTotal Detections: {malicious_count} Malicious, {suspicious_count} Suspicious."
-            )
-            save_to_db("ThreatIntelAgent", "Known Malware", description, investigation_id, file_path)
-            return jsonify({"status": "malicious", "detections": malicious_count}), 200
-        else:
-            return jsonify({"status": "clean", "message": "Hash found and clean"}), 200
+        status = "malicious" if malicious_count > 0 or suspicious_count > 0 else "clean"
+        return {"status": status, "malicious": malicious_count, "suspicious": suspicious_count}
 
     except requests.exceptions.RequestException as e:
         print(f"[!] ThreatIntelAgent: Could not connect to VirusTotal. {e}")
-        return jsonify({"error": f"Could not connect to VirusTotal: {e}"}), 503
+        return {"status": "error", "error": f"Could not connect to VirusTotal: {e}", "code": 503}
+
+def _record(verdict, file_hash, investigation_id, file_path):
+    if verdict["status"] != "malicious":
+        return
+    print(f"    [!!!] MALWARE DETECTED: {file_path}")
+    description = (
+        f"Known Malware Found! File: {file_path}, Hash: {file_hash}. "
+        f"VirusTotal Detections: {verdict['malicious']} Malicious, {verdict['suspicious']} Suspicious."
+    )
+    save_to_db("ThreatIntelAgent", "Known Malware", description, investigation_id, file_path)
+
+def _record_all(verdict, file_hash, subscribers):
+    for investigation_id, file_path in subscribers:
+        try:
+            _record(verdict, file_hash, investigation_id, file_path)
+        except Exception as e:
+            print(f"[!] ThreatIntelAgent: Could not record the verdict for {file_path}: {e}")
+
+def _resolve(file_hash, verdict):
+    """
+    Records the verdict for every subscriber and completes the in-flight entry, whatever fails on the way.
+    Recording can flush findings to the database, so it runs without holding _inflight_cond: the entry
+    carries its verdict meanwhile, and callers joining it then record their own finding (submit_lookup).
+    """
+    with _inflight_cond:
+        entry = _inflight.get(file_hash)
+        if entry is None:
+            return
+        entry["verdict"] = verdict
+        subscribers = list(entry["subscribers"])
+    try:
+        _record_all(verdict, file_hash, subscribers)
+    finally:
+        # Findings are buffered before the entry disappears, so /drain returning
+        # means every subscriber's finding is ready for the next /flush.
+        with _inflight_cond:
+            _inflight.pop(file_hash, None)
+            if verdict["status"] != "error":
+                for investigation_id, file_path in subscribers:
+                    _settled.setdefault(investigation_id, set()).add(file_path)
+            _inflight_cond.notify_all()
+        entry["future"].set_result(verdict)
+
+def _lookup_worker():
+    while True:
+        file_hash = _lookup_queue.get()
+        try:
+            verdict = _query_virustotal(file_hash)
+        except Exception as e:
+            # An unexpected response shape or similar: answer the subscribers and keep the worker alive
+            print(f"[!] ThreatIntelAgent: Lookup of {file_hash} failed: {e}")
+            verdict = {"status": "error", "error": f"Lookup failed: {e}", "code": 500}
+
+        if verdict is None:
+            print("[!] ThreatIntelAgent: VirusTotal quota exceeded, backing off.")
+            with _inflight_cond:
+                _stats["rate_limited"] += 1
+            _empty_bucket()
+            _lookup_queue.put(file_hash)
+            continue
+
+        if verdict["status"] != "error":
+            try:
+                verdict_cache.put(file_hash, verdict["status"], verdict["malicious"], verdict["suspicious"])
+            except Exception as e:
+                print(f"[!] ThreatIntelAgent: Could not cache the verdict for {file_hash}: {e}")
+        _resolve(file_hash, verdict)
+
+def submit_lookup(file_hash, investigation_id, file_path):
+    """
+    Resolves a hash from the verdict cache, or joins (or starts) its queued VirusTotal
+    lookup. Returns a Future of the verdict; a malicious verdict is recorded as a
+    finding for this file whenever it arrives.
+    """
+    file_hash = file_hash.lower()
+    known = None
+    with _inflight_cond:
+        entry = _inflight.get(file_hash)
+        if entry and "verdict" in entry:
+            # Being recorded for its subscribers right now: this caller records its own finding
+            _stats["coalesced"] += 1
+            known = entry["verdict"]
+        elif entry:
+            _stats["coalesced"] += 1
+            entry["subscribers"].append((investigation_id, file_path))
+            return entry["future"]
+        else:
+            cached = verdict_cache.get(file_hash)
+            if cached:
+                _stats["cache_hits"] += 1
+                known = {**cached, "cached": True}
+            else:
+                entry = {"future": Future(), "subscribers": [(investigation_id, file_path)]}
+                _inflight[file_hash] = entry
+
+    if known is not None:
+        _record_all(known, file_hash, [(investigation_id, file_path)])
+        future = Future()
+        future.set_result(known)
+        return future
+
+    _ensure_workers()
+    _lookup_queue.put(file_hash)
+    return entry["future"]
+
+def _pending_for(investigation_id):
+    return sum(1 for entry in _inflight.values()
+                 for inv, _ in entry["subscribers"] if inv == investigation_id)
+
+def _recording_for(investigation_id):
+    return any("verdict" in entry and any(inv == investigation_id for inv, _ in entry["subscribers"])
+               for entry in _inflight.values())
+
+def _verdict_response(verdict, file_hash):
+    """Maps a verdict onto the agent's original response bodies."""
+    status = verdict["status"]
+    if status == "error":
+        return {"error": verdict["error"]}, verdict["code"]
+    if status == "malicious":
+        return {"status": "malicious", "hash": file_hash, "detections": verdict["malicious"]}, 200
+    message = "Hash not found in VT" if status == "not_found" else "Hash found and clean"
+    return {"status": "clean", "hash": file_hash, "message": message}, 200
+
+@app.route('/check_hash', methods=['POST'])
+def check_hash_endpoint():
+    data = request.get_json()
+    if not data or 'hash_to_check' not in data or 'investigation_id' not in data or 'file_path' not in data:
+        return jsonify({"error": "Missing required data: hash, investigation_id, and file_path are required."}), 400
+
+    hash_to_check    = data['hash_to_check']
+    investigation_id = data['investigation_id']
+    file_path        = data['file_path']
+
+    future = submit_lookup(hash_to_check, investigation_id, file_path)
+    try:
+        verdict = future.result(timeout=VT_SYNC_WAIT)
+    except FutureTimeout:
+        # Still queued behind the rate limit; the finding is recorded when it resolves
+        return jsonify({"status": "queued", "hash": hash_to_check}), 202
+
+    body, status = _verdict_response(verdict, hash_to_check)
+    return jsonify(body), status
+
+def check_batch(investigation_id, items):
+    """Submits every {"hash_to_check", "file_path"} item; cached verdicts are answered, the rest queued."""
+    results, queued = [], 0
+    for item in items:
+        file_hash, file_path = item.get('hash_to_check'), item.get('file_path')
+        if not file_hash or not file_path:
+            continue
+        future = submit_lookup(file_hash, investigation_id, file_path)
+        if future.done():
+            body, status = _verdict_response(future.result(), file_hash)
+            results.append({**body, "file_path": file_path, "code": status})
+        else:
+            queued += 1
+            results.append({"status": "queued", "hash": file_hash, "file_path": file_path})
+    return {"results": results, "queued": queued}
+
+def drain(investigation_id, timeout=VT_DRAIN_TIMEOUT):
+    """
+    Waits up to `timeout` seconds for the investigation's queued lookups, then detaches
+    the ones still pending. Returns (how many were abandoned, the file paths whose queued
+    lookup resolved with a usable verdict since the last drain). Failed lookups are in neither.
+    """
+    deadline = time.monotonic() + timeout
+    with _inflight_cond:
+        while _pending_for(investigation_id):
+            remaining = deadline - time.monotonic()
+            # Lookups whose verdict is already being recorded are waited for even past the deadline
+            if remaining <= 0 and not _recording_for(investigation_id):
+                break
+            _inflight_cond.wait(min(max(remaining, 0.1), 5))
+
+        abandoned = 0
+        for entry in _inflight.values():
+            keep = [s for s in entry["subscribers"] if s[0] != investigation_id]
+            abandoned += len(entry["subscribers"]) - len(keep)
+            entry["subscribers"] = keep
+        settled = _settled.pop(investigation_id, set())
+
+    if abandoned:
+        print(f"[!] ThreatIntelAgent: {abandoned} lookups for {investigation_id} did not finish in time.")
+    return abandoned, settled
+
+@app.route('/check_hashes', methods=['POST'])
+def check_hashes_endpoint():
+    """
+    Batch submission: {"investigation_id", "items": [{"hash_to_check", "file_path"}]}.
+    VirusTotal v3 has no multi-hash file lookup, so the batch is resolved against the
+    verdict cache and the rest is queued without waiting; POST /drain waits for them.
+    """
+    data = request.get_json()
+    if not data or 'investigation_id' not in data or not isinstance(data.get('items'), list):
+        return jsonify({"error": "Missing required data: investigation_id and items are required."}), 400
+    return jsonify(check_batch(data['investigation_id'], data['items'])), 200
+
+@app.route('/drain', methods=['POST'])
+def drain_endpoint():
+    """
+    Waits until every queued lookup for an investigation has resolved (then /flush
+    writes their findings); "settled" lists the files whose lookup did not fail. Lookups still pending after the timeout are detached from
+    the investigation so no finding lands after its seal; their verdicts are still cached.
+    """
+    data = request.get_json() or {}
+    investigation_id = data.get('investigation_id')
+    if not investigation_id:
+        return jsonify({"error": "Missing required data: investigation_id is required."}), 400
+
+    abandoned, settled = drain(investigation_id, float(data.get('timeout', VT_DRAIN_TIMEOUT)))
+    return jsonify({"status": "drained", "abandoned": abandoned, "settled": sorted(settled)}), 200
+
+@app.route('/intel_stats', methods=['GET'])
+def intel_stats_endpoint():
+    with _inflight_cond:
+        stats = {**_stats, "in_flight": len(_inflight)}
+    return jsonify({**stats, "queued": _lookup_queue.qsize()}), 200
 
 if __name__ == '__main__':
     print("Threat Intel Agent starting on port 5005...")
-    app.run(port=5005, debug=False)
\ No newline at end of file
+    app.run(port=5005, debug=False)
@@ -1,12 +1,15 @@
 import os, sys, datetime
 from flask import Flask, request, jsonify
-from db_utils import save_to_db
+from db_utils import save_to_db, register_flush_endpoint
+from batch_utils import stream_batch
 
 app = Flask(__name__)
+register_flush_endpoint(app)
 
-def get_timelines(file_path):
+def get_timelines(file_path, st=None):
     try:
-        stat = os.stat(file_path)
+        # The enumerator's stat result is reused when the controller passes it along
+        stat = st if st is not None else os.stat(file_path)
         # st_ctime is CREATION TIME on Windows, INODE CHANGE TIME on Linux/Mac
         is_windows = sys.platform == 'win32'
         return {
@@ -21,18 +24,11 @@ def get_timelines(file_path):
     except (FileNotFoundError, PermissionError):
         return None
 
-@app.route('/get_timestamps', methods=['POST'])
-def get_timestamps_endpoint():
-    data             = request.get_json()
-    file_path        = data.get('file_path')
-    investigation_id = data.get('investigation_id')
-
-    if not file_path or not investigation_id:
-        return jsonify({'error': "Missing file_path or investigation_id"}), 400
-
-    ts = get_timelines(file_path)
+def process_file(file_path, investigation_id, st=None):
+    """Checks one file's MAC times for anomalies and builds the API response."""
+    ts = get_timelines(file_path, st)
     if ts is None:
-        return jsonify({"error": "File not found or permission denied"}), 404
+        return {"error": "File not found or permission denied"}, 404
 
     is_suspicious = False
 
@@ -54,10 +50,31 @@ def get_timestamps_endpoint():
         save_to_db("TimelineAgent", "Recent Access Anomaly", desc, investigation_id, file_path)
 
     # ONLY log clean files as a summarized batch, not one record per file
-    return jsonify({
+    return {
         "is_suspicious": is_suspicious,
         "timelines": ts
-    }), 200
+    }, 200
+
+def process_request(file_path, data):
+    """Per-file entry point for /get_timestamps_batch and the in-process transport."""
+    return process_file(file_path, data['investigation_id'])
+
+@app.route('/get_timestamps', methods=['POST'])
+def get_timestamps_endpoint():
+    data             = request.get_json()
+    file_path        = data.get('file_path')
+    investigation_id = data.get('investigation_id')
+
+    if not file_path or not investigation_id:
+        return jsonify({'error': "Missing file_path or investigation_id"}), 400
+
+    result, status = process_file(file_path, investigation_id)
+    return jsonify(result), status
+
+@app.route('/get_timestamps_batch', methods=['POST'])
+def get_timestamps_batch_endpoint():
+    """Batch variant of /get_timestamps: 'file_paths' list or 'manifest' in, NDJSON out."""
+    return stream_batch(process_request)
 
 if __name__ == '__main__':
     app.run(port=5004, debug=False)
\ No newline at end of file
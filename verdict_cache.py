@@ -0,0 +1,56 @@
+# verdict_cache.py
+import time
+import sqlite3
+import threading
+from config import VERDICT_CACHE_PATH, VERDICT_TTL
+
+# SQLite connections are per-thread; the lookup workers and Flask handlers share the file.
+_local = threading.local()
+
+def _get_conn():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(VERDICT_CACHE_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                sha256     TEXT    PRIMARY KEY,
+                status     TEXT    NOT NULL,
+                malicious  INTEGER NOT NULL DEFAULT 0,
+                suspicious INTEGER NOT NULL DEFAULT 0,
+                checked_at REAL    NOT NULL
+            )
+        """)
+        _local.conn = conn
+    return conn
+
+def get(sha256):
+    """
+    Returns the cached verdict dict for a hash, or None if absent or older than
+    the TTL for its status (VERDICT_TTL: malicious / clean / not_found).
+    """
+    try:
+        row = _get_conn().execute(
+            "SELECT status, malicious, suspicious, checked_at FROM verdicts WHERE sha256 = ?",
+            (sha256.lower(),)
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"[VerdictCache] Lookup failed: {e}")
+        return None
+    if not row:
+        return None
+    status, malicious, suspicious, checked_at = row
+    if time.time() - checked_at > VERDICT_TTL.get(status, 0):
+        return None
+    return {"status": status, "malicious": malicious, "suspicious": suspicious, "checked_at": checked_at}
+
+def put(sha256, status, malicious=0, suspicious=0):
+    try:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?)",
+            (sha256.lower(), status, malicious, suspicious, time.time())
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"[VerdictCache] Store failed: {e}")